@@ -0,0 +1,5 @@
+"""
+Extractor benchmarks: a deterministic synthetic corpus (benchmarks.corpus)
+and a runner that compares timings and peak memory with a stored baseline
+(benchmarks.run).
+"""
@@ -0,0 +1,352 @@
+"""
+Deterministic synthetic corpus for the benchmarks.
+
+Everything is written with the standard library (raw PDF syntax, OOXML
+parts zipped with fixed timestamps), so the same scale and seed give
+byte-identical files on any machine, without network access or the
+office libraries. Sizes below are for scale 1.0.
+"""
+import json
+import os
+import random
+import zlib
+from zipfile import ZIP_DEFLATED, ZipFile, ZipInfo
+
+# Bump when a generator changes, so cached corpora are rebuilt
+GENERATOR_VERSION = 1
+DEFAULT_SEED = 1234
+
+PDF_PAGES = 5000            # pages.pdf: page tree, link annotations
+PDF_ANNOT_EVERY = 5
+PDF_STREAM_PAGES = 400      # streams.pdf: large Flate content streams
+PDF_STREAM_LINES = 2000
+DOCX_LINKS = 20000          # links.docx: hyperlinks, tracked changes
+DOCX_REVISIONS = 2000
+DOCX_COMMENTS = 50
+PPTX_SLIDES = 500           # slides.pptx: slides, links, notes
+XLSX_ROWS = 50000           # cells.xlsx: one huge sheet
+XLSX_COLS = 10
+XLSX_LINKS = 5000
+
+CORPUS = {
+    "pages.pdf": lambda path, n, rnd: write_pages_pdf(path, n(PDF_PAGES), rnd),
+    "streams.pdf": lambda path, n, rnd: write_streams_pdf(path, n(PDF_STREAM_PAGES), rnd),
+    "links.docx": lambda path, n, rnd: write_docx(path, n(DOCX_LINKS), n(DOCX_REVISIONS), n(DOCX_COMMENTS), rnd),
+    "slides.pptx": lambda path, n, rnd: write_pptx(path, n(PPTX_SLIDES), rnd),
+    "cells.xlsx": lambda path, n, rnd: write_xlsx(path, n(XLSX_ROWS), XLSX_COLS, n(XLSX_LINKS), rnd),
+}
+
+def _url(rnd, i):
+    hosts = ("www.microsoft.com", "example.com", "canarytokens.com", "cdn.example.org", "w3.org")
+    return f"https://{hosts[rnd.randrange(len(hosts))]}/doc/{i}/{rnd.randrange(10 ** 6)}"
+
+# --- PDF -------------------------------------------------------------------
+
+class _PdfWriter:
+    def __init__(self):
+        self.out = bytearray(b"%PDF-1.7\n%\xe2\xe3\xcf\xd3\n")
+        self.offsets = {}
+
+    def obj(self, num, body):
+        self.offsets[num] = len(self.out)
+        self.out += b"%d 0 obj\n" % num + body + b"\nendobj\n"
+
+    def stream(self, num, data, extra=b""):
+        data = zlib.compress(data, 6)
+        self.obj(num, b"<< /Length %d /Filter /FlateDecode %s>>\nstream\n" % (len(data), extra) + data + b"\nendstream")
+
+    def save(self, path, root, info=None):
+        size = max(self.offsets) + 1
+        xref = len(self.out)
+        self.out += b"xref\n0 %d\n0000000000 65535 f \n" % size
+        for num in range(1, size):
+            self.out += b"%010d 00000 n \n" % self.offsets[num]
+        info_ref = b" /Info %d 0 R" % info if info else b""
+        self.out += b"trailer\n<< /Size %d /Root %d 0 R%s >>\nstartxref\n%d\n%%%%EOF\n" % (size, root, info_ref, xref)
+        with open(path, "wb") as f:
+            f.write(self.out)
+
+def _pdf_info(pdf, num, rnd):
+    pdf.obj(num, b"<< /Title (Benchmark corpus) /Author (bench %s) /Producer (benchmarks.corpus)"
+                 b" /CreationDate (D:20240102030405Z) >>" % _url(rnd, 0).encode())
+
+def _page_tree(pdf, pages_num, first_page, n_pages, page_body):
+    """Writes a two-level page tree (groups of 100) and its pages."""
+    groups = (n_pages + 99) // 100
+    group_nums = [pages_num + 1 + g for g in range(groups)]
+    pdf.obj(pages_num, b"<< /Type /Pages /Count %d /Kids [%s] /MediaBox [0 0 595 842] >>"
+            % (n_pages, b" ".join(b"%d 0 R" % n for n in group_nums)))
+    page = 0
+    for g, group_num in enumerate(group_nums):
+        count = min(100, n_pages - page)
+        kids = range(first_page + page, first_page + page + count)
+        # Every other group inherits US Letter instead of A4
+        box = b"/MediaBox [0 0 612 792] " if g % 2 else b""
+        pdf.obj(group_num, b"<< /Type /Pages /Parent %d 0 R %s/Count %d /Kids [%s] >>"
+                % (pages_num, box, count, b" ".join(b"%d 0 R" % n for n in kids)))
+        for num in kids:
+            pdf.obj(num, b"<< /Type /Page /Parent %d 0 R %s >>" % (group_num, page_body(page)))
+            page += 1
+    return first_page + n_pages
+
+def write_pages_pdf(path, n_pages, rnd):
+    """Many pages in a page tree, a link annotation every PDF_ANNOT_EVERY pages."""
+    pdf = _PdfWriter()
+    content, font, info = 2, 3, 4
+    pdf.stream(content, b"BT /F1 12 Tf 72 720 Td (benchmark page) Tj ET\n")
+    pdf.obj(font, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    _pdf_info(pdf, info, rnd)
+    n_annots = n_pages // PDF_ANNOT_EVERY
+    first_annot = 5
+    first_page = first_annot + n_annots
+    for i in range(n_annots):
+        pdf.obj(first_annot + i, b"<< /Type /Annot /Subtype /Link /Rect [72 72 200 90] /Border [0 0 0]"
+                                 b" /A << /S /URI /URI (%s) >> >>" % _url(rnd, i).encode())
+
+    def page_body(page):
+        annots = b""
+        if page % PDF_ANNOT_EVERY == 0 and page // PDF_ANNOT_EVERY < n_annots:
+            annots = b"/Annots [%d 0 R] " % (first_annot + page // PDF_ANNOT_EVERY)
+        return b"/Contents %d 0 R /Resources << /Font << /F1 %d 0 R >> >> %s" % (content, font, annots)
+
+    # The page tree root and its groups follow the pages
+    pages_num = first_page + n_pages
+    pdf.obj(1, b"<< /Type /Catalog /Pages %d 0 R >>" % pages_num)
+    _page_tree(pdf, pages_num, first_page, n_pages, page_body)
+    pdf.save(path, 1, info)
+
+def write_streams_pdf(path, n_pages, rnd):
+    """Pages with large Flate content streams, a URL every 50 lines."""
+    pdf = _PdfWriter()
+    pdf.obj(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+    _pdf_info(pdf, 3, rnd)
+    first = 4
+    for i in range(n_pages):
+        lines = []
+        for j in range(PDF_STREAM_LINES):
+            if j % 50 == 0:
+                lines.append(b"BT 72 %d Td (%s) Tj ET" % (j % 700, _url(rnd, i * PDF_STREAM_LINES + j).encode()))
+            else:
+                lines.append(b"%d %d m %d %d l S" % (rnd.randrange(600), rnd.randrange(800), rnd.randrange(600), j))
+        pdf.stream(first + n_pages + i, b"\n".join(lines))
+    _page_tree(pdf, 2, first, n_pages, lambda page: b"/Contents %d 0 R" % (first + n_pages + page))
+    pdf.save(path, 1, 3)
+
+# --- OOXML -----------------------------------------------------------------
+
+REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+DOC_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+CT_NS = "http://schemas.openxmlformats.org/package/2006/content-types"
+
+def _zip(path, parts):
+    """Writes [(name, text or bytes)] in order with fixed timestamps."""
+    with ZipFile(path, "w") as z:
+        for name, data in parts:
+            info = ZipInfo(name, date_time=(2024, 1, 2, 3, 4, 6))
+            info.compress_type = ZIP_DEFLATED
+            z.writestr(info, data.encode("utf-8") if isinstance(data, str) else data)
+
+def _rels(rels):
+    items = "".join(
+        f'<Relationship Id="{rid}" Type="{DOC_REL}/{kind}" Target="{target}"'
+        + (' TargetMode="External"' if external else "") + "/>"
+        for rid, kind, target, external in rels)
+    return f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<Relationships xmlns="{REL_NS}">{items}</Relationships>'
+
+def _content_types(overrides):
+    items = "".join(f'<Override PartName="/{name}" ContentType="{ctype}"/>' for name, ctype in overrides)
+    return (f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<Types xmlns="{CT_NS}">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            f'{items}</Types>')
+
+def _doc_props(title):
+    core = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<cp:coreProperties xmlns:cp="http://schemas.openxmlformats.org/package/2006/metadata/core-properties"'
+            ' xmlns:dc="http://purl.org/dc/elements/1.1/" xmlns:dcterms="http://purl.org/dc/terms/"'
+            ' xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">'
+            f'<dc:title>{title}</dc:title><dc:creator>benchmarks.corpus</dc:creator><cp:revision>3</cp:revision>'
+            '<dcterms:created xsi:type="dcterms:W3CDTF">2024-01-02T03:04:05Z</dcterms:created>'
+            '<dcterms:modified xsi:type="dcterms:W3CDTF">2024-01-02T03:04:06Z</dcterms:modified>'
+            '</cp:coreProperties>')
+    app = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+           '<Properties xmlns="http://schemas.openxmlformats.org/officeDocument/2006/extended-properties">'
+           '<Application>benchmarks.corpus</Application><Template>Normal.dotm</Template><Pages>42</Pages>'
+           '</Properties>')
+    return [("docProps/core.xml", core), ("docProps/app.xml", app)]
+
+def _package_rels(main_part):
+    return ("_rels/.rels", _rels([
+        ("rId1", "officeDocument", main_part, False),
+        ("rId2", "extended-properties", "docProps/app.xml", False),
+    ]))
+
+W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+
+def write_docx(path, n_links, n_revisions, n_comments, rnd):
+    """One paragraph per hyperlink, tracked changes spread through the body."""
+    rels = [("rIdComments", "comments", "comments.xml", False)]
+    body = []
+    every = max(1, n_links // max(1, n_revisions))
+    for i in range(n_links):
+        rid = f"rIdL{i}"
+        rels.append((rid, "hyperlink", _url(rnd, i).replace("&", "&amp;"), True))
+        run = f'<w:hyperlink r:id="{rid}"><w:r><w:t>link {i}</w:t></w:r></w:hyperlink>'
+        if i % every == 0:
+            kind = "ins" if (i // every) % 2 == 0 else "del"
+            text = "w:delText" if kind == "del" else "w:t"
+            run += (f'<w:{kind} w:id="{i}" w:author="Author {i % 7}" w:date="2024-01-02T03:04:05Z">'
+                    f'<w:r><{text}>change {i}</{text}></w:r></w:{kind}>')
+        body.append(f"<w:p><w:r><w:t>Paragraph {i} </w:t></w:r>{run}</w:p>")
+        if i % 1000 == 999:
+            body.append('<w:tbl><w:tr><w:tc><w:p><w:r><w:t>cell</w:t></w:r></w:p></w:tc></w:tr></w:tbl>')
+    document = (f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<w:document xmlns:w="{W_NS}" xmlns:r="{DOC_REL}">'
+                f'<w:body>{"".join(body)}<w:sectPr/></w:body></w:document>')
+    comments = "".join(f'<w:comment w:id="{i}" w:author="Reviewer {i % 3}" w:date="2024-01-02T03:04:05Z">'
+                       f'<w:p><w:r><w:t>comment {i}</w:t></w:r></w:p></w:comment>' for i in range(n_comments))
+    _zip(path, [
+        ("[Content_Types].xml", _content_types([
+            ("word/document.xml", "application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"),
+            ("word/comments.xml", "application/vnd.openxmlformats-officedocument.wordprocessingml.comments+xml"),
+            ("docProps/core.xml", "application/vnd.openxmlformats-package.core-properties+xml"),
+            ("docProps/app.xml", "application/vnd.openxmlformats-officedocument.extended-properties+xml"),
+        ])),
+        _package_rels("word/document.xml"),
+        *_doc_props("Benchmark document"),
+        ("word/document.xml", document),
+        ("word/_rels/document.xml.rels", _rels(rels)),
+        ("word/comments.xml", f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<w:comments xmlns:w="{W_NS}">{comments}</w:comments>'),
+    ])
+
+P_NS = "http://schemas.openxmlformats.org/presentationml/2006/main"
+A_NS = "http://schemas.openxmlformats.org/drawingml/2006/main"
+
+def _shape(text, rid=None, placeholder=None):
+    ph = f'<p:nvPr><p:ph type="{placeholder}"/></p:nvPr>' if placeholder else "<p:nvPr/>"
+    link = f'<a:hlinkClick r:id="{rid}"/>' if rid else ""
+    return (f'<p:sp><p:nvSpPr><p:cNvPr id="2" name="Text"/><p:cNvSpPr/>{ph}</p:nvSpPr><p:spPr/>'
+            f'<p:txBody><a:bodyPr/><a:p><a:r><a:rPr>{link}</a:rPr><a:t>{text}</a:t></a:r></a:p></p:txBody></p:sp>')
+
+def _slide_xml(root, shapes):
+    return (f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            f'<p:{root} xmlns:p="{P_NS}" xmlns:a="{A_NS}" xmlns:r="{DOC_REL}"><p:cSld><p:spTree>'
+            f'<p:nvGrpSpPr><p:cNvPr id="1" name=""/><p:cNvGrpSpPr/><p:nvPr/></p:nvGrpSpPr><p:grpSpPr/>'
+            f'{"".join(shapes)}</p:spTree></p:cSld></p:{root}>')
+
+def write_pptx(path, n_slides, rnd):
+    """Slides with two hyperlinks each, notes on every other slide."""
+    parts, overrides = [], []
+    pres_rels = [("rIdMaster", "slideMaster", "slideMasters/slideMaster1.xml", False)]
+    slide_ids = []
+    for i in range(1, n_slides + 1):
+        slide = f"ppt/slides/slide{i}.xml"
+        rels = [("rId1", "hyperlink", _url(rnd, 2 * i), True), ("rId2", "hyperlink", _url(rnd, 2 * i + 1), True)]
+        if i % 2:
+            rels.append(("rId3", "notesSlide", f"../notesSlides/notesSlide{i}.xml", False))
+            parts.append((f"ppt/notesSlides/notesSlide{i}.xml",
+                          _slide_xml("notes", [_shape(f"speaker notes {i}", placeholder="body")])))
+            overrides.append((f"ppt/notesSlides/notesSlide{i}.xml", "application/vnd.openxmlformats-officedocument.presentationml.notesSlide+xml"))
+        parts.append((slide, _slide_xml("sld", [_shape(f"Title {i}", placeholder="title"), _shape("first", "rId1"), _shape("second", "rId2")])))
+        parts.append((f"ppt/slides/_rels/slide{i}.xml.rels", _rels(rels)))
+        overrides.append((slide, "application/vnd.openxmlformats-officedocument.presentationml.slide+xml"))
+        pres_rels.append((f"rIdS{i}", "slide", f"slides/slide{i}.xml", False))
+        slide_ids.append(f'<p:sldId id="{255 + i}" r:id="rIdS{i}"/>')
+    presentation = (f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                    f'<p:presentation xmlns:p="{P_NS}" xmlns:a="{A_NS}" xmlns:r="{DOC_REL}">'
+                    f'<p:sldMasterIdLst><p:sldMasterId id="2147483648" r:id="rIdMaster"/></p:sldMasterIdLst>'
+                    f'<p:sldIdLst>{"".join(slide_ids)}</p:sldIdLst><p:sldSz cx="9144000" cy="6858000"/></p:presentation>')
+    theme = f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<a:theme xmlns:a="{A_NS}" name="Benchmark Theme"><a:themeElements/></a:theme>'
+    _zip(path, [
+        ("[Content_Types].xml", _content_types([
+            ("ppt/presentation.xml", "application/vnd.openxmlformats-officedocument.presentationml.presentation.main+xml"),
+            ("ppt/slideMasters/slideMaster1.xml", "application/vnd.openxmlformats-officedocument.presentationml.slideMaster+xml"),
+            ("ppt/theme/theme1.xml", "application/vnd.openxmlformats-officedocument.theme+xml"),
+            *overrides,
+        ])),
+        _package_rels("ppt/presentation.xml"),
+        *_doc_props("Benchmark deck"),
+        ("ppt/presentation.xml", presentation),
+        ("ppt/_rels/presentation.xml.rels", _rels(pres_rels)),
+        ("ppt/slideMasters/slideMaster1.xml", _slide_xml("sldMaster", [])),
+        ("ppt/slideMasters/_rels/slideMaster1.xml.rels", _rels([("rId1", "theme", "../theme/theme1.xml", False)])),
+        ("ppt/theme/theme1.xml", theme),
+        *parts,
+    ])
+
+S_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+
+def _column(index):
+    name = ""
+    index += 1
+    while index:
+        index, rem = divmod(index - 1, 26)
+        name = chr(65 + rem) + name
+    return name
+
+def write_xlsx(path, n_rows, n_cols, n_links, rnd):
+    """One huge sheet of numbers and inline strings with hyperlinks, plus a small one."""
+    last = f"{_column(n_cols - 1)}{n_rows}"
+    rows = []
+    for r in range(1, n_rows + 1):
+        cells = "".join(
+            f'<c r="{_column(c)}{r}"><v>{rnd.randrange(10 ** 6)}</v></c>' if c % 3 else
+            f'<c r="{_column(c)}{r}" t="inlineStr"><is><t>row {r}</t></is></c>'
+            for c in range(n_cols))
+        rows.append(f'<row r="{r}">{cells}</row>')
+    every = max(1, n_rows // max(1, n_links))
+    links = "".join(f'<hyperlink ref="A{r}" r:id="rIdH{r}"/>' for r in range(1, n_rows + 1, every))
+    sheet_rels = [(f"rIdH{r}", "hyperlink", _url(rnd, r), True) for r in range(1, n_rows + 1, every)]
+    sheet_rels.append(("rIdC", "comments", "../comments1.xml", False))
+    sheet1 = (f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<worksheet xmlns="{S_NS}" xmlns:r="{DOC_REL}">'
+              f'<dimension ref="A1:{last}"/><sheetData>{"".join(rows)}</sheetData>'
+              f'<hyperlinks>{links}</hyperlinks></worksheet>')
+    sheet2 = (f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<worksheet xmlns="{S_NS}" xmlns:r="{DOC_REL}">'
+              f'<dimension ref="A1:A1"/><sheetData><row r="1"><c r="A1"><v>1</v></c></row></sheetData></worksheet>')
+    workbook = (f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<workbook xmlns="{S_NS}" xmlns:r="{DOC_REL}">'
+                '<sheets><sheet name="Data" sheetId="1" r:id="rId1"/><sheet name="Summary" sheetId="2" r:id="rId2"/></sheets></workbook>')
+    comments = "".join(f'<comment ref="B{i + 1}" authorId="0"><text><r><t>note {i}</t></r></text></comment>' for i in range(100))
+    _zip(path, [
+        ("[Content_Types].xml", _content_types([
+            ("xl/workbook.xml", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"),
+            ("xl/worksheets/sheet1.xml", "application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"),
+            ("xl/worksheets/sheet2.xml", "application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"),
+            ("xl/comments1.xml", "application/vnd.openxmlformats-officedocument.spreadsheetml.comments+xml"),
+        ])),
+        _package_rels("xl/workbook.xml"),
+        *_doc_props("Benchmark workbook"),
+        ("xl/workbook.xml", workbook),
+        ("xl/_rels/workbook.xml.rels", _rels([("rId1", "worksheet", "worksheets/sheet1.xml", False),
+                                              ("rId2", "worksheet", "worksheets/sheet2.xml", False)])),
+        ("xl/worksheets/sheet1.xml", sheet1),
+        ("xl/worksheets/_rels/sheet1.xml.rels", _rels(sheet_rels)),
+        ("xl/worksheets/sheet2.xml", sheet2),
+        ("xl/comments1.xml", f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<comments xmlns="{S_NS}">'
+                             f'<authors><author>bench</author></authors><commentList>{comments}</commentList></comments>'),
+    ])
+
+def build_corpus(directory, scale=1.0, seed=DEFAULT_SEED):
+    """
+    Writes the corpus into `directory` and returns {name: path}. A corpus
+    already there with the same scale, seed and generator version is
+    reused as is.
+    """
+    os.makedirs(directory, exist_ok=True)
+    manifest_path = os.path.join(directory, "manifest.json")
+    manifest = {"generator": GENERATOR_VERSION, "scale": scale, "seed": seed}
+    paths = {name: os.path.join(directory, name) for name in CORPUS}
+    try:
+        with open(manifest_path) as f:
+            if json.load(f) == manifest and all(os.path.exists(p) for p in paths.values()):
+                return paths
+    except (OSError, ValueError):
+        pass
+
+    def n(count):
+        return max(1, int(count * scale))
+
+    for name, write in CORPUS.items():
+        # One generator per file, so files do not shift when another changes
+        write(paths[name], n, random.Random(f"{seed}:{name}"))
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f)
+    return paths
@@ -0,0 +1,212 @@
+"""
+Times the public extractors on the synthetic corpus and compares them
+with a stored baseline:
+
+    python -m benchmarks.run                      # compare, exit 1 on a regression
+    python -m benchmarks.run --update-baseline    # record the current numbers
+    python -m benchmarks.run --scale 1 --threshold 10 -k xlsx
+
+Each benchmark is timed as the best of --repeat runs (perf_counter), and
+its peak Python allocation is taken in one more run under tracemalloc,
+so tracing never slows the timed runs. Times are compared after scaling
+by a fixed reference workload timed alongside them, so a machine that is
+busier or slower than when the baseline was taken does not show up as a
+regression across the board.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from benchmarks.corpus import DEFAULT_SEED, build_corpus
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+DEFAULT_SCALE = 0.2
+DEFAULT_REPEAT = 5
+DEFAULT_THRESHOLD = 25.0        # % slower (or bigger) than the baseline that fails
+# Differences under these floors are noise, whatever the percentage
+MIN_SECONDS = 0.005
+MIN_BYTES = 512 * 1024
+REFERENCE = "reference"
+
+def _inspect(path):
+    from libs.inspector import inspect_file
+    result = inspect_file(path)
+    if result["error"]:
+        raise RuntimeError(result["error"])
+    return result
+
+def _extractor(module, name, **kwargs):
+    def run(path):
+        import importlib
+        return getattr(importlib.import_module(module), name)(path, **kwargs)
+    return run
+
+# name -> (corpus file, callable taking the file's path)
+BENCHMARKS = {
+    "pdf.get_pdf_basic_info": ("pages.pdf", _extractor("libs.pdf", "get_pdf_basic_info")),
+    "pdf.extract_metadata": ("pages.pdf", _extractor("libs.pdf", "extract_metadata")),
+    "pdf.extract_link_annotations": ("pages.pdf", _extractor("libs.pdf", "extract_link_annotations")),
+    "pdf.scan_pdf_urls": ("streams.pdf", _extractor("libs.pdf", "scan_pdf_urls")),
+    "pdf.extract_urls_from_pdf_raw": ("streams.pdf", _extractor("libs.pdf", "extract_urls_from_pdf_raw")),
+    "docx.get_docx_basic_info": ("links.docx", _extractor("libs.doc", "get_docx_basic_info")),
+    "docx.scan_revision_marks": ("links.docx", _extractor("libs.doc", "scan_revision_marks")),
+    "docx.extract_docx_links": ("links.docx", _extractor("libs.doc", "extract_docx_links")),
+    "pptx.get_pptx_basic_info": ("slides.pptx", _extractor("libs.ppt", "get_pptx_basic_info")),
+    "pptx.scan_slides": ("slides.pptx", _extractor("libs.ppt", "scan_slides")),
+    "xlsx.get_xlsx_basic_info": ("cells.xlsx", _extractor("libs.xlsx", "get_xlsx_basic_info")),
+    "xlsx.scan_worksheets": ("cells.xlsx", _extractor("libs.xlsx", "scan_worksheets")),
+    "inspect_file.pdf_pages": ("pages.pdf", _inspect),
+    "inspect_file.pdf_streams": ("streams.pdf", _inspect),
+    "inspect_file.docx": ("links.docx", _inspect),
+    "inspect_file.pptx": ("slides.pptx", _inspect),
+    "inspect_file.xlsx": ("cells.xlsx", _inspect),
+}
+
+def _reference_workload():
+    # The kind of work the extractors do: inflate, parse XML, match URLs
+    import re
+    import zlib
+    from xml.etree import ElementTree
+    xml = "".join(f'<r id="{i}"><t>https://example.com/{i}</t></r>' for i in range(20000))
+    data = zlib.compress(f"<root>{xml}</root>".encode())
+    text = zlib.decompress(data).decode()
+    root = ElementTree.fromstring(text)
+    return len(root), len(re.findall(r"https?://[^<\s]+", text))
+
+def measure(jobs, repeat=DEFAULT_REPEAT):
+    """
+    Times {name: (func, path)} jobs and returns {name: {"seconds",
+    "peak_bytes"}}. The repeats are interleaved: every round runs each job
+    once, and each keeps its best time, so a moment of load on the machine
+    costs one sample of a few jobs rather than all samples of one. The
+    tracemalloc peak comes from one more run per job.
+    """
+    for func, path in jobs.values():
+        func(path)  # warm-up: imports, page cache
+    best = {}
+    for _ in range(repeat):
+        for name, (func, path) in jobs.items():
+            gc.collect()
+            start = time.perf_counter()
+            func(path)
+            elapsed = time.perf_counter() - start
+            best[name] = min(best.get(name, elapsed), elapsed)
+    results = {}
+    for name, (func, path) in jobs.items():
+        gc.collect()
+        tracemalloc.start()
+        try:
+            func(path)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        results[name] = {"seconds": round(best[name], 6), "peak_bytes": peak}
+    return results
+
+def compare(current, baseline, threshold=DEFAULT_THRESHOLD, speed=1.0):
+    """
+    Returns [(name, status)] for every current result: "ok", "new" (not in
+    the baseline), or what regressed ("slower", "memory", "slower+memory").
+    Current times are multiplied by `speed` (baseline reference time over
+    current reference time) before comparing.
+    """
+    limit = 1 + threshold / 100
+    statuses = []
+    for name, now in current.items():
+        before = baseline.get(name)
+        if before is None:
+            statuses.append((name, "new"))
+            continue
+        bad = []
+        seconds = now["seconds"] * speed
+        if seconds > before["seconds"] * limit and seconds - before["seconds"] > MIN_SECONDS:
+            bad.append("slower")
+        if now["peak_bytes"] > before["peak_bytes"] * limit and now["peak_bytes"] - before["peak_bytes"] > MIN_BYTES:
+            bad.append("memory")
+        statuses.append((name, "+".join(bad) or "ok"))
+    return statuses
+
+def _change(now, before):
+    if not before:
+        return ""
+    return f"{(now / before - 1) * 100:+.0f}%"
+
+def print_report(current, baseline, statuses, speed=1.0):
+    print(f"{'benchmark':32} {'seconds':>9} {'change':>7} {'peak MiB':>9} {'change':>7}  status")
+    for name, status in statuses:
+        now, before = current[name], baseline.get(name, {})
+        print(f"{name:32} {now['seconds']:9.4f} {_change(now['seconds'] * speed, before.get('seconds')):>7}"
+              f" {now['peak_bytes'] / 2 ** 20:9.2f} {_change(now['peak_bytes'], before.get('peak_bytes')):>7}  {status}")
+
+def load_baseline(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run",
+                                     description="Benchmark the extractors on a synthetic corpus")
+    parser.add_argument("--scale", type=float, default=None,
+                        help=f"Corpus size factor (default: the baseline's, else {DEFAULT_SCALE})")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="Timed runs per benchmark (best is kept)")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Percent over the baseline (time or peak memory) that counts as a regression")
+    parser.add_argument("--update-baseline", action="store_true", help="Write the results as the new baseline")
+    parser.add_argument("--baseline", default=BASELINE, help="Baseline JSON file")
+    parser.add_argument("--corpus", default=None, help="Directory for the generated corpus (reused across runs)")
+    parser.add_argument("-k", dest="select", action="append", default=[],
+                        help="Only run benchmarks whose name contains this (repeatable)")
+    args = parser.parse_args(argv)
+
+    stored = load_baseline(args.baseline)
+    scale = args.scale if args.scale is not None else (stored or {}).get("scale", DEFAULT_SCALE)
+    if stored and not args.update_baseline and stored.get("scale") != scale:
+        print(f"Baseline was recorded at scale {stored.get('scale')}, not {scale}; "
+              "use that scale or --update-baseline.", file=sys.stderr)
+        return 2
+    corpus_dir = args.corpus or os.path.join(tempfile.gettempdir(), f"docinspector-bench-{scale:g}")
+    print(f"Building corpus (scale {scale:g}) in {corpus_dir}...", file=sys.stderr)
+    paths = build_corpus(corpus_dir, scale, DEFAULT_SEED)
+
+    jobs = {name: (func, paths[corpus_file]) for name, (corpus_file, func) in BENCHMARKS.items()
+            if not args.select or any(s in name for s in args.select)}
+    jobs[REFERENCE] = (lambda _: _reference_workload(), None)
+    print(f"Running {len(jobs) - 1} benchmark(s), {args.repeat} round(s)...", file=sys.stderr)
+    current = measure(jobs, args.repeat)
+    reference = current.pop(REFERENCE)["seconds"]
+    baseline = (stored or {}).get("results", {})
+    speed = stored["reference_seconds"] / reference if stored and not args.update_baseline else 1.0
+    print(f"Reference workload: {reference:.4f}s (times scaled by {speed:.2f} to the baseline machine)",
+          file=sys.stderr)
+    statuses = compare(current, baseline, args.threshold, speed)
+    print_report(current, baseline, statuses, speed)
+
+    if args.update_baseline:
+        results = {}
+        if stored and stored.get("scale") == scale:
+            # Keep the benchmarks not run this time, rescaled to this run's reference
+            factor = reference / stored["reference_seconds"]
+            results = {name: dict(r, seconds=round(r["seconds"] * factor, 6)) for name, r in baseline.items()}
+        results.update(current)
+        with open(args.baseline, "w") as f:
+            json.dump({"scale": scale, "seed": DEFAULT_SEED, "python": platform.python_version(),
+                       "machine": platform.machine(), "reference_seconds": round(reference, 6),
+                       "results": dict(sorted(results.items()))}, f, indent=2)
+            f.write("\n")
+        print(f"Baseline written to {args.baseline}", file=sys.stderr)
+        return 0
+    regressions = [name for name, status in statuses if status not in ("ok", "new")]
+    if regressions:
+        print(f"{len(regressions)} regression(s) over {args.threshold:g}%: {', '.join(regressions)}", file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
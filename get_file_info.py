@@ -1,13 +1,14 @@
 import sys
 import os
+import glob
 import argparse
-from libs.pdf import get_pdf_basic_info, extract_metadata, extract_link_annotations
-from libs.doc import get_docx_basic_info
-from libs.ppt import is_pptx_file, get_pptx_basic_info
-from libs.xlsx import is_xlsx_file, get_xlsx_basic_info
+from libs.inspector import UNSUPPORTED, InspectOptions, iter_inputs, run_batch
 from libs.shared import human_readable_size
+from libs.detect import detect_urls
+from libs.classify import classify_urls
+from libs.profile import merge
 
-def print_ascii_table(array_table, headers):
+def print_ascii_table(array_table, headers, file=None):
     cols = len(headers)
     col_widths = [len(str(header)) for header in headers]
     for row in array_table:
@@ -16,49 +17,209 @@ def print_ascii_table(array_table, headers):
     sep_line = "┌" + "┬".join("─"*(w+2) for w in col_widths) + "┐"
     mid_line = "├" + "┼".join("─"*(w+2) for w in col_widths) + "┤"
     bot_line = "└" + "┴".join("─"*(w+2) for w in col_widths) + "┘"
-    print(sep_line)
+    print(sep_line, file=file)
     header_line = "│ " + " │ ".join(headers[i].ljust(col_widths[i]) for i in range(cols)) + " │"
-    print(header_line)
-    print(mid_line)
+    print(header_line, file=file)
+    print(mid_line, file=file)
     for row in array_table:
-        print("│ " + " │ ".join(str(row[i]).ljust(col_widths[i]) for i in range(cols)) + " │")
-    print(bot_line)
+        print("│ " + " │ ".join(str(row[i]).ljust(col_widths[i]) for i in range(cols)) + " │", file=file)
+    print(bot_line, file=file)
 
-def is_pdf_file(filename):
-    if not os.path.isfile(filename):
-        return False
-    try:
-        with open(filename, "rb") as f:
-            sig = f.read(5)
-        return sig == b"%PDF-"
-    except Exception:
-        return False
+TAG_COLORS = {"allow": "92", "deny": "91"}
 
-def is_docx_file(filename):
-    if not filename.lower().endswith('.docx'):
-        return False
-    if not os.path.isfile(filename):
-        return False
-    try:
-        with open(filename, "rb") as f:
-            sig = f.read(2)
-        return sig == b'PK'
-    except Exception:
-        return False
+def print_url_list(urls, args, url_objects=None):
+    """Prints URLs tagged by the domain lists; canary hits tag unlisted hosts."""
+    if not urls:
+        print("  (none found)")
+        return
+    verdicts = classify_urls(urls, args.domains)
+    canary = detect_urls(urls, args.rules)["canary"]
+    for url in urls:
+        verdict = verdicts[url]
+        if verdict is not None and verdict.action == "ignore":
+            continue
+        tag = ""
+        if verdict is not None:
+            tag += f" [\033[{TAG_COLORS[verdict.action]}m{verdict.label}\033[0m]"
+        elif url in canary:
+            tag += " [\033[91mCANARY\033[0m]"
+        elif args.ALL:
+            tag += " [\033[90mUNKNOWN\033[0m]"
+        if args.ALL and url_objects and url_objects.get(url):
+            tag += " (obj " + ", ".join(str(n) for n in url_objects[url]) + ")"
+        print(f"  - {url}{tag}")
+
+def print_detections(urls, label, rules_path=None):
+    hits = detect_urls(urls, rules_path)
+    if hits["canary"]:
+        print(f"\n\033[91mWARNING: Canarytoken(s) detected in {label}!\033[0m")
+        for url, names in hits["canary"].items():
+            print(f"  Suspicious URL: {url} [{', '.join(names)}]")
+    else:
+        print(f"\nNo canarytoken URLs detected in {label}.")
+    if hits["tracking"]:
+        print(f"\n\033[93mTracking URL(s) detected in {label}:\033[0m")
+        for url, names in hits["tracking"].items():
+            print(f"  - {url} [{', '.join(names)}]")
+
+def print_list(items):
+    if items:
+        for item in items:
+            print("  -", item)
+    else:
+        print("  (none found)")
 
-def is_doc_file(filename):
-    if not filename.lower().endswith('.doc'):
-        return False
-    if not os.path.isfile(filename):
-        return False
-    try:
-        with open(filename, "rb") as f:
-            sig = f.read(8)
-        return sig == b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
-    except Exception:
-        return False
+def print_comments(comments, place_key="date"):
+    print("\nComments:")
+    if comments:
+        for c in comments:
+            author = c.get("author", "")
+            text = c.get("text", "")
+            if place_key == "location":
+                print(f"  - {author} @ {c.get('location', '')}: {text}")
+            else:
+                print(f"  - {author} ({c.get('date', '')}): {text}")
+    else:
+        print("  (none found)")
 
-if __name__ == "__main__":
+def render_pdf(info, args):
+    array_table = []
+    array_table.append(["file_size_bytes", info["file_size_bytes"]])
+    array_table.append(["file_size_human", human_readable_size(info["file_size_bytes"])])
+    array_table.append(["pdf_version", info["pdf_version"]])
+    array_table.append(["is_encrypted", info["is_encrypted"]])
+    array_table.append(["num_pages", info["num_pages"]])
+    array_table.append(["page_size", info["page_size"]])
+    array_table += info["meta"]
+    if args.debug:
+        print("\n[DEBUG] Raw PDF metadata:")
+        for k, v in info.get("raw_metadata", {}).items():
+            print(f"  {k}: {v}")
+    print_ascii_table(array_table, ["Property", "Value"])
+
+    url_objects = info["url_objects"]
+    raw_urls = sorted(url_objects)
+    if args.ALL:
+        meta_urls = info.get("metadata_urls", {})
+        all_urls = raw_urls + [u for u in meta_urls if u not in url_objects]
+        print("\nALL URLs found in PDF (raw scan + metadata):")
+    else:
+        all_urls = list(info.get("annotation_urls", {}))
+        print("\nURLs found in PDF link annotations (visible/clickable):")
+    print_url_list(all_urls, args, url_objects)
+    if info["truncated_streams"]:
+        print("\n\033[93mWARNING: Some PDF streams were not fully decoded:\033[0m")
+        for t in info["truncated_streams"]:
+            decoded = f", {t['decoded_bytes']} bytes decoded" if "decoded_bytes" in t else ""
+            print(f"  - obj {t['object']}: {t['reason']}{decoded}")
+    print_detections(raw_urls + [u for u in all_urls if u not in url_objects], "PDF", args.rules)
+
+def render_docx(info, args):
+    array_table = []
+    array_table.append(["format", info.get("format")])
+    array_table.append(["file_size_bytes", info["file_size_bytes"]])
+    array_table.append(["file_size_human", info["file_size_human"]])
+    array_table.append(["num_pages", info.get("num_pages")])
+    array_table.append(["has_revision_marks", info.get("has_revision_marks")])
+    array_table.append(["num_paragraphs", info["num_paragraphs"]])
+    array_table.append(["num_tables", info["num_tables"]])
+    array_table += info["meta"]
+    print_ascii_table(array_table, ["Property", "Value"])
+
+    if args.revisions:
+        print("\nRevision marks:")
+        revisions = info.get("revisions", {})
+        if revisions:
+            for tag, entry in revisions.items():
+                authors = ", ".join(entry["authors"]) or "unknown author"
+                print(f"  - {tag}: {entry['count']} ({authors})")
+        else:
+            print("  (none found)")
+
+    print("\nEmbedded URLs:")
+    urls = info.get("links", [])
+    print_url_list(urls, args)
+    print_detections(urls, "DOCX", args.rules)
+
+    print("\nEmbedded Images:")
+    print_list(info.get("images", []))
+    print_comments(info.get("comments", []))
+
+def render_doc(info, args):
+    array_table = []
+    array_table.append(["file_size_bytes", info["file_size_bytes"]])
+    array_table.append(["file_size_human", info["file_size_human"]])
+    array_table.append(["num_paragraphs", info["num_paragraphs"]])
+    array_table.append(["num_tables", info["num_tables"]])
+    array_table.append(["has_macros", info["has_vba_macros"]])
+    array_table.append(["num_custom_xml", len(info["custom_xml_parts"])])
+    array_table += info["meta"]
+    print_ascii_table(array_table, ["Property", "Value"])
+    print("\nEmbedded URLs:")
+    urls = info.get("links", [])
+    print_url_list(urls, args)
+    print_detections(urls, "DOC", args.rules)
+    print("\nEmbedded Images:")
+    print_list(info.get("images", []))
+    print_comments(info.get("comments", []))
+
+def render_pptx(info, args):
+    array_table = []
+    array_table.append(["format", info.get("format")])
+    array_table.append(["file_size_bytes", info["file_size_bytes"]])
+    array_table.append(["file_size_human", info["file_size_human"]])
+    array_table.append(["num_slides", info["num_slides"]])
+    array_table.append(["num_slides_with_notes", info["num_slides_with_notes"]])
+    array_table.append(["has_macros", info["has_vba_macros"]])
+    array_table.append(["num_custom_xml", len(info["custom_xml_parts"])])
+    array_table += info["meta"]
+    print_ascii_table(array_table, ["Property", "Value"])
+
+    print("\nEmbedded URLs:")
+    urls = info.get("links", [])
+    print_url_list(urls, args)
+    print_detections(urls, "PPTX", args.rules)
+
+    print("\nEmbedded Images:")
+    print_list(info.get("images", []))
+    print_comments(info.get("comments", []))
+
+def render_xlsx(info, args):
+    array_table = []
+    array_table.append(["format", info.get("format")])
+    array_table.append(["file_size_bytes", info["file_size_bytes"]])
+    array_table.append(["file_size_human", info["file_size_human"]])
+    array_table.append(["sheet_count", info.get("sheet_count", 0)])
+    array_table += info.get("meta", [])
+    print_ascii_table(array_table, ["Property", "Value"])
+
+    print("\nSheets:")
+    sheets = [sh for sh in info.get("sheets", []) if sh["name"]]
+    if sheets:
+        for sh in sheets:
+            dimension = f"{sh['dimension']}, " if sh["dimension"] else ""
+            print(f"  - {sh['name']} ({dimension}{sh['rows']} rows, {sh['cells']} cells)")
+    else:
+        print("  (none found)")
+
+    print("\nEmbedded URLs:")
+    urls = info.get("links", [])
+    print_url_list(urls, args)
+    print_detections(urls, "XLSX", args.rules)
+
+    print("\nEmbedded Images:")
+    print_list(info.get("images", []))
+    print_comments(info.get("comments", []), place_key="location")
+
+RENDERERS = {
+    "pdf": render_pdf,
+    "docx": render_docx,
+    "doc": render_doc,
+    "pptx": render_pptx,
+    "xlsx": render_xlsx,
+}
+
+def print_banner():
     print('░███████                            ░██████                                                          ░██                        ')
     print('░██   ░██                             ░██                                                            ░██                        ')
     print('░██    ░██  ░███████   ░███████       ░██  ░████████   ░███████  ░████████   ░███████   ░███████  ░████████  ░███████  ░██░████ ')
@@ -70,308 +231,143 @@ if __name__ == "__main__":
     print('                                                                 ░██                                                            ')
     print('                                                                                                                              ')
 
+def main(argv=None):
     parser = argparse.ArgumentParser(description="Extract file info from documents.")
-    parser.add_argument("filename", help="Path to the file to analyze.")
+    parser.add_argument("paths", nargs="*", metavar="PATH",
+                        help="Files, directories (searched recursively) or glob patterns to analyze; '-' reads paths from stdin, one per line.")
     parser.add_argument("--debug", "-D", action="store_true", help="Show raw metadata for PDF.")
     parser.add_argument("--ALL", "-A", action="store_true", help="Show ALL URLs (including metadata)")
-    args = parser.parse_args()
-    filename = args.filename
-
-    # Detect file type by signature
-    if is_pdf_file(filename):
-        filetype = "pdf"
-    elif is_docx_file(filename):
-        filetype = "docx"
-    elif is_doc_file(filename):
-        filetype = "doc"
-    elif is_pptx_file(filename):
-        filetype = "pptx"
-    elif is_xlsx_file(filename):
-        filetype = "xlsx"
-    else:
-        print("Not a supported file type (PDF, Word, PPTX, XLSX)")
-        sys.exit(1)
-
-    array_table = []
-
-    if filetype == "pdf":
-        info = get_pdf_basic_info(filename)
-        array_table.append(["file_size_bytes", info["file_size_bytes"]])
-        array_table.append(["file_size_human", human_readable_size(info["file_size_bytes"])])
-        array_table.append(["pdf_version", info["pdf_version"]])
-        array_table.append(["is_encrypted", info["is_encrypted"]])
-        array_table.append(["num_pages", info["num_pages"]])
-        array_table.append(["page_size", info["page_size"]])
-        meta_rows = extract_metadata(filename)
-        array_table += meta_rows
-        if args.debug:
-            from PyPDF2 import PdfReader
-            with open(filename, "rb") as f:
-                reader = PdfReader(f)
-                metadata = reader.metadata
-                print("\n[DEBUG] Raw PDF metadata:")
-                for k, v in dict(metadata).items():
-                    print(f"  {k}: {v}")
-        print_ascii_table(array_table, ["Property", "Value"])
-
-        # URL extraction logic
-        from libs.pdf import extract_urls_from_pdf_raw, extract_link_annotations, detect_canarytokens
-        url_sources = {}
-        raw_urls = extract_urls_from_pdf_raw(filename)
-        if args.ALL:
-            all_urls = raw_urls
-            # Extract URLs from metadata as well
-            meta_urls = []
-            from PyPDF2 import PdfReader
-            with open(filename, "rb") as f:
-                reader = PdfReader(f)
-                metadata = reader.metadata
-                for v in dict(metadata).values():
-                    if isinstance(v, str) and ("http://" in v or "https://" in v):
-                        for u in v.split():
-                            if u.startswith("http://") or u.startswith("https://"):
-                                meta_urls.append(u)
-                                url_sources[u] = "metadata"
-            for u in all_urls:
-                url_sources[u] = "content"
-            all_urls += [u for u in meta_urls if u not in all_urls]
-            print("\nALL URLs found in PDF (raw scan + metadata):")
-        else:
-            all_urls = extract_link_annotations(filename)
-            for u in all_urls:
-                url_sources[u] = "annotation"
-            print("\nURLs found in PDF link annotations (visible/clickable):")
-        if all_urls:
-            for url in all_urls:
-                if "purl.org" in url.lower():
-                    continue
-                green_flag = ""
-                if "microsoft.com" in url.lower():
-                    green_flag += " [\033[92mMICROSOFT\033[0m]"
-                elif "adobe.com" in url.lower():
-                    green_flag += " [\033[92mADOBE\033[0m]"
-                elif "w3.org" in url.lower():
-                    green_flag += " [\033[92mW3 Org\033[0m]"
-                elif "wikipedia.org" in url.lower():
-                    green_flag += " [\033[92mWIKIPEDIA\033[0m]"
-                elif "canary" in url.lower():
-                    green_flag += " [\033[91mCANARY\033[0m]"
-                elif args.ALL:
-                    green_flag += " [\033[90mUNKNOWN\033[0m]"
-                print(f"  - {url}{green_flag}")
-        else:
-            print("  (none found)")
-        canarytokens = detect_canarytokens(raw_urls)
-        if canarytokens:
-            print("\n\033[91mWARNING: Canarytoken(s) detected in PDF!\033[0m")
-            for token in canarytokens:
-                print(f"  Suspicious URL: {token}")
-        else:
-            print("\nNo canarytoken URLs detected in PDF.")
-
-    elif filetype == "docx":
-        info = get_docx_basic_info(filename)
-        array_table.append(["file_size_bytes", info["file_size_bytes"]])
-        array_table.append(["file_size_human", info["file_size_human"]])
-        array_table.append(["num_pages", info.get("num_pages")])
-        array_table.append(["has_revision_marks", info.get("has_revision_marks")])
-        array_table.append(["num_paragraphs", info["num_paragraphs"]])
-        array_table.append(["num_tables", info["num_tables"]])
-        array_table += info["meta"]
-        print_ascii_table(array_table, ["Property", "Value"])
-
-        print("\nEmbedded URLs:")
-        urls = info.get("links", [])
-        if urls:
-            for url in urls:
-                print("  -", url)
-        else:
-            print("  (none found)")
-
-        print("\nEmbedded Images:")
-        images = info.get("images", [])
-        if images:
-            for img in images:
-                print("  -", img)
-        else:
-            print("  (none found)")
-
-        print("\nComments:")
-        comments = info.get("comments", [])
-        if comments:
-            for c in comments:
-                author = c.get("author", "")
-                date = c.get("date", "")
-                text = c.get("text", "")
-                print(f"  - {author} ({date}): {text}")
-        else:
-            print("  (none found)")
-
-    elif filetype == "doc":
-        info = get_doc_basic_info(filename)
-        array_table.append(["file_size_bytes", info["file_size_bytes"]])
-        array_table.append(["file_size_human", info["file_size_human"]])
-        array_table.append(["num_paragraphs", info["num_paragraphs"]])
-        array_table.append(["num_tables", info["num_tables"]])
-        array_table.append(["has_macros", info["has_vba_macros"]])
-        array_table.append(["num_custom_xml", len(info["custom_xml_parts"])])
-        array_table += info["meta"]
-        print_ascii_table(array_table, ["Property", "Value"])
-        print("\nEmbedded URLs:")
-        urls = info.get("links", [])
-        if urls:
-            for url in urls:
-                print("  -", url)
-        else:
-            print("  (none found)")
-        print("\nEmbedded Images:")
-        images = info.get("images", [])
-        if images:
-            for img in images:
-                print("  -", img)
-        else:
-            print("  (none found)")
-        print("\nComments:")
-        comments = info.get("comments", [])
-        if comments:
-            for c in comments:
-                author = c.get("author", "")
-                date = c.get("date", "")
-                text = c.get("text", "")
-                print(f"  - {author} ({date}): {text}")
-        else:
-            print("  (none found)")
-
-    elif filetype == "pptx":
-        info = get_pptx_basic_info(filename)
-        array_table.append(["file_size_bytes", info["file_size_bytes"]])
-        array_table.append(["file_size_human", info["file_size_human"]])
-        array_table.append(["num_slides", info["num_slides"]])
-        array_table.append(["num_slides_with_notes", info["num_slides_with_notes"]])
-        array_table.append(["has_macros", info["has_vba_macros"]])
-        array_table.append(["num_custom_xml", len(info["custom_xml_parts"])])
-        array_table += info["meta"]
-        print_ascii_table(array_table, ["Property", "Value"])
-
-        print("\nEmbedded URLs:")
-        urls = info.get("links", [])
-        if urls:
-            for url in urls:
-                print("  -", url)
-        else:
-            print("  (none found)")
-
-        print("\nEmbedded Images:")
-        images = info.get("images", [])
-        if images:
-            for img in images:
-                print("  -", img)
-        else:
-            print("  (none found)")
-
-        print("\nComments:")
-        comments = info.get("comments", [])
-        if comments:
-            for c in comments:
-                author = c.get("author", "")
-                date = c.get("date", "")
-                text = c.get("text", "")
-                print(f"  - {author} ({date}): {text}")
-        else:
-            print("  (none found)")
-
-    elif filetype == "xlsx":
-        info = get_xlsx_basic_info(filename)
-        array_table.append(["file_size_bytes", info["file_size_bytes"]])
-        array_table.append(["file_size_human", info["file_size_human"]])
-        array_table.append(["sheet_count", info.get("sheet_count", 0)])
-        array_table += info.get("meta", [])
-        print_ascii_table(array_table, ["Property", "Value"])
-
-        print("\nSheets:")
-        sheet_names = info.get("sheet_names", [])
-        if sheet_names:
-            for nm in sheet_names:
-                print("  -", nm)
-        else:
-            print("  (none found)")
-
-        print("\nEmbedded URLs:")
-        urls = info.get("links", [])
-        if urls:
-            for url in urls:
-                print("  -", url)
+    parser.add_argument("--jobs", "-j", type=int, default=1, help="Worker processes for PDF streams, XLSX sheets and PPTX slides (default: 1)")
+    parser.add_argument("--workers", "-w", type=int, default=1, help="Files inspected in parallel (default: 1)")
+    parser.add_argument("--queue", type=int, help="Files in flight at once with --workers (default: 2 x workers)")
+    parser.add_argument("--prefetch", type=int, default=0, metavar="N",
+                        help="Open and read ahead up to N files at once while others parse (for slow network shares)")
+    parser.add_argument("--revisions", action="store_true", help="Count DOCX revision marks and list their authors")
+    parser.add_argument("--domains", help="Allow/deny/ignore domain list for URL tags (default: libs/rules/domains.rules)")
+    parser.add_argument("--rules", help="Canary/tracking URL rules file (default: libs/rules/detect.rules)")
+    parser.add_argument("--dedupe", action="store_true", help="Inspect byte-identical files once and list them as duplicates")
+    parser.add_argument("--cache", metavar="DB", help="SQLite result cache; unchanged files are not inspected again")
+    parser.add_argument("--cache-size", type=int, default=1024, metavar="MB", help="Result cache size limit in MB (default: 1024)")
+    parser.add_argument("--format", "-f", choices=["text", "json", "ndjson"], default="text",
+                        help="text report, a JSON array, or one JSON record per line as each file finishes (default: text)")
+    parser.add_argument("--serve", metavar="ADDRESS", nargs="?", const="127.0.0.1:8765",
+                        help="Run as a daemon answering JSON inspection requests on HOST:PORT or unix:/path.sock (default: 127.0.0.1:8765); --workers sets its concurrency")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Daemon request timeout in seconds (default: 30)")
+    parser.add_argument("--allow-root", action="append", metavar="DIR", help="Only let the daemon inspect paths under DIR (repeatable)")
+    parser.add_argument("--profile", action="store_const", const="time",
+                        help="Report wall/CPU time, bytes read, ZIP opens and XML parses per extractor stage, per file and for the batch")
+    parser.add_argument("--profile-memory", dest="profile", action="store_const", const="memory",
+                        help="--profile plus peak allocation per stage (tracemalloc; inspection runs slower)")
+    args = parser.parse_args(argv)
+    if args.format == "text":
+        print_banner()
+    if args.serve:
+        from libs.server import serve
+        options = InspectOptions(jobs=1, all_urls=args.ALL, debug=args.debug, revisions=args.revisions,
+                                 profile=args.profile)
+        print(f"Serving on {args.serve} with {args.workers} worker(s)")
+        sys.stdout.flush()
+        try:
+            serve(args.serve, workers=args.workers, timeout=args.timeout, options=options, roots=args.allow_root,
+                  rules_path=args.rules, domains_path=args.domains)
+        except OSError as e:
+            print(f"Cannot serve on {args.serve}: {e}", file=sys.stderr)
+            return 2
+        return 0
+    if not args.paths:
+        parser.error("at least one PATH is required")
+
+    use_stdin = "-" in args.paths
+    paths = [p for p in args.paths if p != "-"]
+    options = InspectOptions(jobs=args.jobs, all_urls=args.ALL, debug=args.debug, revisions=args.revisions,
+                             profile=args.profile)
+    cache = None
+    if args.cache:
+        from libs.cache import ResultCache
+        cache = ResultCache(args.cache, max_bytes=args.cache_size * 1024 * 1024)
+    try:
+        results = run_batch(iter_inputs(paths, sys.stdin if use_stdin else None), options,
+                            workers=args.workers, queue_size=args.queue, cache=cache, dedupe=args.dedupe,
+                            prefetch=args.prefetch)
+        if args.format != "text":
+            from libs.output import ResultWriter
+            return write_records(results, ResultWriter(sys.stdout, args.format, args.rules, args.domains), args)
+        return print_results(results, paths, use_stdin, args)
+    finally:
+        if cache is not None:
+            cache.close()
+
+def print_results(results, paths, use_stdin, args):
+    """Prints every run_batch() result; returns the exit status."""
+    # One plain file keeps the classic single-report output
+    single = len(paths) == 1 and not use_stdin and not os.path.isdir(paths[0]) and not glob.has_magic(paths[0])
+    inspected = errors = skipped = cached = 0
+    duplicates = {}
+    profiles = {}
+    for result, explicit in results:
+        if result["filetype"] is None and not explicit and result["error"] in (UNSUPPORTED, None):
+            skipped += 1
+            continue
+        if single and explicit:
+            if result["error"] == UNSUPPORTED:
+                print(UNSUPPORTED)
+                return 1
         else:
-            print("  (none found)")
-
-        print("\nEmbedded Images:")
-        images = info.get("images", [])
-        if images:
-            for img in images:
-                print("  -", img)
+            print(f"\n=== {result['path']} ({result['filetype'] or 'unknown'}) ===")
+        if result.get("duplicate_of"):
+            duplicates.setdefault(result["duplicate_of"], []).append(result["path"])
+            print(f"Duplicate of: {result['duplicate_of']}")
+        if result["error"]:
+            errors += 1
+            print(f"\033[91mERROR: {result['path']}: {result['error']}\033[0m")
         else:
-            print("  (none found)")
-
-        print("\nComments:")
-        comments = info.get("comments", [])
-        if comments:
-            for c in comments:
-                author = c.get("author", "")
-                loc = c.get("location", "")
-                text = c.get("text", "")
-                print(f"  - {author} @ {loc}: {text}")
+            inspected += 1
+            cached += bool(result.get("cached"))
+            RENDERERS[result["filetype"]](result["info"], args)
+        if "profile" in result:
+            print_profile(result["profile"], "\nProfile:")
+            merge(profiles, result["profile"])
+        sys.stdout.flush()
+
+    if duplicates:
+        print("\nDuplicates:")
+        for original, paths in duplicates.items():
+            print(f"  {original} ({len(paths)} more)")
+            for path in paths:
+                print(f"    = {path}")
+    if profiles and not single:
+        print_profile(profiles, f"\nProfile of {profiles['files']} file(s):")
+    if not single:
+        from_cache = f" ({cached} from cache)" if args.cache else ""
+        print(f"\nInspected {inspected} file(s){from_cache}, {errors} error(s), {skipped} skipped.")
+    return 1 if errors else 0
+
+def print_profile(report, title, file=None):
+    """Prints a libs.profile report (one file's, or merged over a batch) as a table."""
+    from libs.profile import PROFILE_HEADERS, profile_rows
+    print(title, file=file)
+    print_ascii_table(profile_rows(report), PROFILE_HEADERS, file=file)
+
+def write_records(results, writer, args):
+    """Writes every run_batch() result as a schema record; the summary goes to stderr."""
+    inspected = errors = skipped = 0
+    profiles = {}
+    for result, explicit in results:
+        if result["filetype"] is None and not explicit and result["error"] in (UNSUPPORTED, None):
+            skipped += 1
+            continue
+        writer.write(result)
+        if "profile" in result:
+            merge(profiles, result["profile"])
+        if result["error"]:
+            errors += 1
         else:
-            print("  (none found)")
-
-
-def handle_xlsx(filepath):
-    info = get_xlsx_basic_info(filepath)
-    print("=== XLSX Report ===")
-    print(f"File: {filepath}")
-    print(f"Size: {info.get('file_size_human')} ({info.get('file_size_bytes')} bytes)")
-
-    meta = info.get("meta", {})
-    core = meta.get("core", {})
-    app = meta.get("app", {})
-    print("\nCore Properties:")
-    for k, v in core.items():
-        if v:
-            print(f"  - {k}: {v}")
-    print("\nApp Properties:")
-    for k, v in app.items():
-        if v:
-            print(f"  - {k}: {v}")
-
-    print(f"\nSheets ({info.get('sheet_count', 0)}):")
-    for nm in info.get("sheet_names", []):
-        print(f"  - {nm}")
-
-    print("\nLinks:")
-    links = info.get("links", [])
-    if links:
-        for l in links:
-            print(f"  - {l}")
-    else:
-        print("  (none found)")
-
-    print("\nImages:")
-    imgs = info.get("images", [])
-    if imgs:
-        for i in imgs:
-            print(f"  - {i}")
-    else:
-        print("  (none found)")
-
-    print("\nComments:")
-    comments = info.get("comments", [])
-    if comments:
-        for c in comments:
-            author = c.get("author", "")
-            loc = c.get("location", "")
-            text = c.get("text", "")
-            print(f"  - {author} @ {loc}: {text}")
-    else:
-        print("  (none found)")
-
-
+            inspected += 1
+    writer.close()
+    if profiles:
+        print_profile(profiles, f"Profile of {profiles['files']} file(s):", file=sys.stderr)
+    print(f"Inspected {inspected} file(s), {errors} error(s), {skipped} skipped.", file=sys.stderr)
+    return 1 if errors else 0
 
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,151 @@
+import os
+import pickle
+import sqlite3
+import time
+from libs.shared import file_digest
+
+# Bump whenever an extractor's output changes, so entries written by older
+# code are never served.
+EXTRACTOR_VERSION = "4"
+
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+# Pending writes are committed in batches of this many.
+COMMIT_EVERY = 256
+# Eviction leaves the cache at this fraction of its size limit, so it does
+# not run again on the very next store.
+EVICT_TO = 0.9
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    path TEXT NOT NULL,
+    options TEXT NOT NULL,
+    version TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    digest TEXT NOT NULL,
+    payload BLOB NOT NULL,
+    payload_size INTEGER NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (path, options)
+);
+CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used);
+CREATE INDEX IF NOT EXISTS results_digest ON results (digest, options, version);
+"""
+
+def stat_key(path):
+    """(size, mtime_ns, inode) of `path`: the cheap check that it has not changed."""
+    st = os.stat(path)
+    return st.st_size, st.st_mtime_ns, st.st_ino
+
+class ResultCache:
+    """
+    SQLite cache of inspection results, one row per (path, options).
+    A row is served when its (size, mtime_ns, inode) still match the file.
+    When they differ (a touch, a copy, a restore), the file's content digest
+    decides. Rows from another EXTRACTOR_VERSION are ignored and replaced.
+    Least recently used rows are evicted once the stored results exceed
+    `max_bytes`. Use from one process only; batch workers hand their
+    results back to the parent, which does the caching.
+    """
+    def __init__(self, db_path, max_bytes=DEFAULT_MAX_BYTES):
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.db = sqlite3.connect(db_path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(SCHEMA)
+        self._pending = 0
+        self.hits = self.misses = 0
+
+    def lookup(self, path, options_key, stat=None):
+        """
+        Returns (result, stat) where result is the cached result dict or
+        None on a miss; pass `stat` back to store() after inspecting.
+        `stat` may be a stat_key() of `path` taken already.
+        """
+        if stat is None:
+            try:
+                stat = stat_key(path)
+            except OSError:
+                return None, None
+        row = self.db.execute(
+            "SELECT version, size, mtime_ns, inode, digest, payload FROM results WHERE path = ? AND options = ?",
+            (path, options_key)).fetchone()
+        if row is None or row[0] != EXTRACTOR_VERSION:
+            self.misses += 1
+            return None, stat
+        version, size, mtime_ns, inode, digest, payload = row
+        if (size, mtime_ns, inode) != stat:
+            if size != stat[0] or file_digest(path) != digest:
+                self.misses += 1
+                return None, stat
+            self.db.execute("UPDATE results SET mtime_ns = ?, inode = ? WHERE path = ? AND options = ?",
+                            (stat[1], stat[2], path, options_key))
+        self._touch(path, options_key)
+        self.hits += 1
+        return pickle.loads(payload), stat
+
+    def find_digest(self, digest, options_key):
+        """A cached result for any file with content `digest`, or None."""
+        row = self.db.execute(
+            "SELECT payload FROM results WHERE digest = ? AND options = ? AND version = ? LIMIT 1",
+            (digest, options_key, EXTRACTOR_VERSION)).fetchone()
+        if row is None:
+            return None
+        self.hits += 1
+        return pickle.loads(row[0])
+
+    def store(self, path, options_key, stat, result, digest=None):
+        """Caches `result` for `path` as it was when `stat` was taken."""
+        if stat is None:
+            return
+        if digest is None:
+            try:
+                digest = file_digest(path)
+            except OSError:
+                return
+        payload = pickle.dumps(result, pickle.HIGHEST_PROTOCOL)
+        self.db.execute(
+            "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (path, options_key, EXTRACTOR_VERSION, stat[0], stat[1], stat[2], digest,
+             payload, len(payload), time.time()))
+        self._wrote()
+
+    def _touch(self, path, options_key):
+        self.db.execute("UPDATE results SET last_used = ? WHERE path = ? AND options = ?",
+                        (time.time(), path, options_key))
+        self._wrote()
+
+    def _wrote(self):
+        self._pending += 1
+        if self._pending >= COMMIT_EVERY:
+            self.flush()
+
+    def flush(self):
+        self.evict()
+        self.db.commit()
+        self._pending = 0
+
+    def evict(self):
+        """Deletes least recently used rows until the payloads fit the size limit."""
+        total = self.db.execute("SELECT COALESCE(SUM(payload_size), 0) FROM results").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - int(self.max_bytes * EVICT_TO)
+        doomed = []
+        for rowid, size in self.db.execute("SELECT rowid, payload_size FROM results ORDER BY last_used"):
+            if excess <= 0:
+                break
+            doomed.append((rowid,))
+            excess -= size
+        self.db.executemany("DELETE FROM results WHERE rowid = ?", doomed)
+
+    def close(self):
+        self.flush()
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,92 @@
+import os
+import re
+from collections import namedtuple
+
+DEFAULT_DOMAINS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "rules", "domains.rules")
+
+ACTIONS = ("allow", "deny", "ignore")
+
+Verdict = namedtuple("Verdict", ["action", "label", "domain"])
+
+# scheme://[userinfo@]host — the host is a bracketed IPv6 literal or runs up to
+# the port, path, query or fragment.
+URL_HOST_RE = re.compile(r'^[a-zA-Z][a-zA-Z0-9+.-]*://(?:[^@/?#]*@)?(\[[^\]/?#]*\]|[^:/?#]*)')
+
+def url_host(url):
+    """Lower-cased host of `url` without a trailing dot, or "" when it has none."""
+    m = URL_HOST_RE.match(url)
+    return m.group(1).lower().rstrip(".") if m else ""
+
+def load_domain_rules(path=DEFAULT_DOMAINS_PATH):
+    """
+    Reads a domains file ("<action> <domain> [label]" per line, '#'
+    comments) into a list of (action, domain, label).
+    """
+    entries = []
+    with open(path, "r", encoding="utf-8") as f:
+        for lineno, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            parts = line.split(None, 2)
+            if len(parts) < 2 or parts[0] not in ACTIONS:
+                raise ValueError(f"{path}:{lineno}: expected '<allow|deny|ignore> <domain> [label]'")
+            action, domain = parts[0], parts[1].lower().strip(".")
+            label = parts[2] if len(parts) == 3 else domain
+            entries.append((action, domain, label))
+    return entries
+
+class DomainClassifier:
+    """
+    Looks hosts up in a trie keyed by domain labels right to left
+    ("com" -> "microsoft" -> ...), so each lookup costs one step per host
+    label whatever the list size, and "microsoft.com.evil.tld" does not
+    match "microsoft.com". The deepest entry on the path wins.
+    """
+    def __init__(self, entries):
+        self._trie = {}
+        for action, domain, label in entries:
+            node = self._trie
+            for part in reversed(domain.split(".")):
+                node = node.setdefault(part, {})
+            node[None] = Verdict(action, label, domain)
+
+    def classify_host(self, host):
+        """Verdict for `host`, or None when no listed domain covers it."""
+        node = self._trie
+        verdict = None
+        for part in reversed(host.split(".")):
+            node = node.get(part)
+            if node is None:
+                break
+            verdict = node.get(None, verdict)
+        return verdict
+
+    def classify(self, url):
+        return self.classify_host(url_host(url))
+
+    def classify_urls(self, urls):
+        """Returns {url: Verdict or None}; each distinct host is looked up once."""
+        by_host = {}
+        result = {}
+        for url in urls:
+            if url in result:
+                continue
+            host = url_host(url)
+            if host not in by_host:
+                by_host[host] = self.classify_host(host)
+            result[url] = by_host[host]
+        return result
+
+_classifiers = {}
+
+def get_classifier(path=None):
+    """Loads a domains file once per process (the bundled list by default)."""
+    path = os.path.abspath(path or DEFAULT_DOMAINS_PATH)
+    classifier = _classifiers.get(path)
+    if classifier is None:
+        classifier = _classifiers[path] = DomainClassifier(load_domain_rules(path))
+    return classifier
+
+def classify_urls(urls, domains_path=None):
+    return get_classifier(domains_path).classify_urls(urls)
@@ -0,0 +1,223 @@
+import os
+import re
+from collections import namedtuple
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "rules", "detect.rules")
+
+Rule = namedtuple("Rule", ["kind", "name", "pattern"])
+
+# Trailing punctuation picked up when URLs are cut out of running text
+URL_TRAILING_JUNK = ")>.,;'\"]"
+
+def load_rules(path=DEFAULT_RULES_PATH):
+    """
+    Reads a rules file ("<kind> <name> <regex>" per line, '#' comments).
+    Raises ValueError naming the line when a regex does not compile.
+    """
+    rules = []
+    with open(path, "r", encoding="utf-8") as f:
+        for lineno, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            parts = line.split(None, 2)
+            if len(parts) != 3:
+                raise ValueError(f"{path}:{lineno}: expected '<kind> <name> <regex>'")
+            kind, name, pattern = parts
+            try:
+                re.compile(pattern)
+            except re.error as e:
+                raise ValueError(f"{path}:{lineno}: bad regex for {name}: {e}")
+            rules.append(Rule(kind, name, pattern))
+    return rules
+
+# Rules whose every branch contains a literal at least this long go through
+# the literal prefilter; the rest are checked on every URL.
+MIN_PREFILTER_LITERAL = 3
+# Escapes that match no literal text (assertions and classes): they only
+# end the current literal run. Any other letter or digit escape (\x74,
+# \u0074, \N{...}, octal, backreferences...) stands for text the scanner
+# does not decode, so the rule goes unfiltered.
+_RUN_BREAKING_ESCAPES = "bBAZdDsSwW"
+
+def _skip_class(pattern, i):
+    """
+    Index just past the character class opened at pattern[i], or None when
+    it does not end. A "]" right after the "[" (or "[^") is a member, as in
+    "[]a]" and "[^]]".
+    """
+    i += 1
+    if pattern.startswith("^", i):
+        i += 1
+    if pattern.startswith("]", i):
+        i += 1
+    while i < len(pattern):
+        c = pattern[i]
+        if c == "\\":
+            i += 2
+            continue
+        if c == "]":
+            return i + 1
+        i += 1
+    return None
+
+def _skip_group(pattern, i):
+    """Index just past the group opened at pattern[i], or None when it does not end."""
+    depth = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if c == "\\":
+            i += 2
+            continue
+        if c == "[":
+            i = _skip_class(pattern, i)
+            if i is None:
+                return None
+            continue
+        if c == "(":
+            depth += 1
+        elif c == ")":
+            depth -= 1
+            if depth == 0:
+                return i + 1
+        i += 1
+    return None
+
+def required_literals(pattern):
+    """
+    Returns one literal that must appear in any match of each top-level
+    branch of `pattern`, or None when some branch has no literal of at least
+    MIN_PREFILTER_LITERAL characters outside groups, classes and quantifiers.
+    Also None for patterns whose literal text cannot be read off as written:
+    inline flags such as (?x) and escapes other than _RUN_BREAKING_ESCAPES,
+    and groups or classes that do not end.
+    """
+    branches = [[""]]
+    i = 0
+    while i < len(pattern):
+        runs = branches[-1]
+        c = pattern[i]
+        if c == "\\" and i + 1 < len(pattern):
+            nxt = pattern[i + 1]
+            if nxt.isalnum():
+                if nxt not in _RUN_BREAKING_ESCAPES:
+                    return None
+                runs.append("")
+            else:
+                runs[-1] += nxt
+            i += 2
+            continue
+        if c == "[":
+            i = _skip_class(pattern, i)
+            if i is None:
+                return None
+            runs.append("")
+            continue
+        if c == "(":
+            if pattern.startswith("(?", i) and pattern[i + 2:i + 3] in tuple("aiLmsux-"):
+                return None
+            i = _skip_group(pattern, i)
+            if i is None:
+                return None
+            runs.append("")
+            continue
+        if c == "|":
+            branches.append([""])
+        elif c in "*?{":
+            runs[-1] = runs[-1][:-1]
+            runs.append("")
+            if c == "{":
+                i = pattern.find("}", i) if "}" in pattern[i:] else len(pattern)
+        elif c in "+.^$":
+            runs.append("")
+        else:
+            runs[-1] += c
+        i += 1
+    literals = [max(runs, key=len) for runs in branches]
+    if any(len(lit) < MIN_PREFILTER_LITERAL for lit in literals):
+        return None
+    return literals
+
+def _trie_regex(words):
+    """One regex matching any of `words`, shaped as a trie so it runs in one pass."""
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word.lower():
+            if "" in node:
+                break
+            node = node.setdefault(ch, {})
+        else:
+            node.clear()
+            node[""] = True
+
+    def emit(node):
+        if "" in node:
+            return ""
+        alts = [re.escape(ch) + emit(child) for ch, child in sorted(node.items())]
+        return alts[0] if len(alts) == 1 else "(?:" + "|".join(alts) + ")"
+
+    return emit(trie)
+
+class RuleSet:
+    """
+    A rule list compiled once. The required literals of all rules are merged
+    into one trie-shaped prefilter regex, so a clean URL costs a single
+    search however many rules are loaded; only URLs that hit the prefilter
+    (or a rule with no usable literal) are matched against the rules to name
+    them.
+    """
+    def __init__(self, rules):
+        self.rules = list(rules)
+        self._compiled = [re.compile(r.pattern, re.IGNORECASE) for r in self.rules]
+        literals = []
+        # Tried one by one: a pattern with global flags cannot be joined into one regex
+        self._unfiltered = []
+        for r, rx in zip(self.rules, self._compiled):
+            lits = required_literals(r.pattern)
+            if lits is None:
+                self._unfiltered.append(rx)
+            else:
+                literals.extend(lits)
+        self._prefilter = re.compile(_trie_regex(literals), re.IGNORECASE) if literals else None
+
+    def match(self, url):
+        """Returns the rules matching `url` (empty list when none do)."""
+        clean_url = url.rstrip(URL_TRAILING_JUNK)
+        if not ((self._prefilter and self._prefilter.search(clean_url))
+                or any(rx.search(clean_url) for rx in self._unfiltered)):
+            return []
+        return [r for r, rx in zip(self.rules, self._compiled) if rx.search(clean_url)]
+
+    def scan(self, urls):
+        """Yields (url, matching rules) for each distinct URL hitting at least one rule."""
+        seen = set()
+        for url in urls:
+            if url in seen:
+                continue
+            seen.add(url)
+            rules = self.match(url)
+            if rules:
+                yield url, rules
+
+_rulesets = {}
+
+def get_ruleset(path=None):
+    """Loads and compiles a rules file once per process (the bundled rules by default)."""
+    path = os.path.abspath(path or DEFAULT_RULES_PATH)
+    ruleset = _rulesets.get(path)
+    if ruleset is None:
+        ruleset = _rulesets[path] = RuleSet(load_rules(path))
+    return ruleset
+
+def detect_urls(urls, rules_path=None):
+    """
+    Classifies URLs against the detection rules. Returns
+    {"canary": {url: [rule names]}, "tracking": {...}}; rules of any other
+    kind get their own key.
+    """
+    result = {"canary": {}, "tracking": {}}
+    for url, rules in get_ruleset(rules_path).scan(urls):
+        for r in rules:
+            result.setdefault(r.kind, {}).setdefault(url, []).append(r.name)
+    return result
@@ -1,89 +1,90 @@
-import os
-from docx import Document
+import re
+from libs import profile
+from libs.ooxml import R_ID, core_metadata_rows, open_package
 
-def is_docx_file(filename):
-    # True if file is .docx and starts with PK (zip signature)
-    return filename.lower().endswith('.docx') and _has_zip_sig(filename)
-
-def _has_zip_sig(filename):
-    try:
-        with open(filename, "rb") as f:
-            return f.read(2) == b"PK"
-    except Exception:
-        return False
+DOCX_MAIN_PART = "word/document.xml"
 
+@profile.profiled("docx.extract_docx_metadata")
 def extract_docx_metadata(docx_file):
-    doc = Document(docx_file)
-    core = doc.core_properties
-    meta = [
-        ["title", core.title or ""],
-        ["subject", core.subject or ""],
-        ["creator", core.author or ""],
-        ["keywords", core.keywords or ""],
-        ["description", core.comments or ""],
-        ["last_modified_by", core.last_modified_by or ""],
-        ["revision", core.revision or ""],
-        ["created", str(core.created) if core.created else ""],
-        ["modified", str(core.modified) if core.modified else ""],
-        ["category", core.category or ""],
-        ["content_status", core.content_status or ""],
-        ["identifier", core.identifier or ""],
-        ["language", core.language or ""],
-        ["version", core.version or ""]
-    ]
-    # Custom properties (if any)
-    if hasattr(doc, 'custom_properties'):
-        for key in doc.custom_properties:
-            meta.append([f"custom_{key}", str(doc.custom_properties[key])])
-    # Optionally extract the template property (from app.xml)
-    template = get_docx_template_name(docx_file)
-    if template:
-        meta.append(["template", template])
+    with open_package(docx_file) as pkg:
+        meta = core_metadata_rows(pkg)
+        # Optionally extract the template property (from app.xml)
+        template = get_docx_template_name(pkg)
+        if template:
+            meta.append(["template", template])
     return meta
 
-def extract_docx_links(docx_file):
-    from docx import Document
-    doc = Document(docx_file)
+W_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+# Body paragraphs/tables sit at depth 3: w:document > w:body > w:p
+BODY_CHILD_DEPTH = 3
+# HYPERLINK field codes (w:instrText runs / w:fldSimple) hold their URL inline
+FIELD_HYPERLINK_RE = re.compile(r'HYPERLINK\s+"([^"]+)"')
+# Parts besides the main document whose hyperlinks are collected
+DOCX_LINK_PARTS = ("header", "footer", "footnotes", "endnotes")
+
+def _scan_docx_part(pkg, part_name, links, counts=None):
+    """
+    Streams one WordprocessingML part, adding its hyperlink targets to
+    `links`. With `counts`, also counts body-level paragraphs and tables
+    (what python-docx calls doc.paragraphs / doc.tables).
+    """
+    rels = pkg.relationships(part_name)
+    hyperlink, instr_text, fld_simple = W_NS + "hyperlink", W_NS + "instrText", W_NS + "fldSimple"
+    paragraph, table = W_NS + "p", W_NS + "tbl"
+    for event, elem, depth in pkg.iterparse(part_name):
+        if event == "start":
+            if elem.tag == hyperlink:
+                rel = rels.get(elem.get(R_ID))
+                if rel and rel[2]:
+                    links.add(rel[1])
+            elif elem.tag == fld_simple:
+                links.update(FIELD_HYPERLINK_RE.findall(elem.get(W_NS + "instr", "")))
+        elif elem.tag == instr_text and elem.text:
+            links.update(FIELD_HYPERLINK_RE.findall(elem.text))
+        elif counts is not None and depth == BODY_CHILD_DEPTH:
+            if elem.tag == paragraph:
+                counts["num_paragraphs"] += 1
+            elif elem.tag == table:
+                counts["num_tables"] += 1
+
+@profile.profiled("docx.scan_docx")
+def scan_docx(docx_file):
+    """
+    One streaming pass over word/document.xml and the headers, footers,
+    footnotes and endnotes it references. Returns {"num_paragraphs",
+    "num_tables", "links"}; hyperlink r:ids are resolved through each
+    part's relationships.
+    """
+    counts = {"num_paragraphs": 0, "num_tables": 0}
     links = set()
-    # Hyperlinks in paragraphs
-    for para in doc.paragraphs:
-        for run in para.runs:
-            if hasattr(run, "hyperlink") and run.hyperlink and run.hyperlink.target:
-                links.add(run.hyperlink.target)
-    # Tables (optional: you may want to extract from cells)
-    for table in doc.tables:
-        for row in table.rows:
-            for cell in row.cells:
-                for para in cell.paragraphs:
-                    for run in para.runs:
-                        if hasattr(run, "hyperlink") and run.hyperlink and run.hyperlink.target:
-                            links.add(run.hyperlink.target)
-    return sorted(links)
+    with open_package(docx_file) as pkg:
+        if pkg.has(DOCX_MAIN_PART):
+            _scan_docx_part(pkg, DOCX_MAIN_PART, links, counts)
+            for rel_type in DOCX_LINK_PARTS:
+                for part_name in pkg.related_parts(DOCX_MAIN_PART, rel_type):
+                    _scan_docx_part(pkg, part_name, links)
+    counts["links"] = sorted(links)
+    return counts
+
+def extract_docx_links(docx_file):
+    return scan_docx(docx_file)["links"]
 
 def extract_docx_images(docx_file):
-    from zipfile import ZipFile
-    images = []
-    with ZipFile(docx_file) as zf:
-        for name in zf.namelist():
-            if name.startswith('word/media/'):
-                images.append(name)
-    return images
+    with open_package(docx_file) as pkg:
+        return list(pkg.iter_names('word/media/'))
 
+@profile.profiled("docx.extract_docx_comments")
 def extract_docx_comments(docx_file):
-    from zipfile import ZipFile
-    import xml.etree.ElementTree as ET
     comments = []
     try:
-        with ZipFile(docx_file) as docx_zip:
-            for name in docx_zip.namelist():
-                if name == 'word/comments.xml':
-                    with docx_zip.open(name) as f:
-                        root = ET.parse(f).getroot()
-                        for comment in root.findall('.//{http://schemas.openxmlformats.org/wordprocessingml/2006/main}comment'):
-                            author = comment.attrib.get('author', '')
-                            date = comment.attrib.get('date', '')
-                            text = ''.join(child.text or '' for child in comment.findall('{http://schemas.openxmlformats.org/wordprocessingml/2006/main}t'))
-                            comments.append({'author': author, 'date': date, 'text': text})
+        with open_package(docx_file) as pkg:
+            root = pkg.xml('word/comments.xml')
+            if root is not None:
+                for comment in root.findall('.//{http://schemas.openxmlformats.org/wordprocessingml/2006/main}comment'):
+                    author = comment.attrib.get('author', '')
+                    date = comment.attrib.get('date', '')
+                    text = ''.join(child.text or '' for child in comment.findall('{http://schemas.openxmlformats.org/wordprocessingml/2006/main}t'))
+                    comments.append({'author': author, 'date': date, 'text': text})
     except Exception:
         pass
     return comments
@@ -92,40 +93,29 @@ def has_vba_macros(docx_file):
     """
     Returns True if word/vbaProject.bin is present, indicating VBA macros.
     """
-    from zipfile import ZipFile
-    with ZipFile(docx_file) as docx_zip:
-        return "word/vbaProject.bin" in docx_zip.namelist()
+    with open_package(docx_file) as pkg:
+        return pkg.has("word/vbaProject.bin")
 
+@profile.profiled("docx.extract_custom_xml_parts")
 def extract_custom_xml_parts(docx_file):
     """
     Returns a list of custom XML part filenames and (optionally) their contents.
     """
-    from zipfile import ZipFile
     xml_parts = []
-    with ZipFile(docx_file) as docx_zip:
-        for name in docx_zip.namelist():
-            if name.startswith("customXml/") and name.endswith(".xml"):
-                try:
-                    with docx_zip.open(name) as f:
-                        content = f.read().decode("utf-8", errors="replace")
-                    xml_parts.append({"filename": name, "content": content})
-                except Exception:
-                    xml_parts.append({"filename": name, "content": "(unreadable)"})
+    with open_package(docx_file) as pkg:
+        for name in pkg.iter_names("customXml/", ".xml"):
+            try:
+                content = pkg.read(name).decode("utf-8", errors="replace")
+                xml_parts.append({"filename": name, "content": content})
+            except Exception:
+                xml_parts.append({"filename": name, "content": "(unreadable)"})
     return xml_parts
 
 def get_docx_template_name(docx_file):
     # Try to extract template property from docProps/app.xml
-    from zipfile import ZipFile
-    import xml.etree.ElementTree as ET
     try:
-        with ZipFile(docx_file) as docx_zip:
-            with docx_zip.open("docProps/app.xml") as f:
-                tree = ET.parse(f)
-                root = tree.getroot()
-                ns = {'ap': 'http://schemas.openxmlformats.org/officeDocument/2006/extended-properties'}
-                template_elem = root.find('ap:Template', ns)
-                if template_elem is not None:
-                    return template_elem.text
+        with open_package(docx_file) as pkg:
+            return pkg.app_property("Template") or ""
     except Exception:
         pass
     return ""
@@ -150,64 +140,104 @@ def get_docx_num_pages(docx_file):
     Attempts to read the number of pages from docProps/app.xml
     Returns an integer or None if not available.
     """
-    from zipfile import ZipFile
-    import xml.etree.ElementTree as ET
     try:
-        with ZipFile(docx_file) as docx_zip:
-            with docx_zip.open("docProps/app.xml") as f:
-                root = ET.parse(f).getroot()
-                ns = {'ap': 'http://schemas.openxmlformats.org/officeDocument/2006/extended-properties'}
-                pages_elem = root.find('ap:Pages', ns)
-                if pages_elem is not None:
-                    return int(pages_elem.text)
+        with open_package(docx_file) as pkg:
+            pages = pkg.app_property("Pages")
+            if pages is not None:
+                return int(pages)
     except Exception:
         pass
     return None
 
+REVISION_TAGS = ("ins", "del", "moveFrom", "moveTo")
+# Start tag of a revision element under any namespace prefix; a cheap byte
+# scan that rules out documents without revision marks before parsing.
+REVISION_START_RE = re.compile(rb'<(?:[\w.-]+:)?(?:ins|del|moveFrom|moveTo)[\s/>]')
+REVISION_SCAN_CHUNK = 1024 * 1024
+
+def _may_have_revision_marks(pkg):
+    tail = b""
+    with pkg.open(DOCX_MAIN_PART) as f:
+        while True:
+            chunk = f.read(REVISION_SCAN_CHUNK)
+            if not chunk:
+                return False
+            if REVISION_START_RE.search(tail + chunk):
+                return True
+            tail = chunk[-32:]
+
+@profile.profiled("docx.scan_revision_marks")
+def scan_revision_marks(docx_file, first_only=False):
+    """
+    Streams word/document.xml for <w:ins>, <w:del>, <w:moveFrom> and
+    <w:moveTo> elements. Returns {tag: {"count": n, "authors": [...]}} for
+    the tags present. With `first_only`, stops reading at the first mark
+    found, so the result holds just that one.
+    """
+    tags = {W_NS + tag: tag for tag in REVISION_TAGS}
+    author_attr = W_NS + "author"
+    found = {}
+    with open_package(docx_file) as pkg:
+        if not pkg.has(DOCX_MAIN_PART):
+            return found
+        for event, elem, depth in pkg.iterparse(DOCX_MAIN_PART):
+            tag = tags.get(elem.tag) if event == "start" else None
+            if tag is None:
+                continue
+            entry = found.setdefault(tag, {"count": 0, "authors": set()})
+            entry["count"] += 1
+            if elem.get(author_attr):
+                entry["authors"].add(elem.get(author_attr))
+            if first_only:
+                break
+    for entry in found.values():
+        entry["authors"] = sorted(entry["authors"])
+    return found
+
+@profile.profiled("docx.has_revision_marks")
 def has_revision_marks(docx_file):
     """
     Returns True if <w:ins>, <w:del>, <w:moveFrom>, or <w:moveTo> elements are present.
+    Reading stops at the first one.
     """
-    from zipfile import ZipFile
-    import xml.etree.ElementTree as ET
     try:
-        with ZipFile(docx_file) as docx_zip:
-            if "word/document.xml" in docx_zip.namelist():
-                xml = docx_zip.read("word/document.xml")
-                root = ET.fromstring(xml)
-                ns = {'w': 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'}
-                for tag in ("ins", "del", "moveFrom", "moveTo"):
-                    if root.find('.//w:' + tag, ns) is not None:
-                        return True
+        with open_package(docx_file) as pkg:
+            if not pkg.has(DOCX_MAIN_PART) or not _may_have_revision_marks(pkg):
+                return False
+            return bool(scan_revision_marks(pkg, first_only=True))
     except Exception:
         pass
     return False
 
-def get_docx_basic_info(docx_file):
+@profile.profiled("docx.get_docx_basic_info")
+def get_docx_basic_info(docx_file, revisions=False):
+    """
+    With `revisions`, the whole document is scanned for revision marks and
+    their counts and authors are returned under "revisions"; otherwise the
+    check stops at the first mark.
+    """
     from libs.shared import human_readable_size
-    file_size = os.path.getsize(docx_file)
-    doc = Document(docx_file)
-    meta = extract_docx_metadata(docx_file)
-    num_paragraphs = len(doc.paragraphs)
-    num_tables = len(doc.tables)
-    num_pages = get_docx_num_pages(docx_file)
-    links = extract_docx_links(docx_file)
-    images = extract_docx_images(docx_file)
-    comments = extract_docx_comments(docx_file)
-    has_macros = has_vba_macros(docx_file)
-    custom_xml_parts = extract_custom_xml_parts(docx_file)
-    revision_marks = has_revision_marks(docx_file)
-    return {
-        "file_size_bytes": file_size,
-        "file_size_human": human_readable_size(file_size),
-        "num_pages": num_pages,
-        "num_paragraphs": num_paragraphs,
-        "num_tables": num_tables,
-        "meta": meta,
-        "links": links,
-        "images": images,
-        "comments": comments,
-        "has_vba_macros": has_macros,
-        "custom_xml_parts": custom_xml_parts,
-        "has_revision_marks": revision_marks,
-    }
+    with open_package(docx_file) as pkg:
+        scan = scan_docx(pkg)
+        info = {
+            "file_size_bytes": pkg.size,
+            "file_size_human": human_readable_size(pkg.size),
+            "num_pages": get_docx_num_pages(pkg),
+            "num_paragraphs": scan["num_paragraphs"],
+            "num_tables": scan["num_tables"],
+            "meta": extract_docx_metadata(pkg),
+            "links": scan["links"],
+            "images": extract_docx_images(pkg),
+            "comments": extract_docx_comments(pkg),
+            "has_vba_macros": has_vba_macros(pkg),
+            "custom_xml_parts": extract_custom_xml_parts(pkg),
+        }
+        if revisions:
+            try:
+                info["revisions"] = scan_revision_marks(pkg)
+            except Exception:
+                info["revisions"] = {}
+            info["has_revision_marks"] = bool(info["revisions"])
+        else:
+            info["has_revision_marks"] = has_revision_marks(pkg)
+    return info
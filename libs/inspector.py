@@ -0,0 +1,447 @@
+import glob
+import importlib
+import os
+from collections import OrderedDict, namedtuple
+from libs import profile
+from libs.shared import file_digest
+
+# What to gather for each file; mirrors the CLI flags that change extraction.
+# `profile` is None, "time" or "memory" (see libs.profile).
+InspectOptions = namedtuple("InspectOptions", ["jobs", "all_urls", "debug", "revisions", "profile"],
+                            defaults=(None,))
+DEFAULT_OPTIONS = InspectOptions(jobs=1, all_urls=False, debug=False, revisions=False)
+
+UNSUPPORTED = "Not a supported file type (PDF, Word, PPTX, XLSX)"
+
+# Leading bytes sniff_format() reads: the OLE compound file header
+SNIFF_BYTES = 512
+OLE_SIGNATURE = b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"
+
+# Content type of an OOXML package's main part, from [Content_Types].xml
+OOXML_CONTENT_TYPES = {
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml": "docx",
+    "application/vnd.ms-word.document.macroEnabled.main+xml": "docm",
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.template.main+xml": "dotx",
+    "application/vnd.ms-word.template.macroEnabledTemplate.main+xml": "dotm",
+    "application/vnd.openxmlformats-officedocument.presentationml.presentation.main+xml": "pptx",
+    "application/vnd.ms-powerpoint.presentation.macroEnabled.main+xml": "pptm",
+    "application/vnd.openxmlformats-officedocument.presentationml.template.main+xml": "potx",
+    "application/vnd.ms-powerpoint.template.macroEnabled.main+xml": "potm",
+    "application/vnd.openxmlformats-officedocument.presentationml.slideshow.main+xml": "ppsx",
+    "application/vnd.ms-powerpoint.slideshow.macroEnabled.main+xml": "ppsm",
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml": "xlsx",
+    "application/vnd.ms-excel.sheet.macroEnabled.main+xml": "xlsm",
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.template.main+xml": "xltx",
+    "application/vnd.ms-excel.template.macroEnabled.main+xml": "xltm",
+}
+# Stream of an OLE compound file naming the application that wrote it
+OLE_STREAMS = {"WordDocument": "doc", "Workbook": "xls", "Book": "xls", "PowerPoint Document": "ppt"}
+
+# Exact format -> the extractor (INSPECTORS key) that reads it
+FORMAT_FILETYPES = {
+    "pdf": "pdf", "doc": "doc",
+    "docx": "docx", "docm": "docx", "dotx": "docx", "dotm": "docx",
+    "pptx": "pptx", "pptm": "pptx", "potx": "pptx", "potm": "pptx", "ppsx": "pptx", "ppsm": "pptx",
+    "xlsx": "xlsx", "xlsm": "xlsx", "xltx": "xlsx", "xltm": "xlsx",
+}
+
+def sniff_format(filename):
+    """
+    The exact format of `filename` from its content: "pdf", "doc", an OOXML
+    format ("docx", "docm", "xlsm", "ppsx"...), another OLE format ("xls",
+    "ppt"), or None. The file is opened once; a ZIP is classified from its
+    central directory and [Content_Types].xml without reading other parts.
+    The extension only decides for a .doc whose first directory sector
+    names no stream we know, and for a ZIP with an OOXML extension but no
+    usable [Content_Types].xml (so its extractor can say what is wrong).
+    """
+    try:
+        with profile.open_file(filename) as f:
+            head = f.read(SNIFF_BYTES)
+            if head.startswith(b"%PDF-"):
+                return "pdf"
+            ext = os.path.splitext(filename)[1].lower()[1:]
+            if head.startswith(OLE_SIGNATURE):
+                return _sniff_ole(f, head) or ("doc" if ext == "doc" else None)
+            if head.startswith(b"PK"):
+                return _sniff_ooxml(f) or (ext if FORMAT_FILETYPES.get(ext) in ("docx", "pptx", "xlsx") else None)
+    except OSError:
+        pass
+    return None
+
+def _sniff_ole(f, head):
+    # Sector size is 1 << (uint16 at 0x1E); sector N starts at (N + 1) << shift,
+    # after the header. Directory entries are 128 bytes: a UTF-16 name, its
+    # byte length at 64 and the object type (2 = stream) at 66.
+    shift = int.from_bytes(head[0x1E:0x20], "little")
+    first = int.from_bytes(head[0x30:0x34], "little")
+    if len(head) < SNIFF_BYTES or not 9 <= shift <= 12 or first >= 0xFFFFFFFA:
+        return None
+    f.seek((first + 1) << shift)
+    sector = f.read(1 << shift)
+    for pos in range(0, len(sector) - 127, 128):
+        entry = sector[pos:pos + 128]
+        size = int.from_bytes(entry[64:66], "little")
+        if entry[66] == 2 and 2 <= size <= 64:
+            name = entry[:size - 2].decode("utf-16-le", "replace")
+            if name in OLE_STREAMS:
+                return OLE_STREAMS[name]
+    return None
+
+def _sniff_ooxml(f):
+    import xml.etree.ElementTree as ET
+    from zipfile import BadZipFile, ZipFile
+    try:
+        profile.count("zip_opens")
+        with ZipFile(f) as zf, zf.open("[Content_Types].xml") as part:
+            profile.count("xml_parses")
+            # The main part is usually among the first overrides; stop there
+            for _, elem in ET.iterparse(part):
+                if elem.tag.endswith("}Override") and elem.get("ContentType") in OOXML_CONTENT_TYPES:
+                    return OOXML_CONTENT_TYPES[elem.get("ContentType")]
+    except (BadZipFile, KeyError, ET.ParseError, EOFError, ValueError, NotImplementedError):
+        pass
+    return None
+
+def detect_filetype(filename):
+    """"pdf", "docx", "doc", "pptx", "xlsx" (the extractor for sniff_format()), or None for anything else."""
+    return FORMAT_FILETYPES.get(sniff_format(filename))
+
+def _inspect_pdf(filename, options):
+    from libs.pdf import (
+        PdfSession, extract_link_annotations, extract_metadata, extract_metadata_urls, get_pdf_basic_info,
+        scan_pdf_urls,
+    )
+    with PdfSession(filename) as pdf:
+        info = get_pdf_basic_info(pdf)
+        info["meta"] = extract_metadata(pdf)
+        if options.debug:
+            info["raw_metadata"] = {str(k): str(v) for k, v in pdf.metadata.items()}
+        scan = scan_pdf_urls(pdf, jobs=options.jobs)
+        info["url_objects"] = scan["urls"]
+        info["truncated_streams"] = scan["truncated_streams"]
+        if options.all_urls:
+            info["metadata_urls"] = extract_metadata_urls(pdf)
+        else:
+            info["annotation_urls"] = extract_link_annotations(pdf)
+    return info
+
+def _inspect_docx(filename, options):
+    from libs.doc import get_docx_basic_info
+    return get_docx_basic_info(filename, revisions=options.revisions)
+
+def _inspect_doc(filename, options):
+    from libs.doc import get_doc_basic_info
+    return get_doc_basic_info(filename)
+
+def _inspect_pptx(filename, options):
+    from libs.ppt import get_pptx_basic_info
+    return get_pptx_basic_info(filename, jobs=options.jobs)
+
+def _inspect_xlsx(filename, options):
+    from libs.xlsx import get_xlsx_basic_info
+    return get_xlsx_basic_info(filename, jobs=options.jobs)
+
+INSPECTORS = {
+    "pdf": _inspect_pdf,
+    "docx": _inspect_docx,
+    "doc": _inspect_doc,
+    "pptx": _inspect_pptx,
+    "xlsx": _inspect_xlsx,
+}
+# Module each inspector imports on first use
+EXTRACTOR_MODULES = {"pdf": "libs.pdf", "docx": "libs.doc", "doc": "libs.doc", "pptx": "libs.ppt", "xlsx": "libs.xlsx"}
+
+def inspect_file(filename, options=DEFAULT_OPTIONS, digest=False, fmt=None):
+    """
+    Detects the type of `filename` and runs its extractor. Returns
+    {"path", "filetype", "info", "error"}; never raises, so one bad file
+    cannot stop a batch. "error" is None on success, and "filetype" is None
+    for unsupported files. A successful result's info has the exact format
+    sniff_format() found under "format". With `digest`, the result also
+    carries the file's content digest under "digest". With options.profile,
+    it carries the libs.profile report of the inspection under "profile".
+    A caller that has already sniffed the file passes the sniff_format()
+    result as `fmt` so the header is not read again.
+    """
+    if options.profile:
+        with profile.recording(memory=options.profile == "memory") as rec:
+            result = _inspect_file(filename, options, digest, fmt)
+        result["profile"] = rec.report()
+        return result
+    return _inspect_file(filename, options, digest, fmt)
+
+def _inspect_file(filename, options, digest, fmt):
+    result = {"path": filename, "filetype": None, "info": None, "error": None}
+    try:
+        if fmt is None:
+            with profile.span("detect_filetype"):
+                fmt = sniff_format(filename)
+        result["filetype"] = FORMAT_FILETYPES.get(fmt)
+        if result["filetype"] is None:
+            result = unsupported_result(filename)
+        else:
+            with profile.span("import_extractor"):
+                importlib.import_module(EXTRACTOR_MODULES[result["filetype"]])
+            result["info"] = INSPECTORS[result["filetype"]](filename, options)
+            result["info"]["format"] = fmt
+            if digest:
+                result["digest"] = file_digest(filename)
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    return result
+
+def iter_inputs(paths, stdin=None):
+    """
+    Expands CLI inputs into (path, explicit) pairs. Directories are walked
+    recursively in sorted order and globs (including **) are expanded;
+    files found that way are not explicit, so unsupported ones can be
+    skipped quietly. With `stdin`, one path per line is read from it as
+    well. Each path is yielded once.
+    """
+    seen = set()
+
+    def once(path, explicit):
+        key = os.path.normpath(path)
+        if key in seen:
+            return None
+        seen.add(key)
+        return path, explicit
+
+    def expand(path):
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    yield os.path.join(root, name), False
+        elif glob.has_magic(path):
+            for match in sorted(glob.iglob(path, recursive=True)):
+                if os.path.isdir(match):
+                    yield from expand(match)
+                else:
+                    yield match, False
+        else:
+            yield path, True
+
+    for path in paths:
+        for item in expand(path):
+            item = once(*item)
+            if item:
+                yield item
+    if stdin is not None:
+        for line in stdin:
+            path = line.rstrip("\r\n")
+            if path:
+                for item in expand(path):
+                    item = once(*item)
+                    if item:
+                        yield item
+
+WORKER_DIED = "worker process died while inspecting this file"
+
+def _future_result(future, path):
+    from concurrent.futures.process import BrokenProcessPool
+    try:
+        return future.result()
+    except BrokenProcessPool:
+        return {"path": path, "filetype": None, "info": None, "error": WORKER_DIED}
+
+def unsupported_result(filename):
+    """inspect_file() result for a file detect_filetype() found no extractor for."""
+    return {"path": filename, "filetype": None, "info": None,
+            "error": UNSUPPORTED if os.path.isfile(filename) else "No such file"}
+
+def options_key(options):
+    """The options that change what is extracted (not jobs), as a cache key."""
+    return f"all_urls={options.all_urls:d},debug={options.debug:d},revisions={options.revisions:d}"
+
+# Results (and the path of the file they came from) remembered per content
+# digest for de-duplication; an older digest's duplicates are looked up in
+# the cache, or inspected again, and then count as originals themselves.
+DEDUPE_MEMORY = 1024
+
+# run_batch() marker for a duplicate whose original is still being inspected
+DEFERRED = object()
+
+def _storable(result):
+    return {k: v for k, v in result.items() if k not in ("cached", "duplicate_of", "profile")}
+
+def run_batch(inputs, options=DEFAULT_OPTIONS, workers=1, queue_size=None, cache=None, dedupe=False, prefetch=0):
+    """
+    Inspects every (path, explicit) input, yielding (result, explicit) as
+    each file finishes. With workers > 1 files are inspected by a process
+    pool, at most `queue_size` (default 2 * workers) in flight, so memory
+    stays bounded however many inputs there are; results then arrive in
+    completion order. A worker that dies (crash, OOM kill) fails only the
+    files in flight at that moment, and a fresh pool takes the rest.
+
+    With a ResultCache (libs.cache), files it holds a valid result for are
+    not inspected again and their results carry "cached": True; new
+    results are stored. Only this process touches the cache.
+
+    With `dedupe`, every supported file is hashed first and each distinct
+    content is inspected once: a byte-identical file gets a copy of the
+    first one's result with "duplicate_of" set to that file's path, as
+    long as that content is among the last DEDUPE_MEMORY ones seen.
+
+    With `prefetch` > 0, files go through the asyncio pipeline of
+    libs.pipeline instead: that many files are opened and read ahead at
+    once while `workers` parse. The cache's stat and the dedupe hash are
+    then taken by those reader threads too, the hash while the file is
+    read ahead, so no file I/O is left on this thread.
+    """
+    key = options_key(options)
+    pending = {}             # path -> (stat, digest) of files sent for inspection
+    remembered = OrderedDict()  # digest -> (original path, result), least recently used first
+    waiting = {}             # digest -> [(path, explicit, stat)] held until the original is done
+
+    def store(path, stat, digest, result):
+        if cache is not None and result["error"] is None:
+            cache.store(os.path.abspath(path), key, stat, _storable(result), digest)
+
+    def remember(digest, original, result):
+        remembered[digest] = (original, result)
+        remembered.move_to_end(digest)
+        if len(remembered) > DEDUPE_MEMORY:
+            remembered.popitem(last=False)
+
+    def copy_of(result, path, original):
+        copy = dict(_storable(result), path=path)
+        if original != path:
+            copy["duplicate_of"] = original
+        return copy
+
+    def lookup(path, stat=None):
+        """The cached result of `path`, or None after noting it for inspection."""
+        hit, stat = cache.lookup(os.path.abspath(path), key, stat)
+        if hit is not None:
+            pending.pop(path, None)
+            hit.update(path=path, cached=True)
+            return hit
+        pending[path] = (stat, None)
+        return None
+
+    def deduplicate(path, explicit, digest):
+        """
+        None when `path` is to be inspected, DEFERRED while a file with the
+        same content is, or the result of an earlier file with that content.
+        """
+        stat, _ = pending.pop(path)
+        if digest is None:
+            pending[path] = (stat, None)
+            return None
+        if digest in waiting:
+            waiting[digest].append((path, explicit, stat))
+            return DEFERRED
+        original, known = remembered.get(digest, (path, None))
+        from_cache = known is None and cache is not None
+        if from_cache:
+            known = cache.find_digest(digest, key)
+        if known is not None:
+            remember(digest, original, known)
+            result = copy_of(known, path, original)
+            store(path, stat, digest, result)
+            if from_cache:
+                result["cached"] = True
+            return result
+        waiting[digest] = []
+        pending[path] = (stat, digest)
+        return None
+
+    def prepare():
+        for path, explicit in inputs:
+            pending[path] = (None, None)
+            if prefetch > 0:
+                # The pipeline looks files up and hashes them in its reader threads
+                yield path, explicit, None, None
+                continue
+            if cache is not None:
+                hit = lookup(path)
+                if hit is not None:
+                    yield path, explicit, hit, None
+                    continue
+            if not dedupe:
+                yield path, explicit, None, None
+                continue
+            fmt = sniff_format(path)
+            if fmt not in FORMAT_FILETYPES:
+                yield path, explicit, unsupported_result(path), None
+                continue
+            try:
+                digest = file_digest(path)
+            except OSError:
+                digest = None
+            yield path, explicit, deduplicate(path, explicit, digest), fmt
+
+    inspect_all = _inspect_all
+    if prefetch > 0:
+        from functools import partial
+        from libs.pipeline import iter_pipeline
+        inspect_all = partial(iter_pipeline, readers=prefetch, lookup=lookup if cache is not None else None,
+                              after_read=deduplicate if dedupe else None)
+    worker_digest = cache is not None and not dedupe
+    for result, explicit in inspect_all(prepare(), options, workers, queue_size, worker_digest):
+        path = result["path"]
+        if path not in pending:
+            yield result, explicit
+            continue
+        stat, digest = pending.pop(path)
+        digest = result.pop("digest", digest)
+        store(path, stat, digest, result)
+        yield result, explicit
+        if dedupe and digest is not None:
+            remember(digest, path, result)
+            for dup_path, dup_explicit, dup_stat in waiting.pop(digest, ()):
+                dup = copy_of(result, dup_path, path)
+                store(dup_path, dup_stat, digest, dup)
+                yield dup, dup_explicit
+
+def _inspect_all(items, options, workers, queue_size, digest=False):
+    """
+    run_batch() over (path, explicit, ready, fmt) items: the file is
+    inspected when `ready` is None, a ready result is passed through as
+    is, and a DEFERRED item yields nothing. `fmt` is the file's
+    sniff_format() result when it is already known, else None.
+    """
+    if workers <= 1:
+        for path, explicit, ready, fmt in items:
+            if ready is None:
+                yield inspect_file(path, options, digest, fmt), explicit
+            elif ready is not DEFERRED:
+                yield ready, explicit
+        return
+    from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+    queue_size = queue_size or 2 * workers
+    pool = ProcessPoolExecutor(max_workers=workers)
+    in_flight = {}
+    items = iter(items)
+    exhausted = False
+    try:
+        while in_flight or not exhausted:
+            while not exhausted and len(in_flight) < queue_size:
+                item = next(items, None)
+                if item is None:
+                    exhausted = True
+                elif item[2] is DEFERRED:
+                    continue
+                elif item[2] is not None:
+                    yield item[2], item[1]
+                else:
+                    in_flight[pool.submit(inspect_file, item[0], options, digest, item[3])] = item[:2]
+            if not in_flight:
+                break
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            broken = False
+            for future in done:
+                path, explicit = in_flight.pop(future)
+                result = _future_result(future, path)
+                broken = broken or result["error"] == WORKER_DIED
+                yield result, explicit
+            if broken:
+                for future, (path, explicit) in in_flight.items():
+                    yield _future_result(future, path), explicit
+                in_flight.clear()
+                pool.shutdown(wait=False, cancel_futures=True)
+                pool = ProcessPoolExecutor(max_workers=workers)
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
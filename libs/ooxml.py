@@ -0,0 +1,275 @@
+import os
+import posixpath
+import re
+import xml.etree.ElementTree as ET
+from contextlib import contextmanager
+from datetime import datetime
+from zipfile import ZipFile
+from libs import profile
+
+NS = {
+    "ap": "http://schemas.openxmlformats.org/officeDocument/2006/extended-properties",
+    "cp": "http://schemas.openxmlformats.org/package/2006/metadata/core-properties",
+    "dc": "http://purl.org/dc/elements/1.1/",
+    "dcterms": "http://purl.org/dc/terms/",
+    "rel": "http://schemas.openxmlformats.org/package/2006/relationships",
+    "vt": "http://schemas.openxmlformats.org/officeDocument/2006/docPropsVTypes",
+    "cust": "http://schemas.openxmlformats.org/officeDocument/2006/custom-properties",
+}
+# Attribute holding relationship ids (r:id, r:embed...) on part elements
+R_ID = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id"
+
+# docProps/core.xml elements, in the order extractors list them
+CORE_PROPERTIES = [
+    ("title", "dc:title"), ("subject", "dc:subject"), ("creator", "dc:creator"),
+    ("keywords", "cp:keywords"), ("description", "dc:description"),
+    ("lastModifiedBy", "cp:lastModifiedBy"), ("revision", "cp:revision"),
+    ("created", "dcterms:created"), ("modified", "dcterms:modified"),
+    ("category", "cp:category"), ("contentStatus", "cp:contentStatus"),
+    ("identifier", "dc:identifier"), ("language", "dc:language"), ("version", "cp:version"),
+]
+
+W3CDTF_RE = re.compile(r'^(\d{4})(?:-(\d\d)(?:-(\d\d)(?:T(\d\d):(\d\d)(?::(\d\d))?(?:\.\d+)?(Z|[+-]\d\d:\d\d)?)?)?)?$')
+
+def parse_w3cdtf(value):
+    """Parse a docProps date (W3CDTF, e.g. 2024-01-31T10:00:00Z) into a datetime, or None."""
+    m = W3CDTF_RE.match((value or "").strip())
+    if not m:
+        return None
+    year, month, day, hour, minute, second, tz = m.groups()
+    text = f"{year}-{month or '01'}-{day or '01'}T{hour or '00'}:{minute or '00'}:{second or '00'}"
+    if tz:
+        text += "+00:00" if tz == "Z" else tz
+    try:
+        return datetime.fromisoformat(text)
+    except ValueError:
+        return None
+
+def _core_date(value):
+    parsed = parse_w3cdtf(value)
+    return str(parsed) if parsed else value
+
+def core_metadata_rows(pkg):
+    """
+    The [name, value] metadata rows DOCX and PPTX reports share: core
+    properties (dates rendered as datetimes) followed by custom properties.
+    """
+    core = pkg.core_properties()
+    meta = [
+        ["title", core["title"]],
+        ["subject", core["subject"]],
+        ["creator", core["creator"]],
+        ["keywords", core["keywords"]],
+        ["description", core["description"]],
+        ["last_modified_by", core["lastModifiedBy"]],
+        ["revision", core["revision"]],
+        ["created", _core_date(core["created"])],
+        ["modified", _core_date(core["modified"])],
+        ["category", core["category"]],
+        ["content_status", core["contentStatus"]],
+        ["identifier", core["identifier"]],
+        ["language", core["language"]],
+        ["version", core["version"]]
+    ]
+    # Custom properties (if any)
+    for key, value in pkg.custom_properties():
+        meta.append([f"custom_{key}", value])
+    return meta
+
+def rels_name(part_name):
+    """Name of the relationships part of `part_name` (word/document.xml -> word/_rels/document.xml.rels)."""
+    folder, base = posixpath.split(part_name)
+    return posixpath.join(folder, "_rels", base + ".rels")
+
+class OoxmlPackage:
+    """
+    One opened OOXML (DOCX/PPTX/XLSX) package shared by every extractor of a run.
+    The ZIP central directory is read once into a name -> ZipInfo index, and
+    the XML parts read through xml() (docProps/*.xml and friends) are parsed
+    once and cached.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._file = profile.open_file(path) if isinstance(path, (str, os.PathLike)) else None
+        try:
+            with profile.span("ooxml.open"):
+                profile.count("zip_opens")
+                self.zip = ZipFile(self._file or path)
+        except Exception:
+            if self._file:
+                self._file.close()
+            raise
+        try:
+            self.size = os.fstat(self.zip.fp.fileno()).st_size
+        except Exception:
+            self.close()
+            raise
+        self.infos = {info.filename: info for info in self.zip.infolist()}
+        self._xml = {}
+        self._rels = {}
+        self._core = None
+
+    @property
+    def names(self):
+        """Part names in central directory order (the index keys, not a fresh list)."""
+        return self.infos.keys()
+
+    def has(self, name):
+        return name in self.infos
+
+    def iter_names(self, prefix, suffix=""):
+        for name in self.infos:
+            if name.startswith(prefix) and name.endswith(suffix):
+                yield name
+
+    def open(self, name):
+        return self.zip.open(self.infos[name])
+
+    def read(self, name):
+        return self.zip.read(self.infos[name])
+
+    def iterparse(self, name):
+        """
+        Streams part `name`, yielding (event, element, depth) for "start" and
+        "end" events; the root element has depth 1. Each element is cleared
+        and detached from its parent right after its "end" is yielded, so
+        memory stays flat however large the part is. Stopping the iteration
+        stops reading (and decompressing) the part.
+        """
+        stack = []
+        profile.count("xml_parses")
+        with self.open(name) as f:
+            for event, elem in ET.iterparse(f, events=("start", "end")):
+                if event == "start":
+                    stack.append(elem)
+                    yield event, elem, len(stack)
+                    continue
+                stack.pop()
+                yield event, elem, len(stack) + 1
+                elem.clear()
+                if stack:
+                    stack[-1].remove(elem)
+
+    def xml(self, name):
+        """Parsed root element of part `name`, or None when it is missing or malformed."""
+        if name not in self._xml:
+            root = None
+            if name in self.infos:
+                profile.count("xml_parses")
+                try:
+                    with self.open(name) as f:
+                        root = ET.parse(f).getroot()
+                except ET.ParseError:
+                    pass
+            self._xml[name] = root
+        return self._xml[name]
+
+    def app_property(self, tag):
+        """Text of docProps/app.xml <tag>, or None."""
+        root = self.xml("docProps/app.xml")
+        el = root.find("ap:" + tag, NS) if root is not None else None
+        return el.text if el is not None else None
+
+    def core_properties(self):
+        """docProps/core.xml values as {name: text} (see CORE_PROPERTIES), "" when absent."""
+        if self._core is None:
+            root = self.xml("docProps/core.xml")
+            self._core = {}
+            for key, tag in CORE_PROPERTIES:
+                el = root.find(tag, NS) if root is not None else None
+                self._core[key] = (el.text or "") if el is not None else ""
+        return self._core
+
+    def custom_properties(self):
+        """docProps/custom.xml as a list of (name, value text)."""
+        root = self.xml("docProps/custom.xml")
+        if root is None:
+            return []
+        props = []
+        for prop in root.findall("cust:property", NS):
+            value = next(iter(prop), None)
+            props.append((prop.get("name", ""), (value.text or "") if value is not None else ""))
+        return props
+
+    def relationships(self, part_name):
+        """
+        Relationships of `part_name` as {id: (type, target, external)}.
+        Internal targets are resolved to part names; external ones (URLs)
+        are returned as written.
+        """
+        if part_name not in self._rels:
+            rels = {}
+            root = self.xml(rels_name(part_name))
+            if root is not None:
+                folder = posixpath.dirname(part_name)
+                for rel in root.findall("rel:Relationship", NS):
+                    target = rel.get("Target", "")
+                    external = rel.get("TargetMode") == "External"
+                    if not external:
+                        target = (target.lstrip("/") if target.startswith("/")
+                                  else posixpath.normpath(posixpath.join(folder, target)))
+                    rels[rel.get("Id")] = (rel.get("Type", ""), target, external)
+            self._rels[part_name] = rels
+        return self._rels[part_name]
+
+    def related_parts(self, part_name, rel_type):
+        """Internal parts `part_name` links to with a relationship type ending in /`rel_type`."""
+        return [target for kind, target, external in self.relationships(part_name).values()
+                if not external and kind.endswith("/" + rel_type) and target in self.infos]
+
+    def close(self):
+        self.zip.close()
+        if self._file:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+@contextmanager
+def open_package(pkg_file):
+    """Yield an OoxmlPackage for `pkg_file`, reusing it when one is passed in."""
+    if isinstance(pkg_file, OoxmlPackage):
+        yield pkg_file
+    else:
+        with OoxmlPackage(pkg_file) as pkg:
+            yield pkg
+
+# Parts handed to a map_parts() worker per task: enough tasks per worker to
+# even out uneven part sizes without paying a round trip per part.
+TASKS_PER_WORKER = 4
+
+_worker_pkg = None
+
+def _init_part_worker(path):
+    global _worker_pkg
+    _worker_pkg = OoxmlPackage(path)
+
+def _map_part_batch(func, parts):
+    return [func(_worker_pkg, part) for part in parts]
+
+def map_parts(pkg, func, parts, jobs=1):
+    """
+    Returns [func(pkg, part) for part in parts]. With jobs > 1 the parts are
+    split into contiguous batches run by a process pool; each worker opens
+    its own OoxmlPackage on pkg.path, and results come back in `parts`
+    order whatever order the workers finish in. `func` must be a
+    module-level function so it can be sent to the workers.
+    """
+    parts = list(parts)
+    if jobs <= 1 or len(parts) < 2 or not isinstance(pkg.path, (str, os.PathLike)):
+        return [func(pkg, part) for part in parts]
+    from concurrent.futures import ProcessPoolExecutor
+    from libs.shared import process_pool_context
+    jobs = min(jobs, len(parts))
+    size = max(1, -(-len(parts) // (jobs * TASKS_PER_WORKER)))
+    batches = [parts[i:i + size] for i in range(0, len(parts), size)]
+    results = []
+    # May start from a --prefetch parse thread while readers run
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=process_pool_context(),
+                             initializer=_init_part_worker, initargs=(pkg.path,)) as pool:
+        for batch in pool.map(_map_part_batch, [func] * len(batches), batches):
+            results.extend(batch)
+    return results
@@ -0,0 +1,134 @@
+import json
+from datetime import date, datetime
+from libs.classify import classify_urls
+from libs.detect import detect_urls
+from libs.shared import human_readable_size
+
+# Bump on any change to the record layout below; consumers check it.
+SCHEMA_VERSION = 3
+SCHEMA = f"docinspector.result/{SCHEMA_VERSION}"
+
+# Scalar facts each extractor reports, as record["properties"]
+PROPERTIES = {
+    "pdf": ["format", "pdf_version", "is_encrypted", "num_pages", "page_size"],
+    "docx": ["format", "num_pages", "num_paragraphs", "num_tables", "has_revision_marks", "has_vba_macros"],
+    "doc": ["format", "num_paragraphs", "num_tables", "has_vba_macros"],
+    "pptx": ["format", "num_slides", "num_slides_with_notes", "has_vba_macros"],
+    "xlsx": ["format", "sheet_count", "has_vba_macros"],
+}
+
+def _json_default(value):
+    if isinstance(value, (set, frozenset)):
+        return sorted(value, key=str)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+def to_json(value, indent=None):
+    return json.dumps(value, default=_json_default, ensure_ascii=False, indent=indent)
+
+def _comment(c):
+    return {"author": c.get("author", ""), "text": c.get("text", ""),
+            "date": c.get("date") or None, "location": c.get("location") or None}
+
+def _url_sources(filetype, info):
+    """{url: [sources]} in report order; PDFs tell stream, annotation and metadata URLs apart."""
+    sources = {}
+    if filetype == "pdf":
+        for url in sorted(info.get("url_objects", {})):
+            sources.setdefault(url, []).append("stream")
+        for url in info.get("annotation_urls", {}):
+            sources.setdefault(url, []).append("annotation")
+        for url in info.get("metadata_urls", {}):
+            sources.setdefault(url, []).append("metadata")
+    else:
+        for url in info.get("links", []):
+            sources.setdefault(url, ["document"])
+    return sources
+
+def _urls(filetype, info, rules_path, domains_path):
+    sources = _url_sources(filetype, info)
+    urls = list(sources)
+    verdicts = classify_urls(urls, domains_path)
+    hits = detect_urls(urls, rules_path)
+    objects = {}
+    for key in ("url_objects", "annotation_urls", "metadata_urls"):
+        for url, nums in info.get(key, {}).items():
+            objects.setdefault(url, set()).update(nums)
+    records = []
+    for url in urls:
+        verdict = verdicts[url]
+        records.append({
+            "url": url,
+            "sources": sources[url],
+            "objects": sorted(objects.get(url, ())),
+            "domain_action": verdict.action if verdict else None,
+            "domain_label": verdict.label if verdict else None,
+            "canary": hits["canary"].get(url, []),
+            "tracking": hits["tracking"].get(url, []),
+        })
+    return records
+
+def result_record(result, rules_path=None, domains_path=None):
+    """
+    One inspect_file() result as a schema record; the same layout for every
+    format, with empty lists or {} (not missing keys) where a format has
+    nothing.
+    """
+    filetype, info = result["filetype"], result.get("info")
+    record = {
+        "schema": SCHEMA,
+        "path": result["path"],
+        "filetype": filetype,
+        "error": result["error"],
+        "cached": bool(result.get("cached")),
+        "duplicate_of": result.get("duplicate_of"),
+    }
+    if "profile" in result:
+        record["profile"] = result["profile"]
+    if result["error"] is not None or info is None:
+        return record
+    size = info.get("file_size_bytes")
+    record["file"] = {"size_bytes": size, "size_human": human_readable_size(size) if size is not None else None}
+    record["properties"] = {key: info.get(key) for key in PROPERTIES.get(filetype, ())}
+    record["metadata"] = {str(name): value for name, value in info.get("meta", [])}
+    record["urls"] = _urls(filetype, info, rules_path, domains_path)
+    record["images"] = list(info.get("images", []))
+    record["comments"] = [_comment(c) for c in info.get("comments", [])]
+    record["custom_xml_parts"] = [part["filename"] for part in info.get("custom_xml_parts", [])]
+    record["notes"] = [{"slide": slide, "text": text} for slide, text in sorted(info.get("notes_texts", {}).items())]
+    record["sheets"] = [{k: sheet[k] for k in ("name", "dimension", "rows", "cells", "links")}
+                        for sheet in info.get("sheets", [])]
+    record["revisions"] = dict(info.get("revisions") or {})
+    record["truncated_streams"] = list(info.get("truncated_streams", []))
+    if "raw_metadata" in info:
+        record["raw_metadata"] = info["raw_metadata"]
+    return record
+
+class ResultWriter:
+    """
+    Writes result records to `stream` as each file finishes: "ndjson" is
+    one JSON object per line, flushed per record; "json" is a single array
+    written element by element, so nothing is held back either way.
+    """
+    def __init__(self, stream, fmt="ndjson", rules_path=None, domains_path=None):
+        self.stream = stream
+        self.fmt = fmt
+        self.rules_path = rules_path
+        self.domains_path = domains_path
+        self.count = 0
+
+    def write(self, result):
+        data = to_json(result_record(result, self.rules_path, self.domains_path))
+        if self.fmt == "json":
+            data = ("[\n" if self.count == 0 else ",\n") + data
+        else:
+            data += "\n"
+        self.stream.write(data)
+        self.stream.flush()
+        self.count += 1
+
+    def close(self):
+        if self.fmt == "json":
+            self.stream.write("[]\n" if self.count == 0 else "\n]\n")
+            self.stream.flush()
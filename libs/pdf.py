@@ -1,27 +1,96 @@
+import mmap
+import os
 import re
 import zlib
+from bisect import bisect_right
 from collections import Counter
+from contextlib import contextmanager
 from datetime import datetime
 from PyPDF2 import PdfReader
+from PyPDF2.generic import create_string_object
+from libs import profile
+from libs.detect import detect_urls
+from libs.pdf_objects import (
+    ENDOBJ_RE, OBJ_HEADER_RE, STREAM_KEYWORD_RE, PdfObjectIndex, PdfStream, Ref, iter_stream_data,
+    iter_strings, objstm_offsets, parse_object,
+)
+from libs.pdf_filters import DEFAULT_DECODE_LIMITS, DecodeLimits, OutputBudget, limit_output  # noqa: F401
 
 # CanaryTokenScanner-style regexes for PDF raw URL extraction
 URL_BYTES_RE = re.compile(rb'https?://[^\s<>"]+')
-PDF_STREAM_RE = re.compile(rb'stream[\r\n\s]+(.*?)[\r\n\s]+endstream', re.DOTALL)
-
-def detect_canarytokens(urls):
-    """Detect canarytoken URLs in a list of URLs."""
-    canary_patterns = [
-        r"canarytokens\.[a-z]+",
-        r"canary\.[a-z]+",
-        # Add more patterns as needed
-    ]
-    suspicious = []
-    for url in urls:
-        clean_url = url.rstrip(')>.,;\'\"]')
-        for pat in canary_patterns:
-            if re.search(pat, clean_url, re.IGNORECASE):
-                suspicious.append(url)
-    return suspicious
+
+# The raw scan reads the file in windows of RAW_SCAN_CHUNK_SIZE bytes plus
+# RAW_SCAN_OVERLAP bytes on each side, and decodes streams RAW_SCAN_CHUNK_SIZE
+# bytes at a time, so peak memory stays a small multiple of the chunk size
+# whatever the file size. URLs longer than the overlap may be truncated.
+RAW_SCAN_CHUNK_SIZE = 4 * 1024 * 1024
+RAW_SCAN_OVERLAP = 64 * 1024
+# Streams handed to a --jobs worker per task
+STREAM_BATCH_SIZE = 64
+
+class PdfSession:
+    """
+    One opened PDF shared by every extractor of a run.
+    The file, its xref table and the PdfReader are loaded once; the page list
+    and the document info dict are cached on first use.
+    """
+    def __init__(self, pdf_path):
+        self.path = pdf_path
+        self.stream = profile.open_file(pdf_path)
+        try:
+            self.size = os.fstat(self.stream.fileno()).st_size
+            with profile.span("pdf.open_reader"):
+                self.reader = PdfReader(self.stream)
+        except Exception:
+            self.stream.close()
+            raise
+        self._pages = None
+        self._metadata = None
+        self._objects = None
+
+    @property
+    def pages(self):
+        if self._pages is None:
+            with profile.span("pdf.pages"):
+                self._pages = list(self.reader.pages)
+        return self._pages
+
+    @property
+    def metadata(self):
+        if self._metadata is None:
+            metadata = self.reader.metadata
+            self._metadata = dict(metadata) if metadata else {}
+        return self._metadata
+
+    @property
+    def objects(self):
+        """PdfObjectIndex over the file (xref tables, xref and object streams), built on first use."""
+        if self._objects is None:
+            with profile.span("pdf.object_index"):
+                self._objects = PdfObjectIndex(self.stream)
+        return self._objects
+
+    def close(self):
+        self.stream.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+@contextmanager
+def open_pdf(pdf_file):
+    """Yield a PdfSession for `pdf_file`, reusing it when one is passed in."""
+    if isinstance(pdf_file, PdfSession):
+        yield pdf_file
+    else:
+        with PdfSession(pdf_file) as pdf:
+            yield pdf
+
+def detect_canarytokens(urls, rules_path=None):
+    """Detect canarytoken URLs in a list of URLs (see libs/rules/detect.rules)."""
+    return list(detect_urls(urls, rules_path)["canary"])
 
 
 PDF_META_FIELDS = [
@@ -77,64 +146,229 @@ def parse_pdf_date(date_str):
     except Exception:
         return date_str
 
+def _pdf_text(value):
+    # Text strings as PyPDF2 decodes them (UTF-16 with a BOM, else PDFDocEncoding)
+    return create_string_object(value) if isinstance(value, bytes) else value
+
+def _document_info(pdf):
+    """
+    {key: (value, number of the object holding it)} of the document info
+    dict, looked up through the object index; the number is None for a
+    direct dict. Falls back to PyPDF2 when the index found no trailer.
+    """
+    index = pdf.objects
+    if not index.trailer:
+        return {k: (v, None) for k, v in pdf.metadata.items()}
+    ref = index.trailer.get("/Info")
+    info = index.resolve(ref)
+    if not isinstance(info, dict):
+        return {}
+    num = ref.num if isinstance(ref, Ref) else None
+    return {k: (_pdf_text(index.resolve(v)), v.num if isinstance(v, Ref) else num) for k, v in info.items()}
+
+@profile.profiled("pdf.extract_metadata")
 def extract_metadata(pdf_path):
-    with open(pdf_path, "rb") as f:
-        reader = PdfReader(f)
-        metadata = reader.metadata
-        meta = dict(metadata) if metadata else {}
+    with open_pdf(pdf_path) as pdf:
+        meta = _document_info(pdf)
         result = []
         for field in PDF_META_FIELDS:
-            value = meta.get(field, "")
-            if field.lower().endswith("date"):
+            value = meta.get(field, ("", None))[0]
+            if field.lower().endswith("date") and isinstance(value, str):
                 value = parse_pdf_date(value)
             result.append([field[1:], value])  # Remove leading /
         return result
 
+@profile.profiled("pdf.extract_metadata_urls")
+def extract_metadata_urls(pdf_path):
+    """Maps the http(s) URLs in the document info dict values to the number of the object holding each."""
+    urls = {}
+    with open_pdf(pdf_path) as pdf:
+        for v, num in _document_info(pdf).values():
+            if isinstance(v, str) and ("http://" in v or "https://" in v):
+                for u in v.split():
+                    if u.startswith("http://") or u.startswith("https://"):
+                        nums = urls.setdefault(u, [])
+                        if num is not None and num not in nums:
+                            nums.append(num)
+    return {u: sorted(nums) for u, nums in urls.items()}
+
+def _iter_pages(index):
+    """Yields (object number, dict) of each leaf of the page tree, in document order."""
+    root = index.resolve(index.trailer.get("/Root"))
+    if not isinstance(root, dict):
+        return
+    seen = set()
+    stack = [root.get("/Pages")]
+    while stack:
+        ref = stack.pop()
+        if not isinstance(ref, Ref) or ref.num in seen:
+            continue
+        seen.add(ref.num)
+        node = index.get(ref.num)
+        if not isinstance(node, dict):
+            continue
+        kids = index.resolve(node.get("/Kids"))
+        if node.get("/Type") == "/Pages" or isinstance(kids, list):
+            stack.extend(reversed(kids if isinstance(kids, list) else []))
+        else:
+            yield ref.num, node
+
+def _link_uri(index, annot, num):
+    """(URI, number of the object holding it) of the link annotation `annot` found in object `num`."""
+    if isinstance(annot, Ref):
+        num = annot.num
+    annot = index.resolve(annot)
+    if not isinstance(annot, dict) or annot.get("/Subtype") != "/Link":
+        return None, num
+    action = annot.get("/A")
+    if isinstance(action, Ref):
+        num = action.num
+    action = index.resolve(action)
+    if not isinstance(action, dict):
+        return None, num
+    uri = action.get("/URI")
+    if isinstance(uri, Ref):
+        num = uri.num
+    return index.resolve(uri), num
+
+def _pypdf2_link_uris(pdf):
+    # Without a trailer there is no page tree to walk: ask PyPDF2
+    for page in pdf.pages:
+        for annot in page.get("/Annots") or ():
+            obj = annot.get_object()
+            if obj.get("/Subtype") == "/Link" and "/A" in obj and obj["/A"].get("/URI"):
+                yield obj["/A"]["/URI"], getattr(annot, "idnum", None)
+
+@profile.profiled("pdf.extract_link_annotations")
 def extract_link_annotations(pdf_path):
-    urls = set()
-    with open(pdf_path, "rb") as f:
-        reader = PdfReader(f)
-        for page_num, page in enumerate(reader.pages):
-            if "/Annots" in page:
-                for annot in page["/Annots"]:
-                    obj = annot.get_object()
-                    if obj.get("/Subtype") == "/Link":
-                        if "/A" in obj and obj["/A"].get("/URI"):
-                            url = obj["/A"]["/URI"]
-                            urls.add(url)
-    return sorted(urls)
-
-def get_page_size_summary(pdf_file):
-    with open(pdf_file, "rb") as f:
-        reader = PdfReader(f)
-        sizes = []
-        for page in reader.pages:
-            mediabox = page.mediabox
-            width = round(float(mediabox.width))
-            height = round(float(mediabox.height))
-            sizes.append((width, height))
-        count = Counter(sizes)
+    """
+    Maps the URI of every link annotation to the sorted numbers of the
+    objects it is stored in (the action, or the annotation holding it),
+    walking the page tree through the object index.
+    """
+    found = {}
+    with open_pdf(pdf_path) as pdf:
+        index = pdf.objects
+        if not index.trailer:
+            for uri, num in _pypdf2_link_uris(pdf):
+                found.setdefault(str(uri), set()).update([num] if num is not None else [])
+        for page_num, page in _iter_pages(index):
+            annots = page.get("/Annots")
+            holder = annots.num if isinstance(annots, Ref) else page_num
+            annots = index.resolve(annots)
+            for annot in annots if isinstance(annots, list) else ():
+                uri, num = _link_uri(index, annot, holder)
+                if isinstance(uri, bytes) and uri:
+                    found.setdefault(str(_pdf_text(uri)), set()).add(num)
+    return {url: sorted(nums) for url, nums in sorted(found.items())}
+
+# Fast path for leaf pages: a literal /MediaBox array read straight from the raw object.
+MEDIABOX_RE = re.compile(rb'/MediaBox[ \t\r\n\f\0]*\[([-+.\d \t\r\n\f\0]*)\]')
+
+def _raw_leaf_size(raw, inherited):
+    """Effective box of a leaf page from its raw bytes, or False when it must be parsed."""
+    if b"/Kids" in raw:
+        return False
+    m = MEDIABOX_RE.search(raw)
+    if m:
+        try:
+            llx, lly, urx, ury = (float(v) for v in m.group(1).split())
+        except ValueError:
+            return False
+        return round(urx - llx), round(ury - lly)
+    return False if b"/MediaBox" in raw else inherited
+
+def _box_size(box, index):
+    box = index.resolve(box)
+    if not isinstance(box, list) or len(box) != 4:
+        return None
+    llx, lly, urx, ury = (index.resolve(v) for v in box)
+    if not all(isinstance(v, (int, float)) for v in (llx, lly, urx, ury)):
+        return None
+    return round(float(urx - llx)), round(float(ury - lly))
+
+def count_page_sizes(pdf_file):
+    """
+    Returns a Counter of (width, height) over every page, walking the /Pages
+    tree through the object index instead of materialising page objects.
+    /MediaBox inheritance is resolved once per /Pages node, and each leaf
+    is only read (not parsed) to check for its own /MediaBox. Pages without any usable
+    box count under None. Returns None when the tree cannot be walked
+    (e.g. no usable xref).
+    """
+    with open_pdf(pdf_file) as pdf:
+        index = pdf.objects
+        root = index.resolve(index.trailer.get("/Root"))
+        if not isinstance(root, dict) or not isinstance(root.get("/Pages"), Ref):
+            return None
+        sizes = Counter()
+        seen = set()
+        stack = [(root["/Pages"], None)]
+        while stack:
+            ref, inherited = stack.pop()
+            if not isinstance(ref, Ref) or ref.num in seen:
+                continue
+            seen.add(ref.num)
+            raw = index.get_raw(ref.num)
+            if raw is not None:
+                size = _raw_leaf_size(raw, inherited)
+                if size is not False:
+                    sizes[size] += 1
+                    continue
+            node = index.get(ref.num)
+            if not isinstance(node, dict):
+                continue
+            size = _box_size(node["/MediaBox"], index) if "/MediaBox" in node else inherited
+            kids = index.resolve(node.get("/Kids"))
+            if node.get("/Type") == "/Pages" or isinstance(kids, list):
+                # Reversed so pages come off the stack in document order.
+                for kid in reversed(kids if isinstance(kids, list) else []):
+                    stack.append((kid, size))
+            else:
+                sizes[size] += 1
+        return sizes
+
+def get_page_size_summary(pdf_file, count=None):
+    with open_pdf(pdf_file) as pdf:
+        if count is None:
+            count = count_page_sizes(pdf)
+        if not count:
+            sizes = []
+            for page in pdf.pages:
+                mediabox = page.mediabox
+                width = round(float(mediabox.width))
+                height = round(float(mediabox.height))
+                sizes.append((width, height))
+            count = Counter(sizes)
         page_size_strs = []
-        for (w, h), v in count.items():
+        for size, v in count.items():
+            if size is None:
+                continue
+            w, h = size
             fmt = match_standard_format(w, h)
             suffix = f" [{fmt}]" if fmt else ""
             count_str = f" ({v}x)" if v > 1 else ""
             page_size_strs.append(f"{w} x {h}{suffix}{count_str}")
         return ', '.join(page_size_strs)
 
+@profile.profiled("pdf.get_pdf_basic_info")
 def get_pdf_basic_info(pdf_file):
     # Returns dict: file_size_bytes, pdf_version, is_encrypted, num_pages, page_size
-    from os.path import getsize
-    file_size = getsize(pdf_file)
-    with open(pdf_file, "rb") as f:
-        reader = PdfReader(f)
+    with open_pdf(pdf_file) as pdf:
+        reader = pdf.reader
         try:
             pdf_version = reader.pdf_header_version
         except AttributeError:
             pdf_version = "unknown"
         is_encrypted = reader.is_encrypted
-        num_pages = len(reader.pages)
-        page_size = get_page_size_summary(pdf_file)
+        try:
+            sizes = count_page_sizes(pdf)
+        except (ValueError, KeyError, TypeError, zlib.error):
+            # Broken object index: count and size the pages through PyPDF2
+            sizes = None
+        num_pages = sum(sizes.values()) if sizes else len(pdf.pages)
+        page_size = get_page_size_summary(pdf, sizes)
+        file_size = pdf.size
     return {
         "file_size_bytes": file_size,
         "pdf_version": pdf_version,
@@ -143,21 +377,314 @@ def get_pdf_basic_info(pdf_file):
         "page_size": page_size
     }
 
-def extract_urls_from_pdf_raw(pdf_path):
-    """Extract all URLs from raw PDF bytes and decompressed streams (robust, CanaryTokenScanner style)."""
-    urls = set()
+class _UrlScanner:
+    """
+    Incremental URL_BYTES_RE matcher fed with consecutive byte pieces.
+    A match touching the end of the buffered data is held back (up to
+    `max_carry` bytes) until the next piece arrives, so URLs split across a
+    piece boundary are still reported whole. `on_url(url, offset)` receives
+    each URL with the offset of its first byte in the fed data.
+    """
+    def __init__(self, on_url, max_carry=RAW_SCAN_OVERLAP):
+        self.on_url = on_url
+        self.max_carry = max_carry
+        self._tail = b""
+        self._pos = 0
+
+    def feed(self, data):
+        buf = self._tail + data if self._tail else data
+        base = self._pos - len(self._tail)
+        self._pos += len(data)
+        # Always keep enough bytes for a "https://" prefix cut at the end.
+        keep = max(0, len(buf) - 8)
+        for m in URL_BYTES_RE.finditer(buf):
+            if m.end() == len(buf) and len(buf) - m.start() <= self.max_carry:
+                keep = m.start()
+                break
+            self.on_url(m.group().decode('utf-8', 'ignore'), base + m.start())
+        self._tail = buf[keep:]
+
+    def close(self):
+        base = self._pos - len(self._tail)
+        for m in URL_BYTES_RE.finditer(self._tail):
+            self.on_url(m.group().decode('utf-8', 'ignore'), base + m.start())
+        self._tail = b""
+
+def _iter_windows(f, chunk_size, overlap):
+    """
+    Yields (window, lo, hi) covering the whole file in bounded windows.
+    Only matches starting in window[lo:hi] belong to a window; the `overlap`
+    bytes around that range keep tokens spanning a chunk boundary intact.
+    """
+    f.seek(0, os.SEEK_END)
+    size = f.tell()
+    pos = 0
+    while True:
+        start = max(0, pos - overlap)
+        end = min(size, pos + chunk_size + overlap)
+        f.seek(start)
+        window = f.read(end - start)
+        hi = end if end >= size else pos + chunk_size
+        yield window, pos - start, hi - start
+        if hi >= size:
+            return
+        pos = hi
+
+class _StringSpans:
+    """
+    (start, end) offsets of the string tokens of parsed objects. Their URLs
+    are reported from the parsed strings, escapes resolved and without the
+    closing ")", so the byte scan skips matches starting inside them.
+    """
+    def __init__(self):
+        self._starts = []
+        self._ends = []
+
+    def extend(self, spans):
+        for start, end in spans:
+            i = bisect_right(self._starts, start)
+            self._starts.insert(i, start)
+            self._ends.insert(i, end)
+
+    def covers(self, offset):
+        i = bisect_right(self._starts, offset) - 1
+        return i >= 0 and offset < self._ends[i]
+
+def _scan_string_urls(value, num, add):
+    # Parsed strings have their escapes resolved, e.g. /URI (http\072\057\057...)
+    for s in iter_strings(value):
+        if s.startswith(b"\xfe\xff"):
+            s = s[2:].decode("utf-16-be", "ignore").encode("utf-8")
+        if b"http" in s:
+            for m in URL_BYTES_RE.finditer(s):
+                add(m.group().decode('utf-8', 'ignore'), num)
+
+def _scan_object_stream(data, offsets, num, add):
+    """Attributes URLs inside a decoded /ObjStm to the member objects they belong to."""
+    members = sorted((off, member) for member, off in offsets.items())
+    starts = [off for off, _ in members]
+    strings = _StringSpans()
+    for off, member in members:
+        spans = []
+        try:
+            value, _ = parse_object(data, off, spans)
+        except ValueError:
+            continue
+        strings.extend(spans)
+        _scan_string_urls(value, member, add)
+    for m in URL_BYTES_RE.finditer(data):
+        if strings.covers(m.start()):
+            continue
+        i = bisect_right(starts, m.start()) - 1
+        add(m.group().decode('utf-8', 'ignore'), members[i][1] if i >= 0 else num)
+
+def _stream_task(index, num, stream):
+    """
+    Describes a filtered stream as a small picklable tuple
+    (num, offset, length, filters, decode_parms, objstm_header), with every
+    indirect entry resolved through the index, or None if there is nothing
+    to decode. Unfiltered data is already covered by the raw byte scan.
+    """
+    filters = index.resolve(stream.dict.get("/Filter"))
+    if not filters:
+        return None
+    length = index.stream_length(stream)
+    if length is None:
+        return None
+    objstm_header = None
+    if stream.dict.get("/Type") == "/ObjStm":
+        objstm_header = (index.resolve(stream.dict.get("/N")), index.resolve(stream.dict.get("/First")))
+    return (num, stream.offset, length, filters,
+            index.resolve(stream.dict.get("/DecodeParms")), objstm_header)
+
+def _scan_stream_urls(f, task, add, chunk_size, overlap, limits, budget, truncated):
+    """
+    Decodes the stream's exact /Length bytes through its declared filter chain once.
+    Streams stopped by a decode limit or a decode error are appended to
+    `truncated`; URLs decoded before the stop are kept.
+    """
+    num, offset, length, filters, decode_parms, objstm_header = task
+    stop = {}
+    pieces = limit_output(iter_stream_data(f, offset, length, filters, decode_parms, chunk_size,
+                                           limits.max_stream_bytes),
+                          length, limits, budget, stop)
+    try:
+        if objstm_header is not None:
+            # Members are parsed out of the whole decoded container.
+            data = b"".join(pieces)
+            if not stop:
+                _scan_object_stream(data, objstm_offsets(data, *objstm_header), num, add)
+        else:
+            scanner = _UrlScanner(lambda url, _offset: add(url, num), overlap)
+            try:
+                for piece in pieces:
+                    scanner.feed(piece)
+            finally:
+                scanner.close()
+    except (zlib.error, ValueError) as e:
+        stop.setdefault("reason", f"decode error: {e}")
+    if stop:
+        truncated.append({"object": num, "encoded_bytes": length, **stop})
+
+# Per-process state of --jobs workers: each maps the PDF once and decodes the
+# streams it is handed straight from the shared page cache.
+_worker_map = None
+_worker_budget = None
+
+def _init_stream_worker(pdf_path, budget):
+    global _worker_map, _worker_budget
     with open(pdf_path, "rb") as f:
-        pdf_content = f.read()
-        # URLs in raw bytes
-        urls.update(u.decode('utf-8', 'ignore') for u in URL_BYTES_RE.findall(pdf_content))
-        # URLs in decompressed streams
-        for m in PDF_STREAM_RE.finditer(pdf_content):
-            stream = m.group(1)
-            for decompress_flag in [zlib.MAX_WBITS, -zlib.MAX_WBITS]:
-                try:
-                    decompressed = zlib.decompress(stream, decompress_flag)
-                    urls.update(u.decode('utf-8', 'ignore') for u in URL_BYTES_RE.findall(decompressed))
-                except Exception:
-                    continue
-    return sorted(urls)
+        _worker_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    _worker_budget = budget
+
+def _scan_stream_batch(tasks, chunk_size, overlap, limits):
+    found = []
+    truncated = []
+    for task in tasks:
+        _scan_stream_urls(_worker_map, task, lambda url, num: found.append((url, num)),
+                          chunk_size, overlap, limits, _worker_budget, truncated)
+    return found, truncated
+
+@profile.profiled("pdf.scan_pdf_urls")
+def scan_pdf_urls(pdf_path, chunk_size=RAW_SCAN_CHUNK_SIZE, overlap=RAW_SCAN_OVERLAP, jobs=1,
+                  limits=DEFAULT_DECODE_LIMITS):
+    """
+    Scans the raw PDF bytes, decoded strings and decoded streams for URLs.
+    Returns a dict with:
+      - urls: {url: sorted numbers of the objects it was found in}, empty
+        for bytes outside any object. Objects packed in /ObjStm containers
+        are attributed to their own number, not the container's.
+      - truncated_streams: streams whose decoding stopped early on a decode
+        limit or error, as {object, encoded_bytes, reason, decoded_bytes}.
+    The file is streamed in bounded windows; stream lengths, filters and
+    object stream members are looked up through the session's object index.
+    With jobs > 1, stream decoding and matching run in that many worker
+    processes that each map the file; only stream descriptors are sent to
+    them. The result does not depend on the number of jobs.
+    """
+    found = {}
+    truncated = []
+    header_offsets = []
+    header_nums = []
+
+    def add(url, num):
+        nums = found.setdefault(url, set())
+        if num is not None:
+            nums.add(num)
+
+    strings = _StringSpans()
+
+    def add_at(url, offset):
+        if strings.covers(offset):
+            return
+        i = bisect_right(header_offsets, offset) - 1
+        add(url, header_nums[i] if i >= 0 else None)
+
+    with open_pdf(pdf_path) as pdf:
+        f = pdf.stream
+        index = pdf.objects
+        pool = None
+        use_pool = jobs > 1 and pdf.path and pdf.size
+        context = None
+        if use_pool:
+            from libs.shared import process_pool_context
+            # May start from a --prefetch parse thread while readers run
+            context = process_pool_context()
+        # One budget for the file: what the object index decoded so far counts
+        budget = OutputBudget(min(limits.max_file_bytes, index.budget.left), context)
+        index.budget = budget
+        if use_pool:
+            from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+            pool = ProcessPoolExecutor(max_workers=jobs, mp_context=context, initializer=_init_stream_worker,
+                                       initargs=(pdf.path, budget))
+        in_flight = set()
+        batch = []
+
+        def collect(done):
+            for future in done:
+                batch_found, batch_truncated = future.result()
+                for url, num in batch_found:
+                    add(url, num)
+                truncated.extend(batch_truncated)
+
+        def submit():
+            nonlocal in_flight
+            # Bound the number of queued batches so descriptors never pile up.
+            while len(in_flight) >= 2 * jobs:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect(done)
+            in_flight.add(pool.submit(_scan_stream_batch, batch[:], chunk_size, overlap, limits))
+            batch.clear()
+
+        try:
+            raw = _UrlScanner(add_at, overlap)
+            for window, lo, hi in _iter_windows(f, chunk_size, overlap):
+                window_offset = f.tell() - len(window)
+                headers = []
+                for m in OBJ_HEADER_RE.finditer(window, lo):
+                    if m.start() >= hi:
+                        break
+                    header_offsets.append(window_offset + m.start())
+                    header_nums.append(int(m.group(1)))
+                    headers.append(m)
+                # URLs in decoded strings and streams
+                for m in headers:
+                    num = int(m.group(1))
+                    spans = []
+                    stream = None
+                    try:
+                        value, end = parse_object(window, m.end(), spans)
+                        k = STREAM_KEYWORD_RE.match(window, end) if isinstance(value, dict) else None
+                        if k:
+                            stream = PdfStream(value, window_offset + k.end())
+                        spans = [(window_offset + a, window_offset + b) for a, b in spans]
+                    except ValueError:
+                        if window_offset + len(window) >= pdf.size or ENDOBJ_RE.search(window, m.end()):
+                            continue
+                        # The object runs past the window: read it whole, so
+                        # the result does not depend on the chunk size
+                        spans = []
+                        try:
+                            value = index.read_object_at(window_offset + m.start(), spans)[2]
+                        except ValueError:
+                            continue
+                        if isinstance(value, PdfStream):
+                            stream, value = value, value.dict
+                    strings.extend(spans)
+                    _scan_string_urls(value, num, add)
+                    if stream is None:
+                        continue
+                    task = _stream_task(index, num, stream)
+                    if task is None:
+                        continue
+                    if pool is None:
+                        with profile.span("pdf.inflate_stream"):
+                            _scan_stream_urls(f, task, add, chunk_size, overlap, limits, budget, truncated)
+                    else:
+                        batch.append(task)
+                        if len(batch) >= STREAM_BATCH_SIZE:
+                            submit()
+                # URLs in raw bytes, outside the strings parsed above
+                raw.feed(window[lo:hi])
+            raw.close()
+            if pool is not None:
+                if batch:
+                    submit()
+                collect(in_flight)
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+    return {
+        "urls": {url: sorted(nums) for url, nums in found.items()},
+        "truncated_streams": sorted(truncated, key=lambda t: t["object"]),
+    }
+
+def extract_urls_by_object(pdf_path, chunk_size=RAW_SCAN_CHUNK_SIZE, overlap=RAW_SCAN_OVERLAP, jobs=1,
+                           limits=DEFAULT_DECODE_LIMITS):
+    """Maps every URL found by scan_pdf_urls to the sorted numbers of the objects it was found in."""
+    return scan_pdf_urls(pdf_path, chunk_size, overlap, jobs, limits)["urls"]
 
+def extract_urls_from_pdf_raw(pdf_path, chunk_size=RAW_SCAN_CHUNK_SIZE, overlap=RAW_SCAN_OVERLAP, jobs=1,
+                              limits=DEFAULT_DECODE_LIMITS):
+    """Extract all URLs from raw PDF bytes and decoded streams (robust, CanaryTokenScanner style)."""
+    return sorted(scan_pdf_urls(pdf_path, chunk_size, overlap, jobs, limits)["urls"])
@@ -0,0 +1,394 @@
+import zlib
+from collections import namedtuple
+
+# Incremental decoders for the standard PDF stream filters. Every decoder
+# takes encoded bytes through feed() and yields decoded pieces; flush() yields
+# whatever is left once the encoded data ends. A FilterChain stacks them in
+# /Filter order so a stream is decoded once, piece by piece, in bounded memory.
+# Expanding decoders (LZW, RunLength) yield every OUTPUT_PIECE bytes so a
+# consumer can stop a hostile stream before its output grows large.
+OUTPUT_PIECE = 64 * 1024
+
+class FlateDecoder:
+    def __init__(self, chunk_size):
+        self.chunk_size = chunk_size
+        self._d = None
+        self._head = b""
+
+    def feed(self, data):
+        if self._d is None:
+            # Some writers emit raw deflate data without the zlib header.
+            self._head += data
+            if len(self._head) < 2:
+                return
+            cmf, flg = self._head[0], self._head[1]
+            wbits = zlib.MAX_WBITS if cmf & 0x0F == 8 and (cmf * 256 + flg) % 31 == 0 else -zlib.MAX_WBITS
+            self._d = zlib.decompressobj(wbits)
+            data, self._head = self._head, b""
+        buf = data
+        while buf and not self._d.eof:
+            out = self._d.decompress(buf, self.chunk_size)
+            buf = self._d.unconsumed_tail
+            if out:
+                yield out
+
+    def flush(self):
+        if self._d is None:
+            return
+        out = self._d.flush()
+        if out:
+            yield out
+
+class ASCIIHexDecoder:
+    def __init__(self):
+        self._odd = b""
+        self._done = False
+
+    def feed(self, data):
+        if self._done:
+            return
+        end = data.find(b">")
+        if end >= 0:
+            data = data[:end]
+            self._done = True
+        digits = self._odd + bytes(b for b in data if b not in b" \t\r\n\f\0")
+        cut = len(digits) - len(digits) % 2
+        self._odd = digits[cut:]
+        if cut:
+            yield bytes.fromhex(digits[:cut].decode("ascii"))
+
+    def flush(self):
+        if self._odd:
+            yield bytes.fromhex((self._odd + b"0").decode("ascii"))
+            self._odd = b""
+
+class ASCII85Decoder:
+    def __init__(self):
+        self._group = []
+        self._done = False
+
+    def feed(self, data):
+        if self._done:
+            return
+        out = bytearray()
+        for c in data:
+            if c == 0x7E:  # '~' starts the '~>' end marker
+                self._done = True
+                break
+            if c in b" \t\r\n\f\0":
+                continue
+            if c == 0x7A and not self._group:  # 'z'
+                out += b"\0\0\0\0"
+                continue
+            if not 0x21 <= c <= 0x75:
+                raise ValueError("invalid ASCII85 character")
+            self._group.append(c - 33)
+            if len(self._group) == 5:
+                out += self._word(self._group)
+                self._group = []
+        if out:
+            yield bytes(out)
+
+    def flush(self):
+        if self._group:
+            n = len(self._group)
+            if n == 1:
+                raise ValueError("truncated ASCII85 group")
+            yield self._word(self._group + [84] * (5 - n))[:n - 1]
+            self._group = []
+
+    @staticmethod
+    def _word(group):
+        value = 0
+        for d in group:
+            value = value * 85 + d
+        return (value & 0xFFFFFFFF).to_bytes(4, "big")
+
+class RunLengthDecoder:
+    def __init__(self):
+        self._pending = b""
+        self._done = False
+
+    def feed(self, data):
+        if self._done:
+            return
+        data = self._pending + data
+        out = bytearray()
+        pos = 0
+        n = len(data)
+        while pos < n:
+            length = data[pos]
+            if length == 128:
+                self._done = True
+                pos = n
+                break
+            if length < 128:
+                if pos + 1 + length + 1 > n:
+                    break
+                out += data[pos + 1:pos + 2 + length]
+                pos += 2 + length
+            else:
+                if pos + 1 >= n:
+                    break
+                out += data[pos + 1:pos + 2] * (257 - length)
+                pos += 2
+            if len(out) >= OUTPUT_PIECE:
+                yield bytes(out)
+                out.clear()
+        self._pending = data[pos:]
+        if out:
+            yield bytes(out)
+
+    def flush(self):
+        return iter(())
+
+class LZWDecoder:
+    def __init__(self, early_change=1):
+        self.early_change = early_change
+        self._bits = 0
+        self._nbits = 0
+        self._done = False
+        self._reset()
+
+    def _reset(self):
+        self._table = [bytes([i]) for i in range(256)] + [b"", b""]
+        self._code_len = 9
+        self._prev = None
+
+    def feed(self, data):
+        out = bytearray()
+        for byte in data:
+            if self._done:
+                break
+            self._bits = (self._bits << 8) | byte
+            self._nbits += 8
+            while self._nbits >= self._code_len:
+                self._nbits -= self._code_len
+                code = self._bits >> self._nbits
+                self._bits &= (1 << self._nbits) - 1
+                if code == 256:
+                    self._reset()
+                    continue
+                if code == 257:
+                    self._done = True
+                    break
+                table = self._table
+                if code < len(table):
+                    entry = table[code]
+                elif code == len(table) and self._prev is not None:
+                    entry = self._prev + self._prev[:1]
+                else:
+                    raise ValueError("invalid LZW code")
+                if self._prev is not None and len(table) < 4096:
+                    table.append(self._prev + entry[:1])
+                out += entry
+                self._prev = entry
+                size = len(table) + self.early_change
+                self._code_len = 12 if size >= 2048 else 11 if size >= 1024 else 10 if size >= 512 else 9
+            if len(out) >= OUTPUT_PIECE:
+                yield bytes(out)
+                out.clear()
+        if out:
+            yield bytes(out)
+
+    def flush(self):
+        return iter(())
+
+class PredictorDecoder:
+    """
+    Undoes PNG (10-15) and TIFF (2) predictors declared in /DecodeParms.
+    Raises ValueError for parameters that are not positive or that make one
+    row longer than `max_row` bytes.
+    """
+    def __init__(self, predictor, colors=1, bits_per_component=8, columns=1, max_row=None):
+        if colors < 1 or bits_per_component < 1 or columns < 1:
+            raise ValueError("invalid predictor parameters")
+        self.predictor = predictor
+        self.bpp = max(1, colors * bits_per_component // 8)
+        self.row_len = (colors * bits_per_component * columns + 7) // 8
+        if max_row is not None and self.row_len > max_row:
+            raise ValueError("predictor row longer than the stream output limit")
+        self.tiff_bytewise = bits_per_component == 8
+        self._prev = bytes(self.row_len)
+        self._pending = b""
+
+    def feed(self, data):
+        data = self._pending + data
+        stride = self.row_len + (1 if self.predictor >= 10 else 0)
+        rows = len(data) // stride
+        self._pending = data[rows * stride:]
+        if not rows:
+            return
+        out = bytearray()
+        for r in range(rows):
+            row = data[r * stride:(r + 1) * stride]
+            if self.predictor >= 10:
+                row = self._png_row(row[0], bytearray(row[1:]))
+            elif self.tiff_bytewise:
+                row = bytearray(row)
+                for i in range(self.bpp, len(row)):
+                    row[i] = (row[i] + row[i - self.bpp]) & 0xFF
+            out += row
+        yield bytes(out)
+
+    def _png_row(self, kind, row):
+        prev, bpp = self._prev, self.bpp
+        if kind == 1:
+            for i in range(bpp, len(row)):
+                row[i] = (row[i] + row[i - bpp]) & 0xFF
+        elif kind == 2:
+            for i in range(len(row)):
+                row[i] = (row[i] + prev[i]) & 0xFF
+        elif kind == 3:
+            for i in range(len(row)):
+                left = row[i - bpp] if i >= bpp else 0
+                row[i] = (row[i] + ((left + prev[i]) >> 1)) & 0xFF
+        elif kind == 4:
+            for i in range(len(row)):
+                a = row[i - bpp] if i >= bpp else 0
+                b = prev[i]
+                c = prev[i - bpp] if i >= bpp else 0
+                p = a + b - c
+                pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+                pred = a if pa <= pb and pa <= pc else b if pb <= pc else c
+                row[i] = (row[i] + pred) & 0xFF
+        self._prev = bytes(row)
+        return row
+
+    def flush(self):
+        if self._pending:
+            yield self._pending
+            self._pending = b""
+
+class FilterChain:
+    def __init__(self, decoders):
+        self.decoders = decoders
+
+    def feed(self, data):
+        return self._push(0, data)
+
+    def flush(self):
+        for i, decoder in enumerate(self.decoders):
+            for out in decoder.flush():
+                yield from self._push(i + 1, out)
+
+    def _push(self, i, data):
+        if i == len(self.decoders):
+            if data:
+                yield data
+            return
+        for out in self.decoders[i].feed(data):
+            yield from self._push(i + 1, out)
+
+# Image codecs and encryption carry no text worth scanning for URLs.
+OPAQUE_FILTERS = {"/DCTDecode", "/DCT", "/JPXDecode", "/CCITTFaxDecode", "/CCF",
+                  "/JBIG2Decode", "/Crypt"}
+
+def _int_parm(parms, key, default):
+    value = parms.get(key, default)
+    return value if isinstance(value, int) else default
+
+def _make_decoder(name, parms, chunk_size, max_row):
+    parms = parms if isinstance(parms, dict) else {}
+    if name in ("/FlateDecode", "/Fl"):
+        decoder = FlateDecoder(chunk_size)
+    elif name in ("/LZWDecode", "/LZW"):
+        decoder = LZWDecoder(_int_parm(parms, "/EarlyChange", 1))
+    elif name in ("/ASCIIHexDecode", "/AHx"):
+        return [ASCIIHexDecoder()]
+    elif name in ("/ASCII85Decode", "/A85"):
+        return [ASCII85Decoder()]
+    elif name in ("/RunLengthDecode", "/RL"):
+        return [RunLengthDecoder()]
+    else:
+        return None
+    predictor = _int_parm(parms, "/Predictor", 1)
+    if predictor == 2 or predictor >= 10:
+        return [decoder, PredictorDecoder(
+            predictor,
+            colors=_int_parm(parms, "/Colors", 1),
+            bits_per_component=_int_parm(parms, "/BitsPerComponent", 8),
+            columns=_int_parm(parms, "/Columns", 1),
+            max_row=max_row,
+        )]
+    return [decoder]
+
+def build_filter_chain(filters, decode_parms=None, chunk_size=1 << 20, max_row=None):
+    """
+    Builds a FilterChain for a stream's /Filter and /DecodeParms entries.
+    Returns None when the stream has no filter (its bytes are already
+    plain) or uses a filter that cannot be decoded to text. Raises
+    ValueError for predictor parameters that are invalid or ask for rows
+    longer than `max_row` bytes.
+    """
+    if isinstance(filters, str):
+        filters = [filters]
+        decode_parms = [decode_parms]
+    if not isinstance(filters, list) or not filters:
+        return None
+    if not isinstance(decode_parms, list):
+        decode_parms = [decode_parms] * len(filters)
+    decoders = []
+    for i, name in enumerate(filters):
+        if not isinstance(name, str) or name in OPAQUE_FILTERS:
+            return None
+        parms = decode_parms[i] if i < len(decode_parms) else None
+        stage = _make_decoder(name, parms, chunk_size, max_row)
+        if stage is None:
+            return None
+        decoders.extend(stage)
+    return FilterChain(decoders)
+
+# Decompression-bomb guards for stream decoding. A stream stops decoding once
+# it has produced max_stream_bytes, once its decoded/encoded ratio exceeds
+# max_ratio (after RATIO_GRACE_BYTES of output), or once the whole file has
+# produced max_file_bytes. Stopped streams are reported, not dropped silently.
+DecodeLimits = namedtuple("DecodeLimits", ["max_stream_bytes", "max_file_bytes", "max_ratio"])
+DEFAULT_DECODE_LIMITS = DecodeLimits(
+    max_stream_bytes=256 * 1024 * 1024,
+    max_file_bytes=2 * 1024 * 1024 * 1024,
+    max_ratio=1000,
+)
+RATIO_GRACE_BYTES = 1024 * 1024
+
+class OutputBudget:
+    """
+    Decoded bytes a file may still produce; backed by a shared Value of
+    multiprocessing `context` when --jobs workers decode too.
+    """
+    def __init__(self, total, context=None):
+        self._value = None
+        if context is not None:
+            self._value = context.Value("q", total)
+        self._left = total
+
+    @property
+    def left(self):
+        return self._left if self._value is None else self._value.value
+
+    def take(self, n):
+        if self._value is None:
+            self._left -= n
+            return self._left >= 0
+        with self._value.get_lock():
+            self._value.value -= n
+            return self._value.value >= 0
+
+def limit_output(pieces, encoded_length, limits, budget, stop):
+    """Passes decoded pieces through until a limit trips; `stop` records why."""
+    total = 0
+    try:
+        for piece in pieces:
+            total += len(piece)
+            if total > limits.max_stream_bytes:
+                stop.update(reason="stream output limit", decoded_bytes=total)
+                return
+            if total > RATIO_GRACE_BYTES and total > limits.max_ratio * max(encoded_length, 1):
+                stop.update(reason="compression ratio limit", decoded_bytes=total)
+                return
+            if not budget.take(len(piece)):
+                stop.update(reason="file output limit", decoded_bytes=total)
+                return
+            yield piece
+    finally:
+        pieces.close()
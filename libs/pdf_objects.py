@@ -0,0 +1,533 @@
+import re
+import zlib
+from bisect import bisect_right
+from collections import OrderedDict, namedtuple
+from libs.pdf_filters import DEFAULT_DECODE_LIMITS, OutputBudget, build_filter_chain, limit_output
+
+# Minimal PDF object syntax used by the raw scanner: enough to read object
+# headers, stream dictionaries and the values they point at, without going
+# through PyPDF2. Names keep their leading "/" (PyPDF2 style), strings are
+# returned as bytes and indirect references as Ref tuples.
+
+Ref = namedtuple("Ref", ["num", "gen"])
+PdfStream = namedtuple("PdfStream", ["dict", "offset"])  # offset of the first data byte
+
+# Not preceded by a digit, so a scan starting inside "129 0 obj" sees no "9 0 obj"
+OBJ_HEADER_RE = re.compile(rb'(?<![0-9])(\d+)[ \t\r\n\f\0]+(\d+)[ \t\r\n\f\0]+obj(?![A-Za-z])')
+STREAM_KEYWORD_RE = re.compile(rb'[ \t\r\n\f\0]*stream[ \t]*(?:\r\n|\r|\n)')
+
+WHITESPACE = b" \t\r\n\f\0"
+DELIMITERS = b"()<>[]{}/%"
+_SPACE_RE = re.compile(rb'(?:[ \t\r\n\f\0]+|%[^\r\n]*)*')
+# One token per match, leading whitespace and comments included.
+_TOKEN_RE = re.compile(rb"""(?:[ \t\r\n\f\0]+|%[^\r\n]*)*(?:
+    (?P<ref>(\d+)[ \t\r\n\f\0]+(\d+)[ \t\r\n\f\0]+R)(?![^ \t\r\n\f\0()<>\[\]{}/%])
+  | (?P<num>[+-]?(?:\d+\.?\d*|\.\d+))(?![^ \t\r\n\f\0()<>\[\]{}/%])
+  | /(?P<name>[^ \t\r\n\f\0()<>\[\]{}/%]*)
+  | (?P<open_dict><<) | (?P<close_dict>>>) | (?P<open_array>\[) | (?P<close_array>\])
+  | (?P<string>\() | (?P<hex><)
+  | (?P<keyword>true|false|null)(?![^ \t\r\n\f\0()<>\[\]{}/%])
+)""", re.VERBOSE)
+_KEYWORDS = {b"true": True, b"false": False, b"null": None}
+_NAME_ESCAPE_RE = re.compile(rb'#([0-9A-Fa-f]{2})')
+_STRING_CHUNK_RE = re.compile(rb'[^\\()]+')
+_STRING_ESCAPES = {
+    ord("n"): b"\n", ord("r"): b"\r", ord("t"): b"\t", ord("b"): b"\b",
+    ord("f"): b"\f", ord("("): b"(", ord(")"): b")", ord("\\"): b"\\",
+}
+MAX_NESTING = 64
+
+def skip_space(data, pos):
+    return _SPACE_RE.match(data, pos).end()
+
+def parse_object(data, pos, string_spans=None):
+    """
+    Parses one PDF object starting at `pos` in `data`.
+    Returns (value, end_pos); raises ValueError on malformed or truncated input.
+    With a `string_spans` list, the (start, end) offsets of every string
+    token parsed, delimiters included, are appended to it.
+    """
+    stack = []  # open containers as (is_dict, items)
+    while True:
+        m = _TOKEN_RE.match(data, pos)
+        if m is None:
+            raise ValueError(f"unexpected token or end of data at offset {pos}")
+        pos = m.end()
+        kind = m.lastgroup
+        if kind == "num":
+            text = m.group("num")
+            value = float(text) if b"." in text else int(text)
+        elif kind == "name":
+            name = m.group("name")
+            if b"#" in name:
+                name = _NAME_ESCAPE_RE.sub(lambda e: bytes([int(e.group(1), 16)]), name)
+            value = "/" + name.decode("latin-1")
+        elif kind == "ref":
+            value = Ref(int(m.group(2)), int(m.group(3)))
+        elif kind == "open_dict" or kind == "open_array":
+            if len(stack) >= MAX_NESTING:
+                raise ValueError("PDF object nested too deeply")
+            stack.append((kind == "open_dict", []))
+            continue
+        elif kind == "close_dict" or kind == "close_array":
+            if not stack or stack[-1][0] != (kind == "close_dict"):
+                raise ValueError(f"unbalanced {m.group(kind)!r} at offset {pos}")
+            is_dict, items = stack.pop()
+            if is_dict:
+                keys = items[0::2]
+                if len(items) % 2 or not all(isinstance(k, str) for k in keys):
+                    raise ValueError(f"malformed dictionary ending at offset {pos}")
+                value = dict(zip(keys, items[1::2]))
+            else:
+                value = items
+        elif kind == "string" or kind == "hex":
+            start = m.start(kind)
+            value, pos = (_parse_literal_string if kind == "string" else _parse_hex_string)(data, pos)
+            if string_spans is not None:
+                string_spans.append((start, pos))
+        else:
+            value = _KEYWORDS[m.group("keyword")]
+        if not stack:
+            return value, pos
+        stack[-1][1].append(value)
+
+def _parse_hex_string(data, pos):
+    end = data.find(b">", pos)
+    if end < 0:
+        raise ValueError("unterminated hex string")
+    digits = bytes(b for b in data[pos:end] if b not in WHITESPACE)
+    if len(digits) % 2:
+        digits += b"0"
+    try:
+        return bytes.fromhex(digits.decode("ascii")), end + 1
+    except (UnicodeDecodeError, ValueError):
+        raise ValueError("invalid hex string")
+
+def _parse_literal_string(data, pos):
+    out = bytearray()
+    nesting = 1
+    n = len(data)
+    while pos < n:
+        m = _STRING_CHUNK_RE.match(data, pos)
+        if m:
+            out += m.group()
+            pos = m.end()
+            if pos >= n:
+                break
+        c = data[pos]
+        if c == 0x5C:  # backslash
+            pos += 1
+            if pos >= n:
+                break
+            e = data[pos]
+            if e in _STRING_ESCAPES:
+                out += _STRING_ESCAPES[e]
+                pos += 1
+            elif 0x30 <= e <= 0x37:
+                digits = data[pos:pos + 3]
+                k = 0
+                while k < len(digits) and 0x30 <= digits[k] <= 0x37:
+                    k += 1
+                out.append(int(digits[:k], 8) & 0xFF)
+                pos += k
+            elif e == 0x0D:
+                pos += 2 if data.startswith(b"\r\n", pos) else 1
+            elif e == 0x0A:
+                pos += 1
+            else:
+                out.append(e)
+                pos += 1
+            continue
+        if c == 0x28:
+            nesting += 1
+        elif c == 0x29:
+            nesting -= 1
+            if nesting == 0:
+                return bytes(out), pos + 1
+        out.append(c)
+        pos += 1
+    raise ValueError("unterminated literal string")
+
+ENDOBJ_RE = re.compile(rb'endobj(?![A-Za-z])')
+STARTXREF_RE = re.compile(rb'startxref[ \t\r\n\f\0]+(\d+)')
+ENDSTREAM_RE = re.compile(rb'(?:\r\n|\r|\n)?endstream')
+MAX_OBJECT_READ = 64 * 1024 * 1024
+# Most objects fit in one small read; larger ones grow it 4x at a time.
+OBJECT_READ_SIZE = 4096
+
+def iter_strings(value):
+    """Yields every string (bytes) nested in a parsed object."""
+    if isinstance(value, bytes):
+        yield value
+    elif isinstance(value, dict):
+        for v in value.values():
+            yield from iter_strings(v)
+    elif isinstance(value, list):
+        for v in value:
+            yield from iter_strings(v)
+
+def iter_stream_data(f, offset, length, filters, decode_parms, chunk_size, max_row=MAX_OBJECT_READ):
+    """
+    Yields `length` stream bytes read from `f` (a file or mmap) at `offset`,
+    decoded through the /Filter chain; raw bytes when there is no filter and
+    nothing when a filter cannot be decoded. Raises ValueError when the
+    /DecodeParms ask for predictor rows longer than `max_row` bytes.
+    """
+    chain = None
+    if filters:
+        chain = build_filter_chain(filters, decode_parms, chunk_size, max_row)
+        if chain is None:
+            return
+    pos = offset
+    remaining = length
+    while remaining > 0:
+        f.seek(pos)
+        data = f.read(min(chunk_size, remaining))
+        if not data:
+            break
+        pos += len(data)
+        remaining -= len(data)
+        if chain is None:
+            yield data
+        else:
+            yield from chain.feed(data)
+    if chain is not None:
+        yield from chain.flush()
+
+def _join_limited(pieces, limit):
+    out = bytearray()
+    for piece in pieces:
+        out += piece
+        if len(out) > limit:
+            raise ValueError("stream exceeds read limit")
+    return bytes(out)
+
+def read_stream_data(f, offset, length, filters, decode_parms, chunk_size, limit=MAX_OBJECT_READ):
+    return _join_limited(iter_stream_data(f, offset, length, filters, decode_parms, chunk_size), limit)
+
+def objstm_offsets(data, count, first):
+    """Returns {member num: offset in data} from the header of a decoded /ObjStm."""
+    offsets = {}
+    if not isinstance(count, int) or not isinstance(first, int):
+        return offsets
+    pos = 0
+    for _ in range(count):
+        num, pos = parse_object(data, pos)
+        off, pos = parse_object(data, pos)
+        if isinstance(num, int) and isinstance(off, int):
+            offsets[num] = first + off
+    return offsets
+
+class PdfObjectIndex:
+    """
+    Object number -> location map for one PDF, built once per file from the
+    xref tables and xref streams, or by scanning object headers when those
+    are missing or broken. Entries are ("offset", byte_offset) for objects in
+    the file body and ("objstm", container_num, index) for objects stored
+    inside a compressed /ObjStm.
+
+    Streams the index decodes itself (xref and object streams, values it is
+    asked for) stop at `limits` like those of the URL scan, and draw on the
+    file's output `budget` (libs.pdf_filters.OutputBudget).
+    """
+    def __init__(self, f, chunk_size=1024 * 1024, limits=DEFAULT_DECODE_LIMITS, budget=None):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.limits = limits
+        self.budget = budget if budget is not None else OutputBudget(limits.max_file_bytes)
+        self.entries = {}
+        self.trailer = {}
+        # Decoded object streams, least recently used first
+        self._objstm_cache = OrderedDict()
+        self._objstm_starts = {}
+        try:
+            self._load_xref()
+        except (ValueError, KeyError, TypeError, IndexError, zlib.error):
+            self.entries = {}
+        if not any(self.entries.values()):
+            self._rebuild()
+        self.entries = {num: e for num, e in self.entries.items() if e}
+
+    def __contains__(self, num):
+        return num in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, num):
+        """Returns the parsed object `num` (a PdfStream for streams), or None."""
+        entry = self.entries.get(num)
+        if entry is None:
+            return None
+        try:
+            if entry[0] == "offset":
+                return self.read_object_at(entry[1])[2]
+            data, offsets = self._objstm_members(entry[1])
+            if num not in offsets:
+                return None
+            return parse_object(data, offsets[num])[0]
+        except (ValueError, KeyError, TypeError, zlib.error):
+            # A corrupt /ObjStm makes its members missing objects
+            return None
+
+    def get_raw(self, num):
+        """
+        Returns the unparsed bytes of object `num` (after its header), or None
+        when it is unknown or does not fit in one small read. Lets callers
+        that only need one key skip parsing whole objects.
+        """
+        entry = self.entries.get(num)
+        if entry is None:
+            return None
+        try:
+            if entry[0] == "offset":
+                self.f.seek(entry[1])
+                data = self.f.read(OBJECT_READ_SIZE)
+                m = OBJ_HEADER_RE.match(data, skip_space(data, 0))
+                e = ENDOBJ_RE.search(data, m.end()) if m else None
+                return data[m.end():e.start()] if e else None
+            data, offsets = self._objstm_members(entry[1])
+            if num not in offsets:
+                return None
+            starts = self._objstm_starts[entry[1]]
+            start = offsets[num]
+            i = bisect_right(starts, start)
+            return data[start:starts[i] if i < len(starts) else len(data)]
+        except (ValueError, KeyError, TypeError, zlib.error):
+            return None
+
+    def resolve(self, value):
+        return self.get(value.num) if isinstance(value, Ref) else value
+
+    def stream_length(self, stream):
+        """Declared /Length of `stream`, following an indirect reference; falls back to the next endstream."""
+        length = self.resolve(stream.dict.get("/Length"))
+        if isinstance(length, int) and length >= 0:
+            return length
+        pos = stream.offset
+        window = self.chunk_size
+        while True:
+            self.f.seek(pos)
+            data = self.f.read(window + 16)
+            m = ENDSTREAM_RE.search(data)
+            if m:
+                return pos + m.start() - stream.offset
+            if len(data) < window + 16:
+                return None
+            pos += window
+
+    def iter_stream(self, stream, length=None):
+        """
+        Yields the data of `stream` piece by piece, decoded once through its
+        /Filter chain (raw bytes when it has no filter). Yields nothing for
+        filters that cannot be decoded.
+        """
+        if length is None:
+            length = self.stream_length(stream)
+        if length is None:
+            return
+        yield from iter_stream_data(
+            self.f, stream.offset, length,
+            self.resolve(stream.dict.get("/Filter")),
+            self.resolve(stream.dict.get("/DecodeParms")),
+            self.chunk_size,
+        )
+
+    def read_stream(self, stream, limit=MAX_OBJECT_READ):
+        """
+        The decoded data of `stream`. Raises ValueError when it is larger
+        than `limit` or stops at a decode limit.
+        """
+        length = self.stream_length(stream)
+        if length is None:
+            return b""
+        stop = {}
+        data = _join_limited(limit_output(self.iter_stream(stream, length), length, self.limits, self.budget, stop),
+                             limit)
+        if stop:
+            raise ValueError(stop["reason"])
+        return data
+
+    def objstm_members(self, container_num, stream=None):
+        """Returns (decoded data, {member num: offset in data}) for an /ObjStm."""
+        return self._objstm_members(container_num, stream)
+
+    def read_object_at(self, offset, string_spans=None):
+        """
+        Returns (num, gen, value, end_offset) for the object whose header
+        starts at `offset`, reading as much of the file as it takes (up to
+        MAX_OBJECT_READ). With a `string_spans` list, the file offsets of its
+        string tokens are appended as parse_object() does.
+        """
+        size = OBJECT_READ_SIZE
+        while True:
+            self.f.seek(offset)
+            data = self.f.read(size)
+            m = OBJ_HEADER_RE.match(data, skip_space(data, 0))
+            if not m:
+                raise ValueError(f"no object header at offset {offset}")
+            spans = [] if string_spans is not None else None
+            try:
+                value, end = parse_object(data, m.end(), spans)
+            except ValueError:
+                if len(data) < size or size >= MAX_OBJECT_READ:
+                    raise
+                size *= 4
+                continue
+            if isinstance(value, dict):
+                k = STREAM_KEYWORD_RE.match(data, end)
+                if k:
+                    value = PdfStream(value, offset + k.end())
+                    end = k.end()
+            if spans:
+                string_spans.extend((offset + a, offset + b) for a, b in spans)
+            return int(m.group(1)), int(m.group(2)), value, offset + end
+
+    def _objstm_members(self, container_num, stream=None):
+        cached = self._objstm_cache.get(container_num)
+        if cached is not None:
+            self._objstm_cache.move_to_end(container_num)
+            if isinstance(cached, str):
+                raise ValueError(cached)
+            return cached
+        if stream is None:
+            stream = self.get(container_num)
+        if not isinstance(stream, PdfStream):
+            raise ValueError(f"object {container_num} is not an object stream")
+        try:
+            data = self.read_stream(stream)
+        except (ValueError, zlib.error) as e:
+            # Remembered, so a broken or bomb container is not decoded again
+            self._cache_objstm(container_num, f"object stream {container_num}: {e}", ())
+            raise
+        offsets = objstm_offsets(data, self.resolve(stream.dict.get("/N")), self.resolve(stream.dict.get("/First")))
+        self._cache_objstm(container_num, (data, offsets), offsets.values())
+        return data, offsets
+
+    def _cache_objstm(self, container_num, members, offsets):
+        if len(self._objstm_cache) >= 16:
+            evicted, _ = self._objstm_cache.popitem(last=False)
+            self._objstm_starts.pop(evicted, None)
+        self._objstm_cache[container_num] = members
+        self._objstm_starts[container_num] = sorted(offsets)
+
+    def _load_xref(self):
+        f = self.f
+        f.seek(0, 2)
+        size = f.tell()
+        f.seek(max(0, size - 4096))
+        matches = list(STARTXREF_RE.finditer(f.read()))
+        if not matches:
+            return
+        offset = int(matches[-1].group(1))
+        seen = set()
+        # Newest section first: entries already present win over older ones.
+        while isinstance(offset, int) and 0 <= offset < size and offset not in seen:
+            seen.add(offset)
+            f.seek(offset)
+            head = f.read(32)
+            if head[skip_space(head, 0):].startswith(b"xref"):
+                trailer = self._parse_xref_table(offset)
+                hybrid = trailer.get("/XRefStm")
+                if isinstance(hybrid, int) and hybrid not in seen:
+                    seen.add(hybrid)
+                    self._parse_xref_stream(hybrid)
+            else:
+                trailer = self._parse_xref_stream(offset)
+            if not self.trailer:
+                self.trailer = trailer
+            offset = trailer.get("/Prev")
+
+    def _parse_xref_table(self, offset):
+        f = self.f
+        f.seek(offset)
+        data = b""
+        while b"trailer" not in data:
+            piece = f.read(self.chunk_size)
+            if not piece:
+                raise ValueError("xref table without trailer")
+            data += piece
+        cut = data.index(b"trailer")
+        tokens = data[:cut].split()[1:]  # drop the "xref" keyword
+        i = 0
+        while i + 1 < len(tokens):
+            start, count = int(tokens[i]), int(tokens[i + 1])
+            i += 2
+            for k in range(count):
+                off, _gen, kind = tokens[i:i + 3]
+                i += 3
+                num = start + k
+                if num not in self.entries:
+                    self.entries[num] = ("offset", int(off)) if kind == b"n" else None
+        trailer, _ = parse_object(data, cut + len(b"trailer"))
+        return trailer
+
+    def _parse_xref_stream(self, offset):
+        _num, _gen, stream, _end = self.read_object_at(offset)
+        if not isinstance(stream, PdfStream):
+            raise ValueError(f"no xref stream at offset {offset}")
+        widths = stream.dict["/W"]
+        data = self.read_stream(stream)
+        index = stream.dict.get("/Index", [0, stream.dict.get("/Size", 0)])
+        row = sum(widths)
+        pos = 0
+        for start, count in zip(index[0::2], index[1::2]):
+            for k in range(count):
+                if pos + row > len(data):
+                    break
+                fields = []
+                for w in widths:
+                    fields.append(int.from_bytes(data[pos:pos + w], "big"))
+                    pos += w
+                kind = fields[0] if widths[0] else 1
+                num = start + k
+                if num in self.entries:
+                    continue
+                if kind == 1:
+                    self.entries[num] = ("offset", fields[1])
+                elif kind == 2:
+                    self.entries[num] = ("objstm", fields[1], fields[2])
+                else:
+                    self.entries[num] = None
+        return stream.dict
+
+    def _rebuild(self):
+        """Scans every object header when the xref data cannot be used; later definitions win."""
+        f = self.f
+        f.seek(0, 2)
+        size = f.tell()
+        overlap = 64 * 1024
+        containers = []
+        pos = 0
+        while pos < size:
+            f.seek(max(0, pos - overlap))
+            start = f.tell()
+            window = f.read(self.chunk_size + 2 * overlap)
+            lo, hi = pos - start, min(len(window), pos - start + self.chunk_size)
+            for m in OBJ_HEADER_RE.finditer(window, lo):
+                if m.start() >= hi:
+                    break
+                num = int(m.group(1))
+                self.entries[num] = ("offset", start + m.start())
+                try:
+                    value, _ = parse_object(window, m.end())
+                except ValueError:
+                    continue
+                if isinstance(value, dict) and value.get("/Type") == "/ObjStm":
+                    containers.append(num)
+                elif isinstance(value, dict) and value.get("/Type") == "/XRef" and not self.trailer:
+                    self.trailer = value
+            t = window.rfind(b"trailer", lo, hi)
+            if t >= 0:
+                try:
+                    self.trailer, _ = parse_object(window, t + len(b"trailer"))
+                except ValueError:
+                    pass
+            pos += self.chunk_size
+        for container in containers:
+            try:
+                _data, offsets = self._objstm_members(container)
+            except (ValueError, TypeError, zlib.error):
+                continue
+            for idx, num in enumerate(offsets):
+                self.entries.setdefault(num, ("objstm", container, idx))
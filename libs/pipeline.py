@@ -0,0 +1,198 @@
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from libs.inspector import (DEFAULT_OPTIONS, DEFERRED, FORMAT_FILETYPES, WORKER_DIED, inspect_file, sniff_format,
+                            unsupported_result)
+from libs.shared import content_hash, process_pool_context
+
+DEFAULT_READERS = 8
+PREFETCH_CHUNK = 1024 * 1024
+# Read-ahead per file when no digest is wanted. The parser reads the file
+# again, from the page cache if it is still there, so reading ahead costs
+# a second pass over whatever the cache has dropped by then; the cap
+# bounds that and the cache pressure of N readers on big files.
+PREFETCH_MAX_BYTES = 64 * 1024 * 1024
+
+# End-of-stream marker passed down the pipeline queues
+_DONE = object()
+
+def prefetch(path, digest=False, fmt=None):
+    """
+    Sniffs the format of `path` (unless given as `fmt`) and, when it is
+    supported, reads it ahead so the parser finds it in the page cache
+    instead of waiting on the share again. Returns (format, content digest)
+    with the digest taken during that read when `digest` is set (else
+    None); format is None when unsupported. A digest needs the whole file;
+    otherwise only the first PREFETCH_MAX_BYTES and the last chunk (where
+    PDF cross-reference tables and ZIP directories live) are read.
+    """
+    if fmt is None:
+        fmt = sniff_format(path)
+    if fmt not in FORMAT_FILETYPES:
+        return None, None
+    h = content_hash() if digest else None
+    buf = bytearray(PREFETCH_CHUNK)
+    view = memoryview(buf)
+    with open(path, "rb", buffering=0) as f:
+        left = None if digest else PREFETCH_MAX_BYTES
+        while n := f.readinto(buf):
+            if h is not None:
+                h.update(view[:n])
+            elif (left := left - n) <= 0:
+                tail = max(f.tell(), os.fstat(f.fileno()).st_size - PREFETCH_CHUNK)
+                f.seek(tail)
+                f.readinto(buf)
+                break
+    return fmt, h.hexdigest() if h is not None else None
+
+def _stat(path):
+    from libs.cache import stat_key
+    try:
+        return stat_key(path)
+    except OSError:
+        return None
+
+def _parse_pool(workers):
+    if workers <= 1:
+        return ThreadPoolExecutor(max_workers=1, thread_name_prefix="parse")
+    # Started while the prefetch threads run
+    return ProcessPoolExecutor(max_workers=workers, mp_context=process_pool_context())
+
+async def _pipeline(items, options, workers, queue_size, digest=False, readers=DEFAULT_READERS,
+                    lookup=None, after_read=None):
+    """
+    Async version of inspector._inspect_all() over (path, explicit, ready,
+    fmt) items: feed -> `readers` prefetching threads -> parsers -> results.
+    With `digest`, successful results carry the content digest taken while
+    the file was read ahead.
+
+    run_batch() hooks, called on the event loop thread so they may share
+    state with its consumer: `lookup(path, stat)` gets a stat_key() taken
+    by a reader thread before the file is read, and returns a ready result
+    (a cache hit) or None. `after_read(path, explicit, digest)` gets the
+    digest of a supported file once it is read ahead, and returns None to
+    parse it, a ready result, or DEFERRED to drop it.
+    Parsing runs in a process pool of `workers` (a single thread when
+    workers <= 1). The queues between the stages hold at most
+    `queue_size` (default 2 * workers) files, so fast readers wait for
+    the parsers instead of piling up work. Items are pulled on the event
+    loop thread.
+    """
+    loop = asyncio.get_running_loop()
+    workers = max(1, workers)
+    queue_size = queue_size or 2 * workers
+    to_read = asyncio.Queue(readers)
+    to_parse = asyncio.Queue(queue_size)
+    results = asyncio.Queue(queue_size)
+    io_pool = ThreadPoolExecutor(max_workers=readers, thread_name_prefix="prefetch")
+    parse_pools = [_parse_pool(workers)]
+    failure = []
+
+    async def feed():
+        for path, explicit, ready, fmt in items:
+            if ready is None:
+                await to_read.put((path, explicit, fmt))
+            elif ready is not DEFERRED:
+                await results.put((ready, explicit))
+        for _ in range(readers):
+            await to_read.put(_DONE)
+
+    async def read():
+        while (job := await to_read.get()) is not _DONE:
+            path, explicit, fmt = job
+            try:
+                if lookup is not None:
+                    ready = lookup(path, await loop.run_in_executor(io_pool, _stat, path))
+                    if ready is not None:
+                        await results.put((ready, explicit))
+                        continue
+                fmt, data_digest = await loop.run_in_executor(
+                    io_pool, prefetch, path, digest or after_read is not None, fmt)
+            except Exception as e:
+                result = {"path": path, "filetype": None, "info": None, "error": f"{type(e).__name__}: {e}"}
+                await results.put((result, explicit))
+                continue
+            if fmt is None:
+                await results.put((unsupported_result(path), explicit))
+                continue
+            if after_read is not None:
+                ready = after_read(path, explicit, data_digest)
+                if ready is DEFERRED:
+                    continue
+                if ready is not None:
+                    await results.put((ready, explicit))
+                    continue
+            await to_parse.put((path, explicit, fmt, data_digest))
+
+    async def parse():
+        while (job := await to_parse.get()) is not _DONE:
+            path, explicit, fmt, data_digest = job
+            pool = parse_pools[0]
+            try:
+                result = await loop.run_in_executor(pool, inspect_file, path, options, False, fmt)
+            except BrokenProcessPool:
+                result = {"path": path, "filetype": None, "info": None, "error": WORKER_DIED}
+                if parse_pools[0] is pool:
+                    parse_pools[0] = _parse_pool(workers)
+                    pool.shutdown(wait=False, cancel_futures=True)
+            if digest and result["error"] is None:
+                result["digest"] = data_digest
+            await results.put((result, explicit))
+
+    async def run():
+        reader_tasks = [asyncio.ensure_future(read()) for _ in range(readers)]
+        tasks = reader_tasks + [asyncio.ensure_future(parse()) for _ in range(workers)]
+        try:
+            await feed()
+            await asyncio.gather(*reader_tasks)
+            for _ in range(workers):
+                await to_parse.put(_DONE)
+            await asyncio.gather(*tasks)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            failure.append(e)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        await results.put(_DONE)
+
+    runner = asyncio.ensure_future(run())
+    try:
+        while (item := await results.get()) is not _DONE:
+            yield item
+        if failure:
+            raise failure[0]
+    finally:
+        runner.cancel()
+        await asyncio.gather(runner, return_exceptions=True)
+        io_pool.shutdown(wait=False, cancel_futures=True)
+        parse_pools[0].shutdown(wait=False, cancel_futures=True)
+
+async def inspect_async(inputs, options=DEFAULT_OPTIONS, workers=1, readers=DEFAULT_READERS, queue_size=None):
+    """
+    Asynchronously inspects every (path, explicit) input, yielding
+    (result, explicit) in completion order: up to `readers` files are
+    opened and read ahead concurrently while `workers` processes parse.
+    Results are those of inspector.inspect_file().
+    """
+    items = ((path, explicit, None, None) for path, explicit in inputs)
+    async for item in _pipeline(items, options, workers, queue_size, readers=readers):
+        yield item
+
+def iter_pipeline(items, options, workers, queue_size, digest=False, readers=DEFAULT_READERS,
+                  lookup=None, after_read=None):
+    """_pipeline() driven from synchronous code, on an event loop of its own."""
+    loop = asyncio.new_event_loop()
+    results = _pipeline(items, options, workers, queue_size, digest, readers, lookup, after_read)
+    try:
+        while True:
+            try:
+                yield loop.run_until_complete(results.__anext__())
+            except StopAsyncIteration:
+                return
+    finally:
+        loop.run_until_complete(results.aclose())
+        loop.close()
@@ -1,186 +1,194 @@
-import os
-from pptx import Presentation
+import xml.etree.ElementTree as ET
+from libs import profile
+from libs.ooxml import R_ID, core_metadata_rows, map_parts, open_package
 
-def is_pptx_file(filename):
-    # True if file is .pptx and starts with PK (zip signature)
-    return filename.lower().endswith('.pptx') and _has_zip_sig(filename)
-
-def _has_zip_sig(filename):
-    try:
-        with open(filename, "rb") as f:
-            return f.read(2) == b"PK"
-    except Exception:
-        return False
+P_NS = "{http://schemas.openxmlformats.org/presentationml/2006/main}"
+A_NS = "{http://schemas.openxmlformats.org/drawingml/2006/main}"
+PRESENTATION_PART = "ppt/presentation.xml"
 
+@profile.profiled("pptx.extract_pptx_metadata")
 def extract_pptx_metadata(pptx_file):
-    prs = Presentation(pptx_file)
-    core = prs.core_properties
-    meta = [
-        ["title", core.title or ""],
-        ["subject", core.subject or ""],
-        ["creator", core.author or ""],
-        ["keywords", core.keywords or ""],
-        ["description", core.comments or ""],
-        ["last_modified_by", core.last_modified_by or ""],
-        ["revision", core.revision or ""],
-        ["created", str(core.created) if core.created else ""],
-        ["modified", str(core.modified) if core.modified else ""],
-        ["category", core.category or ""],
-        ["content_status", core.content_status or ""],
-        ["identifier", core.identifier or ""],
-        ["language", core.language or ""],
-        ["version", core.version or ""]
-    ]
-    # Custom properties (if any)
-    if hasattr(prs, 'custom_properties'):
-        for key in prs.custom_properties:
-            meta.append([f"custom_{key}", str(prs.custom_properties[key])])
-    # Optionally extract the template property (from app.xml)
-    template = get_pptx_template_name(pptx_file)
-    if template:
-        meta.append(["template", template])
-    # Optionally extract theme names
-    theme_names = get_pptx_theme_names(pptx_file)
-    if theme_names:
-        meta.append(["themes", ", ".join(theme_names)])
+    with open_package(pptx_file) as pkg:
+        meta = core_metadata_rows(pkg)
+        # Optionally extract the template property (from app.xml)
+        template = get_pptx_template_name(pkg)
+        if template:
+            meta.append(["template", template])
+        # Optionally extract theme names
+        theme_names = get_pptx_theme_names(pkg)
+        if theme_names:
+            meta.append(["themes", ", ".join(theme_names)])
     return meta
 
-def get_pptx_basic_info(pptx_file):
+@profile.profiled("pptx.get_pptx_basic_info")
+def get_pptx_basic_info(pptx_file, jobs=1):
+    """With jobs > 1, slides are scanned by that many worker processes."""
     from libs.shared import human_readable_size
-    file_size = os.path.getsize(pptx_file)
-    prs = Presentation(pptx_file)
-    meta = extract_pptx_metadata(pptx_file)
-    num_slides = len(prs.slides)
-    images = extract_pptx_images(pptx_file)
-    links = extract_pptx_links(prs)
-    comments = extract_pptx_comments(pptx_file)
-
-    slides_with_notes = []
-    notes_texts = {}
-    for i, slide in enumerate(prs.slides):
-        if slide.has_notes_slide and slide.notes_slide.notes_text_frame.text.strip():
-            slides_with_notes.append(i + 1)  # 1-based
-            notes_texts[i + 1] = slide.notes_slide.notes_text_frame.text.strip()
-    num_slides_with_notes = len(slides_with_notes)
-
-    # Custom XML
-    custom_xml_parts = extract_custom_xml_parts(pptx_file)
-    has_macros = has_vba_macros(pptx_file)
+    with open_package(pptx_file) as pkg:
+        meta = extract_pptx_metadata(pkg)
+        images = extract_pptx_images(pkg)
+        slides = scan_slides(pkg, jobs)
+        comments = extract_pptx_comments(pkg)
+
+        slides_with_notes = []
+        notes_texts = {}
+        for i, slide in enumerate(slides):
+            if slide["notes"]:
+                slides_with_notes.append(i + 1)  # 1-based
+                notes_texts[i + 1] = slide["notes"]
+        num_slides_with_notes = len(slides_with_notes)
+
+        # Custom XML
+        custom_xml_parts = extract_custom_xml_parts(pkg)
+        has_macros = has_vba_macros(pkg)
 
     return {
-        "file_size_bytes": file_size,
-        "file_size_human": human_readable_size(file_size),
-        "num_slides": num_slides,
+        "file_size_bytes": pkg.size,
+        "file_size_human": human_readable_size(pkg.size),
+        "num_slides": len(slides),
         "num_slides_with_notes": num_slides_with_notes,
         "slides_with_notes": slides_with_notes,
         "notes_texts": notes_texts,
         "meta": meta,
         "images": images,
-        "links": links,
+        "links": sorted({link for slide in slides for link in slide["links"]}),
         "comments": comments,
         "custom_xml_parts": custom_xml_parts,
         "has_vba_macros": has_macros,
     }
 
+def slide_parts(pptx_file):
+    """Slide part names in presentation order."""
+    with open_package(pptx_file) as pkg:
+        return _related_via_list(pkg, PRESENTATION_PART, "sldIdLst", "sldId")
+
+def _notes_text(pkg, notes_part):
+    # Text of the notes body placeholder, one line per paragraph
+    profile.count("xml_parses")
+    root = ET.fromstring(pkg.read(notes_part))
+    for sp in root.iter(P_NS + "sp"):
+        ph = sp.find(f"{P_NS}nvSpPr/{P_NS}nvPr/{P_NS}ph")
+        if ph is not None and ph.get("type") == "body":
+            return "\n".join("".join(t.text or "" for t in para.iter(A_NS + "t"))
+                             for para in sp.iter(A_NS + "p"))
+    return ""
+
+def scan_slide(pkg, slide_part):
+    """
+    One pass over a slide part. Returns {"links", "notes"}: the external
+    targets of its text hyperlinks and shape click actions (group members
+    included), and its stripped notes text ("" when it has none).
+    """
+    rels = pkg.relationships(slide_part)
+    links = []
+    for event, elem, depth in pkg.iterparse(slide_part):
+        if event == "start" and elem.tag == A_NS + "hlinkClick":
+            rel = rels.get(elem.get(R_ID))
+            if rel and rel[2] and rel[1]:
+                links.append(rel[1])
+    notes = ""
+    for notes_part in pkg.related_parts(slide_part, "notesSlide"):
+        try:
+            notes = _notes_text(pkg, notes_part).strip()
+        except ET.ParseError:
+            pass
+    return {"links": links, "notes": notes}
+
+@profile.profiled("pptx.scan_slides")
+def scan_slides(pptx_file, jobs=1):
+    """scan_slide() for every slide, in presentation order, over `jobs` worker processes."""
+    with open_package(pptx_file) as pkg:
+        return map_parts(pkg, _scan_slide_part, slide_parts(pkg), jobs)
+
+def _scan_slide_part(pkg, slide_part):
+    try:
+        return scan_slide(pkg, slide_part)
+    except ET.ParseError:
+        return {"links": [], "notes": ""}
 
 def extract_pptx_images(pptx_file):
     # Extract image names from the pptx zip (ppt/media/*)
-    from zipfile import ZipFile
-    img_names = []
-    with ZipFile(pptx_file) as pptx_zip:
-        img_names = [name for name in pptx_zip.namelist() if name.startswith('ppt/media/')]
-    return img_names
-
-def extract_pptx_links(prs):
-    # Extract hyperlinks from shapes, skip group shapes
-    links = set()
-    from pptx.shapes.group import GroupShape
-    for slide in prs.slides:
-        for shape in slide.shapes:
-            if shape.has_text_frame:
-                for paragraph in shape.text_frame.paragraphs:
-                    for run in paragraph.runs:
-                        if run.hyperlink.address:
-                            links.add(run.hyperlink.address)
-            # Only try click_action on non-group shapes
-            if not isinstance(shape, GroupShape):
-                try:
-                    if hasattr(shape, "click_action") and shape.click_action.hyperlink.address:
-                        links.add(shape.click_action.hyperlink.address)
-                except Exception:
-                    pass
-    return sorted(links)
+    with open_package(pptx_file) as pkg:
+        return list(pkg.iter_names('ppt/media/'))
+
+def extract_pptx_links(pptx_file):
+    # Hyperlinks from text runs and shape click actions on every slide
+    return sorted({link for slide in scan_slides(pptx_file) for link in slide["links"]})
 
+@profile.profiled("pptx.extract_pptx_comments")
 def extract_pptx_comments(pptx_file):
     # Parse comments from ppt/comments*.xml
-    from zipfile import ZipFile
     import xml.etree.ElementTree as ET
     comments = []
-    with ZipFile(pptx_file) as pptx_zip:
-        for name in pptx_zip.namelist():
-            if name.startswith('ppt/comments') and name.endswith('.xml'):
-                with pptx_zip.open(name) as f:
-                    xml = f.read()
-                    root = ET.fromstring(xml)
-                    for comment in root.iter('{http://schemas.openxmlformats.org/presentationml/2006/main}cm'):
-                        author = comment.attrib.get('authorId', '')
-                        date = comment.attrib.get('dt', '')
-                        text = ''.join(child.text or '' for child in comment.iter('{http://schemas.openxmlformats.org/presentationml/2006/main}t'))
-                        comments.append({'author': author, 'date': date, 'text': text})
+    with open_package(pptx_file) as pkg:
+        for name in pkg.iter_names('ppt/comments', '.xml'):
+            profile.count("xml_parses")
+            root = ET.fromstring(pkg.read(name))
+            for comment in root.iter('{http://schemas.openxmlformats.org/presentationml/2006/main}cm'):
+                author = comment.attrib.get('authorId', '')
+                date = comment.attrib.get('dt', '')
+                text = ''.join(child.text or '' for child in comment.iter('{http://schemas.openxmlformats.org/presentationml/2006/main}t'))
+                comments.append({'author': author, 'date': date, 'text': text})
     return comments
 
 def get_pptx_template_name(pptx_file):
     # Try to extract template property from docProps/app.xml
-    from zipfile import ZipFile
-    import xml.etree.ElementTree as ET
     try:
-        with ZipFile(pptx_file) as pptx_zip:
-            with pptx_zip.open("docProps/app.xml") as f:
-                tree = ET.parse(f)
-                root = tree.getroot()
-                ns = {'ap': 'http://schemas.openxmlformats.org/officeDocument/2006/extended-properties'}
-                template_elem = root.find('ap:Template', ns)
-                if template_elem is not None:
-                    return template_elem.text
+        with open_package(pptx_file) as pkg:
+            return pkg.app_property("Template") or ""
     except Exception:
         pass
     return ""
 
+def _related_via_list(pkg, part_name, list_tag, item_tag):
+    # Parts listed by r:id in <list_tag> of part_name (e.g. sldMasterIdLst), in order
+    root = pkg.xml(part_name)
+    if root is None:
+        return []
+    rels = pkg.relationships(part_name)
+    parts = []
+    for lst in root.iter(P_NS + list_tag):
+        for item in lst.iter(P_NS + item_tag):
+            rel = rels.get(item.get(R_ID))
+            if rel and not rel[2] and pkg.has(rel[1]):
+                parts.append(rel[1])
+    return parts
+
 def get_pptx_theme_names(pptx_file):
-    # Returns a list of theme names (may be generic, e.g., 'Office Theme')
-    from pptx import Presentation
-    prs = Presentation(pptx_file)
+    # Returns a list of theme names (may be generic, e.g., 'Office Theme'),
+    # one per slide master, read from the root of each master's theme part
     names = []
-    for slide_master in prs.slide_masters:
-        try:
-            names.append(slide_master.theme.name)
-        except Exception:
-            pass
+    with open_package(pptx_file) as pkg:
+        for master in _related_via_list(pkg, PRESENTATION_PART, "sldMasterIdLst", "sldMasterId"):
+            for theme in pkg.related_parts(master, "theme"):
+                try:
+                    for event, elem, depth in pkg.iterparse(theme):
+                        if elem.get("name"):
+                            names.append(elem.get("name"))
+                        break
+                except ET.ParseError:
+                    pass
     return names
 
-
+@profile.profiled("pptx.extract_custom_xml_parts")
 def extract_custom_xml_parts(pptx_file):
     """
     Returns a list of custom XML part filenames and (optionally) their contents.
     """
-    from zipfile import ZipFile
     xml_parts = []
-    with ZipFile(pptx_file) as pptx_zip:
-        for name in pptx_zip.namelist():
-            if name.startswith("customXml/") and name.endswith(".xml"):
-                # You can just list the name, or extract the content:
-                try:
-                    with pptx_zip.open(name) as f:
-                        content = f.read().decode("utf-8", errors="replace")
-                    xml_parts.append({"filename": name, "content": content})
-                except Exception:
-                    xml_parts.append({"filename": name, "content": "(unreadable)"})
+    with open_package(pptx_file) as pkg:
+        for name in pkg.iter_names("customXml/", ".xml"):
+            # You can just list the name, or extract the content:
+            try:
+                content = pkg.read(name).decode("utf-8", errors="replace")
+                xml_parts.append({"filename": name, "content": content})
+            except Exception:
+                xml_parts.append({"filename": name, "content": "(unreadable)"})
     return xml_parts
 
 def has_vba_macros(pptx_file):
     """
     Returns True if ppt/vbaProject.bin is present, indicating VBA macros.
     """
-    from zipfile import ZipFile
-    with ZipFile(pptx_file) as pptx_zip:
-        return "ppt/vbaProject.bin" in pptx_zip.namelist()
+    with open_package(pptx_file) as pkg:
+        return pkg.has("ppt/vbaProject.bin")
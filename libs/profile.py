@@ -0,0 +1,217 @@
+import functools
+import io
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+# I/O counters every span carries, bumped by count() at the places that do
+# the work: file reads under open_file(), ZIP central directory reads, and
+# XML part parses (tree or streaming).
+COUNTERS = ("bytes_read", "zip_opens", "xml_parses")
+
+class _State(threading.local):
+    # The Recording of the inspection running in this thread, if any. Other
+    # threads (e.g. --prefetch readers sniffing the next files) never count
+    # towards it. With no recording (the usual case) every hook below costs
+    # an attribute lookup and a comparison.
+    recording = None
+
+_state = _State()
+_NO_SPAN = nullcontext()
+
+class _Frame:
+    __slots__ = ("path", "wall", "cpu", "counts", "mem_start", "mem_peak")
+
+class Recording:
+    """
+    Spans recorded while inspecting one file, totalled per call path (the
+    span's name under the names of the spans open around it) in the order
+    they first ran. Times and counters are inclusive of nested spans. CPU
+    time is the recording thread's own, so other threads (--prefetch
+    readers, daemon request threads) and worker processes do not count.
+    With `memory`, allocations are traced (tracemalloc, which slows Python
+    code down noticeably) and each span reports the peak it reached above
+    what was allocated when it started. Allocation tracing is process-wide,
+    so peaks include what other threads allocate meanwhile.
+    """
+    def __init__(self, memory=False):
+        self.memory = memory
+        self.stack = []
+        self.spans = {}
+
+    def enter(self, name):
+        frame = _Frame()
+        frame.path = f"{self.stack[-1].path}/{name}" if self.stack else name
+        frame.counts = dict.fromkeys(COUNTERS, 0)
+        if self.memory:
+            import tracemalloc
+            current, peak = tracemalloc.get_traced_memory()
+            if self.stack:
+                self.stack[-1].mem_peak = max(self.stack[-1].mem_peak, peak)
+            tracemalloc.reset_peak()
+            frame.mem_start = frame.mem_peak = current
+        if frame.path not in self.spans:
+            self.spans[frame.path] = dict({"name": name, "path": frame.path, "depth": len(self.stack),
+                                           "calls": 0, "wall": 0.0, "cpu": 0.0},
+                                          **dict.fromkeys(COUNTERS, 0), peak_bytes=0 if self.memory else None)
+        self.stack.append(frame)
+        frame.wall = time.perf_counter()
+        frame.cpu = time.thread_time()
+
+    def exit(self):
+        cpu = time.thread_time()
+        wall = time.perf_counter()
+        frame = self.stack.pop()
+        span = self.spans[frame.path]
+        span["calls"] += 1
+        span["wall"] += wall - frame.wall
+        span["cpu"] += cpu - frame.cpu
+        for counter, n in frame.counts.items():
+            span[counter] += n
+        if self.memory:
+            import tracemalloc
+            peak = max(frame.mem_peak, tracemalloc.get_traced_memory()[1])
+            span["peak_bytes"] = max(span["peak_bytes"], peak - frame.mem_start)
+            if self.stack:
+                self.stack[-1].mem_peak = max(self.stack[-1].mem_peak, peak)
+
+    @contextmanager
+    def span(self, name):
+        self.enter(name)
+        try:
+            yield
+        finally:
+            self.exit()
+
+    def report(self):
+        """
+        {"wall", "cpu", <counters>, "peak_bytes", "spans": [...]}: the
+        totals of the outermost span, and every span as {"name", "path",
+        "depth", "calls", "wall", "cpu", <counters>, "peak_bytes"}, where
+        path is like "total/pdf.scan_pdf_urls/pdf.inflate_stream". Times are
+        seconds; peak_bytes is None without memory tracing.
+        """
+        spans = [dict(span, wall=round(span["wall"], 6), cpu=round(span["cpu"], 6))
+                 for span in self.spans.values()]
+        top = spans[0] if spans else {}
+        totals = {key: top.get(key) for key in ("wall", "cpu", *COUNTERS, "peak_bytes")}
+        return dict(totals, spans=spans)
+
+@contextmanager
+def recording(memory=False):
+    """
+    Records the spans run in this thread inside the block, under a root
+    span named "total", and yields the Recording. Work handed to --jobs
+    worker processes counts as the wall time of the span waiting for it.
+    """
+    started = False
+    if memory:
+        import tracemalloc
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            started = True
+    previous = _state.recording
+    rec = _state.recording = Recording(memory)
+    try:
+        with rec.span("total"):
+            yield rec
+    finally:
+        _state.recording = previous
+        if started:
+            tracemalloc.stop()
+
+def span(name):
+    """Context manager timing a block as span `name` while recording."""
+    rec = _state.recording
+    return _NO_SPAN if rec is None else rec.span(name)
+
+def profiled(name):
+    """Decorator recording each call of the function as span `name`."""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            rec = _state.recording
+            if rec is None:
+                return func(*args, **kwargs)
+            rec.enter(name)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                rec.exit()
+        return wrapper
+    return decorate
+
+def count(counter, n=1):
+    """Adds `n` to `counter` (one of COUNTERS) of every span open in this thread."""
+    rec = _state.recording
+    if rec is not None:
+        for frame in rec.stack:
+            frame.counts[counter] += n
+
+class _CountingFileIO(io.FileIO):
+    def readinto(self, b):
+        n = super().readinto(b)
+        if n:
+            count("bytes_read", n)
+        return n
+
+    def readall(self):
+        data = super().readall()
+        count("bytes_read", len(data))
+        return data
+
+def open_file(path):
+    """open(path, "rb"); while recording, the bytes read from it count as bytes_read."""
+    if _state.recording is None:
+        return open(path, "rb")
+    return io.BufferedReader(_CountingFileIO(path))
+
+def merge(total, report):
+    """
+    Adds one file's report() to `total` (start from {}) and returns it:
+    times and counters are summed, peaks are the largest seen, and
+    "files" counts the reports merged.
+    """
+    if not total:
+        total.update({"files": 0, "wall": 0.0, "cpu": 0.0}, **dict.fromkeys(COUNTERS, 0),
+                     peak_bytes=None, spans={})
+    total["files"] += 1
+    for key in ("wall", "cpu", *COUNTERS):
+        total[key] += report[key] or 0
+    total["peak_bytes"] = _max(total["peak_bytes"], report["peak_bytes"])
+    for span in report["spans"]:
+        into = total["spans"].setdefault(span["path"], dict(span, calls=0, wall=0.0, cpu=0.0,
+                                                            **dict.fromkeys(COUNTERS, 0)))
+        for key in ("calls", "wall", "cpu", *COUNTERS):
+            into[key] += span[key]
+        into["peak_bytes"] = _max(into["peak_bytes"], span["peak_bytes"])
+    return total
+
+def _max(a, b):
+    return b if a is None else a if b is None else max(a, b)
+
+PROFILE_HEADERS = ["Span", "Calls", "Wall ms", "CPU ms", "Read", "ZIP opens", "XML parses", "Peak alloc"]
+
+def profile_rows(report):
+    """Table rows for a report() or merge() total, nested spans indented."""
+    from libs.shared import human_readable_size
+    spans = report["spans"]
+    spans = list(spans.values()) if isinstance(spans, dict) else spans
+    # Each span under its parent: a span first seen in a later file is
+    # merged in after other files' spans
+    order = {span["path"]: i for i, span in enumerate(spans)}
+
+    def tree_order(span):
+        parts = span["path"].split("/")
+        return [order["/".join(parts[:i + 1])] for i in range(len(parts))]
+
+    rows = []
+    for span in sorted(spans, key=tree_order):
+        peak = span["peak_bytes"]
+        rows.append([
+            "  " * span["depth"] + span["name"], span["calls"],
+            f"{span['wall'] * 1000:.1f}", f"{span['cpu'] * 1000:.1f}",
+            human_readable_size(span["bytes_read"]), span["zip_opens"], span["xml_parses"],
+            human_readable_size(peak) if peak is not None else "-",
+        ])
+    return rows
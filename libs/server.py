@@ -0,0 +1,305 @@
+import errno
+import os
+import queue
+import signal
+import socket
+import socketserver
+import stat
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+from libs.inspector import DEFAULT_OPTIONS, WORKER_DIED, inspect_file
+from libs.output import result_record, to_json
+from libs.shared import process_pool_context
+
+DEFAULT_ADDRESS = "127.0.0.1:8765"
+DEFAULT_TIMEOUT = 30.0
+DEFAULT_MAX_UPLOAD = 256 * 1024 * 1024
+# Query parameters that turn on an InspectOptions flag
+OPTION_PARAMS = ("all_urls", "debug", "revisions")
+
+def _warm_worker():
+    # Import every extractor up front, so no request pays for it.
+    import libs.doc, libs.pdf, libs.ppt, libs.xlsx  # noqa: F401
+
+class Inspector:
+    """
+    The daemon's warm worker processes. At most `workers` inspections run
+    at once, one per worker; a request waits up to `timeout` seconds for a
+    free worker and as long again for its result. A request that times out
+    is answered at once and its worker is killed, so a document that hangs
+    its parser cannot hold a slot for good; the slot is free again once a
+    fresh worker has replaced it. A dead worker fails only the request it
+    was serving.
+    """
+    def __init__(self, workers=2, timeout=DEFAULT_TIMEOUT, options=DEFAULT_OPTIONS):
+        self.workers = max(1, workers)
+        self.timeout = timeout
+        self.options = options._replace(jobs=1)
+        self._lock = threading.Lock()
+        self._idle = queue.SimpleQueue()
+        self._all = set()
+        starting = [self._start_worker() for _ in range(self.workers)]
+        # Results unpickle into extractor types (PyPDF2 strings), so the
+        # daemon imports them too while the workers start.
+        _warm_worker()
+        for worker, warm in starting:
+            self._idle.put(self._wait_warm(worker, warm))
+        self.in_flight = 0
+
+    def _start_worker(self):
+        # A single-process pool per slot, so one hung inspection can be
+        # killed without touching the others. Its process only starts with
+        # a first task, hence the warm-up task. Workers are started from
+        # request threads.
+        worker = ProcessPoolExecutor(max_workers=1, mp_context=process_pool_context())
+        with self._lock:
+            self._all.add(worker)
+        return worker, worker.submit(_warm_worker)
+
+    @staticmethod
+    def _wait_warm(worker, warm):
+        try:
+            warm.result()
+        except BrokenProcessPool:
+            pass  # the first request finds it broken and replaces it
+        return worker
+
+    def _new_worker(self):
+        return self._wait_warm(*self._start_worker())
+
+    def inspect(self, path, flags=(), cleanup=None):
+        """
+        Returns (HTTP status, body dict) for inspecting `path` with the
+        option `flags` set; `cleanup` runs once the file is no longer used.
+        """
+        try:
+            worker = self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            if cleanup:
+                cleanup()
+            return 503, {"error": "busy"}
+        options = self.options._replace(**{flag: True for flag in flags})
+        with self._lock:
+            self.in_flight += 1
+        try:
+            future = worker.submit(inspect_file, path, options)
+        except BrokenProcessPool:
+            self._finished(worker, True, cleanup)
+            return 200, {"path": path, "filetype": None, "info": None, "error": WORKER_DIED}
+        future.add_done_callback(lambda f: self._finished(
+            worker, not f.cancelled() and isinstance(f.exception(), BrokenProcessPool), cleanup))
+        try:
+            return 200, future.result(timeout=self.timeout)
+        except FutureTimeout:
+            # The worker dies, the future fails with BrokenProcessPool, and
+            # _finished() puts a fresh worker in the slot
+            _kill(worker)
+            return 504, {"path": path, "error": f"inspection took longer than {self.timeout:g}s"}
+        except BrokenProcessPool:
+            return 200, {"path": path, "filetype": None, "info": None, "error": WORKER_DIED}
+
+    def _finished(self, worker, broken, cleanup):
+        if cleanup:
+            cleanup()
+        if broken:
+            worker.shutdown(wait=False, cancel_futures=True)
+            with self._lock:
+                self._all.discard(worker)
+            worker = self._new_worker()
+        with self._lock:
+            self.in_flight -= 1
+        self._idle.put(worker)
+
+    def close(self):
+        with self._lock:
+            workers = list(self._all)
+        for worker in workers:
+            _kill(worker)
+            worker.shutdown(wait=False, cancel_futures=True)
+
+def _kill(worker):
+    # ProcessPoolExecutor has no public way to stop a running task
+    for process in list((getattr(worker, "_processes", None) or {}).values()):
+        process.kill()
+
+class InspectHandler(BaseHTTPRequestHandler):
+    """
+    GET  /inspect?path=FILE        inspect a file the daemon can read
+    POST /inspect?name=FILENAME    inspect the uploaded request body (the
+                                   type is sniffed from the content)
+    GET  /health                   {"status": "ok", "in_flight": N}
+    Flags all_urls, debug and revisions are query parameters (=1).
+    """
+    server_version = "DocInspector"
+    protocol_version = "HTTP/1.1"
+
+    def address_string(self):
+        # Unix socket peers have no address
+        return self.client_address[0] if self.client_address else "unix"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _reply(self, status, body):
+        data = to_json(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _reply_result(self, status, body):
+        # Inspection results go out as libs.output schema records
+        if status == 200:
+            body = result_record(body, self.server.rules_path, self.server.domains_path)
+        self._reply(status, body)
+
+    def _query(self):
+        url = urlsplit(self.path)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        flags = [flag for flag in OPTION_PARAMS if query.get(flag, "0") not in ("", "0", "false")]
+        return url.path, query, flags
+
+    def do_GET(self):
+        route, query, flags = self._query()
+        if route == "/health":
+            return self._reply(200, {"status": "ok", "in_flight": self.server.inspector.in_flight})
+        if route != "/inspect":
+            return self._reply(404, {"error": "not found"})
+        path = query.get("path")
+        if not path:
+            return self._reply(400, {"error": "missing path"})
+        if not self.server.allowed(path):
+            return self._reply(403, {"error": "path outside the allowed roots"})
+        self._reply_result(*self.server.inspector.inspect(path, flags))
+
+    def do_POST(self):
+        route, query, flags = self._query()
+        if route != "/inspect":
+            return self._reply(404, {"error": "not found"})
+        try:
+            length = int(self.headers.get("Content-Length", ""))
+        except ValueError:
+            return self._reply(411, {"error": "Content-Length required"})
+        if length < 0:
+            self.close_connection = True
+            return self._reply(400, {"error": "invalid Content-Length"})
+        if length > self.server.max_upload:
+            self.close_connection = True
+            return self._reply(413, {"error": f"upload larger than {self.server.max_upload} bytes"})
+        suffix = os.path.splitext(os.path.basename(query.get("name", "")))[1]
+        fd, path = tempfile.mkstemp(prefix="docinspector-", suffix=suffix)
+        left = -1
+        try:
+            with os.fdopen(fd, "wb") as f:
+                left = length
+                while left:
+                    chunk = self.rfile.read(min(left, 1024 * 1024))
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                    left -= len(chunk)
+        except OSError:
+            left = -1
+        finally:
+            # Not fully written: no inspection will clean it up
+            if left:
+                os.unlink(path)
+        if left:
+            self.close_connection = True
+            return self._reply(400, {"error": "upload cut short"})
+        status, body = self.server.inspector.inspect(path, flags, cleanup=lambda: os.unlink(path))
+        if "path" in body:
+            body["path"] = query.get("name", "")
+        self._reply_result(status, body)
+
+class _DaemonMixin:
+    daemon_threads = True
+    verbose = False
+    roots = None
+    rules_path = None
+    domains_path = None
+
+    def allowed(self, path):
+        if not self.roots:
+            return True
+        real = os.path.realpath(path)
+        return any(real == root or real.startswith(root + os.sep) for root in self.roots)
+
+class InspectHTTPServer(_DaemonMixin, ThreadingHTTPServer):
+    pass
+
+class InspectUnixServer(_DaemonMixin, socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    pass
+
+def _remove_stale_socket(path):
+    """
+    Unlinks the socket file a daemon that did not shut down cleanly left at
+    `path`. Raises OSError when `path` is anything else: not a socket, or
+    a socket some process still listens on.
+    """
+    try:
+        mode = os.lstat(path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise OSError(errno.EEXIST, "exists and is not a socket", path)
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except ConnectionRefusedError:
+        os.unlink(path)
+        return
+    finally:
+        probe.close()
+    raise OSError(errno.EADDRINUSE, "another process is listening on it", path)
+
+def make_server(address, inspector, timeout=DEFAULT_TIMEOUT, max_upload=DEFAULT_MAX_UPLOAD, roots=None,
+                rules_path=None, domains_path=None, verbose=False):
+    """
+    Binds `address`: "unix:/path/to.sock" for a Unix domain socket
+    (replacing a stale socket file, see _remove_stale_socket), otherwise "host:port" or "port" on
+    TCP (127.0.0.1 unless a host is given).
+    """
+    # Connections idle (or trickling an upload) for `timeout` seconds are dropped
+    handler = type("InspectHandler", (InspectHandler,), {"timeout": timeout})
+    if address.startswith("unix:"):
+        sock_path = address[len("unix:"):]
+        _remove_stale_socket(sock_path)
+        server = InspectUnixServer(sock_path, handler)
+    else:
+        host, _, port = address.rpartition(":")
+        server = InspectHTTPServer((host or "127.0.0.1", int(port)), handler)
+    server.inspector = inspector
+    server.max_upload = max_upload
+    server.roots = [os.path.realpath(root) for root in roots or ()]
+    server.rules_path = rules_path
+    server.domains_path = domains_path
+    server.verbose = verbose
+    return server
+
+def _terminate(signum, frame):
+    raise KeyboardInterrupt
+
+def serve(address=DEFAULT_ADDRESS, workers=2, timeout=DEFAULT_TIMEOUT, options=DEFAULT_OPTIONS, **kwargs):
+    """Runs the inspection daemon on `address` until interrupted (Ctrl-C or SIGTERM)."""
+    inspector = Inspector(workers, timeout, options)
+    server = make_server(address, inspector, timeout, **kwargs)
+    signal.signal(signal.SIGTERM, _terminate)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        inspector.close()
+        if isinstance(server, InspectUnixServer):
+            try:
+                os.unlink(server.server_address)
+            except OSError:
+                pass
@@ -6,3 +6,27 @@ def human_readable_size(size_bytes):
     p = 1 << (i * 10)
     s = round(size_bytes / p, 2)
     return f"{s} {size_name[i]}"
+
+def content_hash():
+    """A fresh hash object of the kind file_digest() uses (BLAKE2b, 160 bits)."""
+    import hashlib
+    return hashlib.blake2b(digest_size=20)
+
+def file_digest(path, chunk_size=1024 * 1024):
+    """BLAKE2b hex digest of a file's content, read in chunks."""
+    h = content_hash()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def process_pool_context():
+    """
+    multiprocessing context for process pools started while other threads
+    run: forking then can copy a lock some thread holds and hang the
+    child, so workers come from a fork server where there is one.
+    """
+    import multiprocessing
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("forkserver")
+    return multiprocessing.get_context()
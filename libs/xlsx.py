@@ -1,32 +1,17 @@
 
-import os
-from zipfile import ZipFile
 import xml.etree.ElementTree as ET
-
-def is_xlsx_file(filename):
-    return filename.lower().endswith(".xlsx") and _has_zip_sig(filename)
-
-def _has_zip_sig(filename):
-    try:
-        with open(filename, "rb") as f:
-            return f.read(2) == b"PK"
-    except Exception:
-        return False
+from xml.parsers import expat
+from libs import profile
+from libs.ooxml import NS, R_ID, map_parts, open_package
 
 def _read_core_properties(xlsx_path):
     core = {}
     try:
-        with ZipFile(xlsx_path) as zf:
-            if "docProps/core.xml" in zf.namelist():
-                xml = zf.read("docProps/core.xml")
-                root = ET.fromstring(xml)
-                ns = {
-                    "cp": "http://schemas.openxmlformats.org/package/2006/metadata/core-properties",
-                    "dc": "http://purl.org/dc/elements/1.1/",
-                    "dcterms": "http://purl.org/dc/terms/",
-                }
+        with open_package(xlsx_path) as pkg:
+            root = pkg.xml("docProps/core.xml")
+            if root is not None:
                 def g(tag):
-                    el = root.find(tag, ns)
+                    el = root.find(tag, NS)
                     return el.text if el is not None else ""
                 core = {
                     "title": g("dc:title"),
@@ -46,14 +31,10 @@ def _read_core_properties(xlsx_path):
 def _read_app_properties(xlsx_path):
     app = {}
     try:
-        with ZipFile(xlsx_path) as zf:
-            if "docProps/app.xml" in zf.namelist():
-                xml = zf.read("docProps/app.xml")
-                root = ET.fromstring(xml)
-                ns = {"ap":"http://schemas.openxmlformats.org/officeDocument/2006/extended-properties"}
+        with open_package(xlsx_path) as pkg:
+            if pkg.has("docProps/app.xml"):
                 def g(tag):
-                    el = root.find(tag, ns)
-                    return el.text if el is not None else ""
+                    return pkg.app_property(tag[len("ap:"):]) or ""
                 app = {
                     "application": g("ap:Application"),
                     "appVersion": g("ap:AppVersion"),
@@ -65,65 +46,124 @@ def _read_app_properties(xlsx_path):
         pass
     return app
 
-def _sheet_names_and_hyperlinks(xlsx_path):
+SML_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+WORKBOOK_PART = "xl/workbook.xml"
+
+def _workbook_sheets(pkg):
+    """[(sheet name, worksheet part or None)] in workbook order."""
+    root = pkg.xml(WORKBOOK_PART)
+    if root is None:
+        return []
+    rels = pkg.relationships(WORKBOOK_PART)
+    sheets = []
+    for sh in root.iter(SML_NS + "sheet"):
+        rel = rels.get(sh.get(R_ID))
+        part = rel[1] if rel and not rel[2] and pkg.has(rel[1]) else None
+        sheets.append((sh.get("name", ""), part))
+    return sheets
+
+WORKSHEET_READ_SIZE = 1024 * 1024
+
+class _StopScan(Exception):
+    pass
+
+def scan_worksheet(pkg, part_name):
     """
-    Returns (sheet_names, hyperlinks) where:
-      - sheet_names is a list of sheet names.
-      - hyperlinks is a set of hyperlink targets found across sheets.
-    Uses minimal parsing of xl/workbook.xml and xl/worksheets/*.xml
+    Streams one worksheet part and returns {"dimension", "rows", "cells",
+    "links"}. Only start tags are handled and no element tree is built, so
+    memory stays flat whatever the size of <sheetData>; reading stops once
+    the <hyperlinks> section (which follows it) has ended. Hyperlinks with
+    an r:id are resolved to their external target through the sheet's
+    relationships; in-workbook links keep their location.
     """
-    sheet_names = []
-    hyperlinks = set()
+    ns = SML_NS[1:]
+    dimension, row, cell = ns + "dimension", ns + "row", ns + "c"
+    hyperlinks, hyperlink = ns + "hyperlinks", ns + "hyperlink"
+    rid = R_ID[1:]
+    result = {"dimension": "", "rows": 0, "cells": 0, "links": []}
+    counts = [0, 0]
+    parser = expat.ParserCreate(namespace_separator="}")
+
+    def end(tag):
+        if tag == hyperlinks:
+            raise _StopScan()
+
+    def start(tag, attrs):
+        if tag == cell:
+            counts[1] += 1
+        elif tag == row:
+            counts[0] += 1
+        elif tag == hyperlink:
+            rel = pkg.relationships(part_name).get(attrs.get(rid))
+            href = rel[1] if rel and rel[2] else attrs.get("location")
+            if href:
+                result["links"].append(href)
+        elif tag == hyperlinks:
+            parser.EndElementHandler = end
+        elif tag == dimension:
+            result["dimension"] = attrs.get("ref", "")
+
+    parser.StartElementHandler = start
+    profile.count("xml_parses")
     try:
-        with ZipFile(xlsx_path) as zf:
-            # Sheet names from xl/workbook.xml
-            if "xl/workbook.xml" in zf.namelist():
-                wb_xml = zf.read("xl/workbook.xml")
-                root = ET.fromstring(wb_xml)
-                ns = {"r":"http://schemas.openxmlformats.org/officeDocument/2006/relationships"}
-                for sh in root.findall(".//{http://schemas.openxmlformats.org/spreadsheetml/2006/main}sheet"):
-                    nm = sh.get("name", "")
-                    if nm:
-                        sheet_names.append(nm)
-
-            # Hyperlinks (look across all worksheets)
-            for name in zf.namelist():
-                if name.startswith("xl/worksheets/") and name.endswith(".xml"):
-                    xml = zf.read(name)
-                    try:
-                        r = ET.fromstring(xml)
-                        for h in r.findall(".//{http://schemas.openxmlformats.org/spreadsheetml/2006/main}hyperlink"):
-                            tgt = h.get("display") or h.get("ref") or h.get("{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id")
-                            # relationships may hold external targets, but extracting those requires following rels;
-                            # we'll also capture explicit 'location' or 'tooltip' if present
-                            href = h.get("location") or h.get("tooltip") or tgt
-                            if href:
-                                hyperlinks.add(href)
-                    except Exception:
-                        continue
-    except Exception:
+        with pkg.open(part_name) as f:
+            while True:
+                chunk = f.read(WORKSHEET_READ_SIZE)
+                parser.Parse(chunk, not chunk)
+                if not chunk:
+                    break
+    except _StopScan:
         pass
-    return sheet_names, sorted(hyperlinks)
+    except expat.ExpatError as e:
+        raise ET.ParseError(str(e))
+    result["rows"], result["cells"] = counts
+    return result
+
+def _scan_sheet_part(pkg, part_name):
+    try:
+        return scan_worksheet(pkg, part_name)
+    except ET.ParseError:
+        return {}
+
+@profile.profiled("xlsx.scan_worksheets")
+def scan_worksheets(xlsx_path, jobs=1):
+    """
+    Returns [{"name", "part", "dimension", "rows", "cells", "links"}] for
+    every sheet in the workbook, plus any worksheet part it does not list.
+    With jobs > 1, sheets are scanned by that many worker processes.
+    """
+    sheets = []
+    with open_package(xlsx_path) as pkg:
+        listed = _workbook_sheets(pkg)
+        parts = {part for _, part in listed}
+        listed += [(None, name) for name in pkg.iter_names("xl/worksheets/", ".xml") if name not in parts]
+        scans = iter(map_parts(pkg, _scan_sheet_part, [part for _, part in listed if part is not None], jobs))
+        for name, part in listed:
+            entry = {"name": name, "part": part, "dimension": "", "rows": 0, "cells": 0, "links": []}
+            if part is not None:
+                entry.update(next(scans))
+            sheets.append(entry)
+    return sheets
 
 def _images_list(xlsx_path):
     imgs = []
     try:
-        with ZipFile(xlsx_path) as zf:
-            for name in zf.namelist():
-                if name.startswith("xl/media/"):
-                    imgs.append(name)
+        with open_package(xlsx_path) as pkg:
+            imgs = list(pkg.iter_names("xl/media/"))
     except Exception:
         pass
     return imgs
 
+@profile.profiled("xlsx.comments")
 def _comments(xlsx_path):
     comments = []
     try:
-        with ZipFile(xlsx_path) as zf:
+        with open_package(xlsx_path) as pkg:
             # Comments can be in xl/comments*.xml (legacy) or threadedComments
-            for name in zf.namelist():
+            for name in pkg.names:
                 if name.startswith("xl/comments") and name.endswith(".xml"):
-                    xml = zf.read(name)
+                    profile.count("xml_parses")
+                    xml = pkg.read(name)
                     root = ET.fromstring(xml)
                     # legacy comments: commentList/comment with attributes authorId, ref
                     for cm in root.findall(".//{http://schemas.openxmlformats.org/spreadsheetml/2006/main}comment"):
@@ -137,7 +177,8 @@ def _comments(xlsx_path):
                         comments.append({"author": author, "location": ref, "text": text})
 
                 if name.startswith("xl/threadedComments") and name.endswith(".xml"):
-                    xml = zf.read(name)
+                    profile.count("xml_parses")
+                    xml = pkg.read(name)
                     root = ET.fromstring(xml)
                     for tc in root.findall(".//{http://schemas.microsoft.com/office/spreadsheetml/2018/threadedcomments}threadedComment"):
                         text = (tc.get("text") or "").strip()
@@ -150,22 +191,29 @@ def _comments(xlsx_path):
 
 def has_vba_macros(xlsx_path):
     try:
-        with ZipFile(xlsx_path) as zf:
-            return "xl/vbaProject.bin" in zf.namelist()
+        with open_package(xlsx_path) as pkg:
+            return pkg.has("xl/vbaProject.bin")
     except Exception:
         return False
 
 
 from libs.shared import human_readable_size
 
-def get_xlsx_basic_info(xlsx_file):
-    file_size = os.path.getsize(xlsx_file)
-    core = _read_core_properties(xlsx_file)
-    app = _read_app_properties(xlsx_file)
-    sheet_names, links = _sheet_names_and_hyperlinks(xlsx_file)
-    images = _images_list(xlsx_file)
-    comments = _comments(xlsx_file)
-    has_macros = has_vba_macros(xlsx_file)
+@profile.profiled("xlsx.get_xlsx_basic_info")
+def get_xlsx_basic_info(xlsx_file, jobs=1):
+    with open_package(xlsx_file) as pkg:
+        file_size = pkg.size
+        core = _read_core_properties(pkg)
+        app = _read_app_properties(pkg)
+        try:
+            sheets = scan_worksheets(pkg, jobs)
+        except Exception:
+            sheets = []
+        sheet_names = [sh["name"] for sh in sheets if sh["name"]]
+        links = sorted({href for sh in sheets for href in sh["links"]})
+        images = _images_list(pkg)
+        comments = _comments(pkg)
+        has_macros = has_vba_macros(pkg)
 
     meta_pairs = []
     for k, v in core.items():
@@ -179,6 +227,7 @@ def get_xlsx_basic_info(xlsx_file):
         "meta": meta_pairs,
         "sheet_count": len(sheet_names),
         "sheet_names": sheet_names,
+        "sheets": sheets,
         "links": links,
         "images": images,
         "comments": comments,
@@ -0,0 +1,55 @@
+import pytest
+from libs.detect import DEFAULT_RULES_PATH, Rule, RuleSet, load_rules, required_literals
+
+@pytest.mark.parametrize("pattern, literals", [
+    (r"canarytokens\.[a-z]+", ["canarytokens."]),
+    (r"webhook\.site", ["webhook.site"]),
+    (r"\binteract\.sh\b|\boast\.(?:pro|live)\b", ["interact.sh", "oast."]),
+    (r"cl\.s\d+\.exct\.net", [".exct.net"]),
+    (r"google-analytics\.com/(?:collect|r/collect)", ["google-analytics.com/"]),
+    (r"bit\.ly/[a-z0-9]+\+$", ["bit.ly/"]),
+    (r"[]a]abcdef", ["abcdef"]),             # a leading "]" is a class member
+    (r"[^]]abcdef", ["abcdef"]),
+    (r"x[]|(]canary", ["canary"]),           # not a branch, not a group
+    (r"(?:[]x)]|y)canary", ["canary"]),
+])
+def test_required_literals(pattern, literals):
+    assert required_literals(pattern) == literals
+
+@pytest.mark.parametrize("pattern", [
+    r"canary\x74okens",           # hex escape
+    r"canary\u0074okens",         # unicode escape
+    r"canary\N{LATIN SMALL LETTER T}okens",
+    r"canary\164okens",           # octal escape
+    r"(canary)tokens\1",          # backreference
+    r"(?x) canary tokens",        # verbose: the spaces are not literal
+    r"(?i)canarytokens",
+    r"(?x:can ary)tokens",
+    r"ab|canarytokens",           # a branch too short to filter on
+    r"[a-z]+\.e",
+])
+def test_required_literals_gives_up(pattern):
+    assert required_literals(pattern) is None
+
+@pytest.mark.parametrize("pattern, url", [
+    (r"canary\x74okens", "https://canarytokens.com/x"),
+    (r"(?x) canary tokens", "https://canarytokens.com/x"),
+    (r"canary\164okens\.com", "https://canarytokens.com/x"),
+    (r"(?i)CANARYTOKENS", "https://canarytokens.com/x"),
+    (r"canary[]|(]tokens", "https://canary]tokens.com/x"),
+])
+def test_ruleset_does_not_prefilter_out_matches(pattern, url):
+    ruleset = RuleSet([Rule("canary", "test", pattern)])
+    assert [r.name for r in ruleset.match(url)] == ["test"]
+
+def test_ruleset_matches_bundled_rules():
+    ruleset = RuleSet(load_rules(DEFAULT_RULES_PATH))
+    assert [r.name for r in ruleset.match("https://canarytokens.com/about/x/index.html)")] == ["canarytokens"]
+    assert [r.name for r in ruleset.match("https://www.google-analytics.com/collect?v=1")] == ["google-analytics"]
+    assert ruleset.match("https://example.com/report.pdf") == []
+
+def test_load_rules_reports_bad_regex(tmp_path):
+    path = tmp_path / "bad.rules"
+    path.write_text("canary broken canary(\n")
+    with pytest.raises(ValueError, match="bad.rules:1"):
+        load_rules(str(path))
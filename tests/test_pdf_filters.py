@@ -0,0 +1,165 @@
+import base64
+import zlib
+import pytest
+from libs.pdf_filters import (OUTPUT_PIECE, ASCII85Decoder, ASCIIHexDecoder, DecodeLimits, FlateDecoder, LZWDecoder,
+                              OutputBudget, PredictorDecoder, RunLengthDecoder, build_filter_chain, limit_output)
+
+TEXT = b"BT (https://example.com/a) Tj ET\n" * 50
+
+def decode(decoder, data, step=None):
+    """Feeds `data` to `decoder` in pieces of `step` bytes (all at once when None)."""
+    step = step or max(1, len(data))
+    out = b""
+    for i in range(0, len(data), step):
+        out += b"".join(decoder.feed(data[i:i + step]))
+    return out + b"".join(decoder.flush())
+
+@pytest.mark.parametrize("step", [None, 1, 7])
+@pytest.mark.parametrize("encoded", [
+    zlib.compress(TEXT),
+    zlib.compress(TEXT)[2:-4],  # raw deflate, no zlib header
+], ids=["zlib", "raw"])
+def test_flate(encoded, step):
+    assert decode(FlateDecoder(16), encoded, step) == TEXT
+
+def test_flate_truncated_gives_a_prefix():
+    encoded = zlib.compress(TEXT)
+    out = decode(FlateDecoder(16), encoded[:len(encoded) // 2])
+    assert out and TEXT.startswith(out)
+
+def test_flate_corrupt():
+    with pytest.raises(zlib.error):
+        decode(FlateDecoder(16), b"\x78\x9c\xff\xff\xff\xff\xff\xff")
+
+def test_flate_bounds_each_piece():
+    pieces = list(FlateDecoder(1024).feed(zlib.compress(b"\0" * 100000)))
+    assert max(map(len, pieces)) <= 1024
+    assert sum(map(len, pieces)) == 100000
+
+@pytest.mark.parametrize("step", [None, 1, 3])
+def test_ascii_hex(step):
+    assert decode(ASCIIHexDecoder(), b"48 65\n6c6C 6f>41", step) == b"Hello"
+
+def test_ascii_hex_odd_digit_is_padded():
+    assert decode(ASCIIHexDecoder(), b"414>") == b"A@"
+
+def test_ascii_hex_corrupt():
+    with pytest.raises(ValueError):
+        decode(ASCIIHexDecoder(), b"4g>")
+
+@pytest.mark.parametrize("step", [None, 1, 4])
+def test_ascii85(step):
+    encoded = base64.a85encode(TEXT + b"\0\0\0\0tail", foldspaces=False) + b"~>junk"
+    assert decode(ASCII85Decoder(), encoded, step) == TEXT + b"\0\0\0\0tail"
+
+def test_ascii85_z_group():
+    assert decode(ASCII85Decoder(), b"zz~>") == b"\0" * 8
+
+def test_ascii85_truncated_group():
+    with pytest.raises(ValueError):
+        decode(ASCII85Decoder(), b"87cURD]i,\"E")
+
+def test_ascii85_corrupt():
+    with pytest.raises(ValueError):
+        decode(ASCII85Decoder(), b"87c{URD~>")
+
+# Literal run of 3 bytes, "x" repeated 4 times, then end of data
+RUN_LENGTH = b"\x02abc\xfdx\x80\x00ignored"
+
+@pytest.mark.parametrize("step", [None, 1, 2])
+def test_run_length(step):
+    assert decode(RunLengthDecoder(), RUN_LENGTH, step) == b"abcxxxx"
+
+def test_run_length_truncated_run_is_dropped():
+    assert decode(RunLengthDecoder(), b"\x02abc\x05ab") == b"abc"
+
+def test_run_length_bounds_each_piece():
+    # Each 2-byte run expands to 128 bytes
+    pieces = list(RunLengthDecoder().feed(b"\x81x" * 4096))
+    assert max(map(len, pieces)) < OUTPUT_PIECE + 128
+    assert sum(map(len, pieces)) == 128 * 4096
+
+# The LZW example of the PDF specification (7.4.4.2)
+LZW_ENCODED = bytes.fromhex("800b6050220c0c8501")
+LZW_DECODED = bytes.fromhex("2d2d2d2d2d412d2d2d42")
+
+@pytest.mark.parametrize("step", [None, 1, 2])
+def test_lzw(step):
+    assert decode(LZWDecoder(), LZW_ENCODED, step) == LZW_DECODED
+
+def test_lzw_stops_at_end_of_data():
+    assert decode(LZWDecoder(), LZW_ENCODED + b"\xff\xff") == LZW_DECODED
+
+def test_lzw_corrupt():
+    with pytest.raises(ValueError):
+        decode(LZWDecoder(), b"\xff\x80")
+
+@pytest.mark.parametrize("step", [None, 1, 5])
+@pytest.mark.parametrize("predictor, encoded", [
+    (12, b"\x02\x01\x02\x03\x02\x03\x03\x03"),  # PNG Up
+    (11, b"\x01\x01\x01\x01\x01\x04\x01\x01"),  # PNG Sub
+    (14, b"\x04\x01\x01\x01\x04\x03\x01\x01"),  # PNG Paeth
+    (2, b"\x01\x01\x01\x04\x01\x01"),           # TIFF
+])
+def test_predictor(predictor, encoded, step):
+    decoder = PredictorDecoder(predictor, columns=3)
+    assert decode(decoder, encoded, step) == b"\x01\x02\x03\x04\x05\x06"
+
+def test_predictor_passes_a_partial_row_through():
+    assert decode(PredictorDecoder(12, columns=3), b"\x02\x01\x02\x03\x02\x03") == b"\x01\x02\x03\x02\x03"
+
+@pytest.mark.parametrize("parms", [{"colors": 0}, {"bits_per_component": 0}, {"columns": 0}, {"columns": -3}])
+def test_predictor_invalid_parameters(parms):
+    with pytest.raises(ValueError):
+        PredictorDecoder(12, **parms)
+
+def test_predictor_row_limit():
+    with pytest.raises(ValueError):
+        build_filter_chain("/FlateDecode", {"/Predictor": 12, "/Columns": 10 ** 14}, max_row=1 << 20)
+    assert build_filter_chain("/FlateDecode", {"/Predictor": 12, "/Columns": 1 << 20}, max_row=1 << 20)
+
+def test_chain_in_filter_order():
+    encoded = zlib.compress(TEXT).hex().encode() + b">"
+    chain = build_filter_chain(["/AHx", "/FlateDecode"], [None, None], chunk_size=16)
+    assert decode(chain, encoded, 5) == TEXT
+
+def test_chain_with_predictor():
+    rows = b"\x02\x01\x02\x03\x02\x03\x03\x03"
+    chain = build_filter_chain("/FlateDecode", {"/Predictor": 12, "/Columns": 3})
+    assert decode(chain, zlib.compress(rows), 3) == b"\x01\x02\x03\x04\x05\x06"
+
+@pytest.mark.parametrize("filters", [None, [], "/DCTDecode", ["/FlateDecode", "/JPXDecode"], "/Unknown", [7]])
+def test_chain_not_decodable(filters):
+    assert build_filter_chain(filters) is None
+
+LIMITS = DecodeLimits(max_stream_bytes=1 << 30, max_file_bytes=1 << 30, max_ratio=1 << 30)
+
+def _bomb_pieces(size=8 << 20, chunk_size=64 * 1024):
+    chain = build_filter_chain("/FlateDecode", chunk_size=chunk_size)
+    encoded = zlib.compress(b"\0" * size)
+    return (piece for part in (chain.feed(encoded), chain.flush()) for piece in part), len(encoded)
+
+@pytest.mark.parametrize("limits, budget, reason", [
+    (LIMITS._replace(max_stream_bytes=1 << 20), 1 << 30, "stream output limit"),
+    (LIMITS._replace(max_ratio=10), 1 << 30, "compression ratio limit"),
+    (LIMITS, 1 << 20, "file output limit"),
+])
+def test_decoding_stops_at_output_limit(limits, budget, reason):
+    pieces, encoded_length = _bomb_pieces()
+    stop = {}
+    decoded = sum(len(p) for p in limit_output(pieces, encoded_length, limits, OutputBudget(budget), stop))
+    assert stop["reason"] == reason
+    assert decoded <= 2 << 20
+    # The decoder is closed rather than run to the end
+    assert next(pieces, None) is None
+
+def test_file_budget_is_shared_between_streams():
+    budget = OutputBudget(3 << 20)
+    stops = []
+    for _ in range(3):
+        pieces, encoded_length = _bomb_pieces(2 << 20)
+        stop = {}
+        for _piece in limit_output(pieces, encoded_length, LIMITS, budget, stop):
+            pass
+        stops.append(stop.get("reason"))
+    assert stops == [None, "file output limit", "file output limit"]
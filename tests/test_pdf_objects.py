@@ -0,0 +1,239 @@
+import io
+import struct
+import zlib
+import pytest
+from libs.pdf import (extract_link_annotations, extract_metadata, extract_metadata_urls, get_pdf_basic_info,
+                      scan_pdf_urls)
+from libs.pdf_filters import DecodeLimits
+from libs.pdf_objects import MAX_NESTING, PdfObjectIndex, PdfStream, Ref, objstm_offsets, parse_object
+
+def _stream(data, entries=b""):
+    return b"<< /Length %d%s >>\nstream\n" % (len(data), entries) + data + b"\nendstream"
+
+def _objstm(members):
+    """An /ObjStm body holding the (num, body) `members`."""
+    header = data = b""
+    for num, body in members:
+        header += b"%d %d " % (num, len(data))
+        data += body + b"\n"
+    return _stream(zlib.compress(header + data),
+                   b" /Type /ObjStm /N %d /First %d /Filter /FlateDecode" % (len(members), len(header)))
+
+def build_pdf(objects, xref="table", packed=None, trailer=b""):
+    """
+    A PDF of the {num: body} `objects` with an xref "table", an xref
+    "stream" or no xref at all (None). `packed` maps the numbers of objects
+    stored in an /ObjStm to (container num, index) for the xref stream;
+    `trailer` holds trailer entries besides /Size and /Root.
+    """
+    packed = packed or {}
+    out = bytearray(b"%PDF-1.5\n")
+    offsets = {}
+    for num, body in objects.items():
+        offsets[num] = len(out)
+        out += b"%d 0 obj\n" % num + body + b"\nendobj\n"
+    size = max([*objects, *packed]) + 2
+    start = len(out)
+    if xref == "table":
+        out += b"xref\n0 %d\n" % size
+        for num in range(size):
+            out += b"%010d 00000 n \n" % offsets[num] if num in offsets else b"0000000000 65535 f \n"
+        out += b"trailer\n<< /Size %d /Root 1 0 R %s >>\nstartxref\n%d\n%%%%EOF\n" % (size, trailer, start)
+    elif xref == "stream":
+        rows = b""
+        for num in range(size):
+            if num in packed:
+                rows += struct.pack(">BIH", 2, *packed[num])
+            elif num in offsets or num == size - 1:
+                rows += struct.pack(">BIH", 1, offsets.get(num, start), 0)
+            else:
+                rows += struct.pack(">BIH", 0, 0, 0)
+        out += b"%d 0 obj\n" % (size - 1) + _stream(rows, b" /Type /XRef /Size %d /W [1 4 2] /Root 1 0 R %s" % (size, trailer))
+        out += b"\nendobj\nstartxref\n%d\n%%%%EOF\n" % start
+    else:
+        out += b"trailer\n<< /Root 1 0 R %s >>\n%%%%EOF\n" % trailer
+    return bytes(out)
+
+CATALOG = b"<< /Type /Catalog /Pages 2 0 R >>"
+PAGES = b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>"
+PAGE = b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R /Annots [5 0 R] >>"
+CONTENT = b"https://content.example/a\n"
+LINK = b"<< /Type /Annot /Subtype /Link /A << /S /URI /URI (https://example.com/x) >> >>"
+
+def simple_pdf(xref="table"):
+    return build_pdf({1: CATALOG, 2: PAGES, 3: PAGE, 4: _stream(zlib.compress(CONTENT), b" /Filter /FlateDecode"),
+                      5: LINK}, xref)
+
+def packed_pdf(xref="stream"):
+    """Objects 3 and 5 live in the /ObjStm 10."""
+    objects = {1: CATALOG, 2: PAGES, 4: _stream(CONTENT), 10: _objstm([(3, PAGE), (5, LINK)])}
+    return build_pdf(objects, xref, packed={3: (10, 0), 5: (10, 1)})
+
+@pytest.mark.parametrize("text, value", [
+    (b"42", 42),
+    (b"-1.5", -1.5),
+    (b"/Name#20Two", "/Name Two"),
+    (b"true", True),
+    (b"null", None),
+    (b"12 0 R", Ref(12, 0)),
+    (b"[1 2 0 R /A]", [1, Ref(2, 0), "/A"]),
+    (b"<< /K [<< /L (x) >>] /M 3 0 R >>", {"/K": [{"/L": b"x"}], "/M": Ref(3, 0)}),
+    (b"(a (nested\\) one) \\050\\51\\n)", b"a (nested) one) ()\n"),
+    (b"(line\\\nbreak)", b"linebreak"),
+    (b"<48 65 6c6c 6F7>", b"Hello\x70"),
+    (b"% comment\n /A", "/A"),
+])
+def test_parse_object(text, value):
+    assert parse_object(text, 0) == (value, len(text))
+
+@pytest.mark.parametrize("text", [b"(unterminated", b"<< /A 1 ]", b"<< 1 2 >>", b"<4g>", b"[1 2", b")"])
+def test_parse_object_malformed(text):
+    with pytest.raises(ValueError):
+        parse_object(text, 0)
+
+def test_parse_object_nesting_limit():
+    with pytest.raises(ValueError):
+        parse_object(b"[" * (MAX_NESTING + 1), 0)
+
+def test_parse_object_string_spans():
+    data = b"<< /URI (https://a.example/\\051) /H <6869> /N 1 >>"
+    spans = []
+    parse_object(data, 0, spans)
+    assert [data[a:b] for a, b in spans] == [b"(https://a.example/\\051)", b"<6869>"]
+
+def test_objstm_offsets():
+    assert objstm_offsets(b"3 0 5 12 ", 2, 9) == {3: 9, 5: 21}
+    assert objstm_offsets(b"3 0", 2, None) == {}
+
+@pytest.mark.parametrize("xref", ["table", "stream", None])
+def test_index(xref):
+    index = PdfObjectIndex(io.BytesIO(simple_pdf(xref)), chunk_size=64)
+    assert {1, 2, 3, 4, 5} <= set(index.entries)
+    assert index.get(2) == {"/Type": "/Pages", "/Kids": [Ref(3, 0)], "/Count": 1}
+    assert index.get_raw(5).strip() == LINK
+    stream = index.get(4)
+    assert isinstance(stream, PdfStream)
+    assert index.read_stream(stream) == CONTENT
+    assert index.get(99) is None
+
+@pytest.mark.parametrize("xref", ["stream", None])
+def test_index_object_stream_members(xref):
+    index = PdfObjectIndex(io.BytesIO(packed_pdf(xref)), chunk_size=64)
+    assert index.entries[5] == ("objstm", 10, 1)
+    assert index.get(3)["/Contents"] == Ref(4, 0)
+    assert index.get(5)["/A"]["/URI"] == b"https://example.com/x"
+    assert index.get_raw(3).strip() == PAGE
+
+def test_index_rebuilds_from_broken_startxref():
+    data = simple_pdf().replace(b"startxref\n", b"startxref\n9")
+    index = PdfObjectIndex(io.BytesIO(data))
+    assert index.get(5)["/Type"] == "/Annot"
+    assert index.trailer["/Root"] == Ref(1, 0)
+
+def corrupt_objstm_pdf():
+    """Object 12 (the /Length of stream 4) is packed in the undecodable /ObjStm 20."""
+    content = zlib.compress(b"https://content.example/a")
+    objects = {1: CATALOG, 2: PAGES, 3: PAGE.replace(b" /Annots [5 0 R]", b""),
+               4: b"<< /Length 12 0 R /Filter /FlateDecode >>\nstream\n" + content + b"\nendstream",
+               20: b"<< /Type /ObjStm /N 1 /First 5 /Filter /FlateDecode /Length 10 >>\nstream\n"
+                   b"\x78\x9c\xff\xff\xff\xff\xff\xff\xff\xff\nendstream"}
+    return build_pdf(objects, "stream", packed={12: (20, 0)})
+
+def test_index_corrupt_object_stream():
+    index = PdfObjectIndex(io.BytesIO(corrupt_objstm_pdf()))
+    assert index.get(12) is None
+    assert index.get_raw(12) is None
+    assert index.get(1)["/Type"] == "/Catalog"
+
+def test_corrupt_object_stream_does_not_fail_the_file(tmp_path):
+    path = tmp_path / "corrupt.pdf"
+    path.write_bytes(corrupt_objstm_pdf())
+    assert get_pdf_basic_info(str(path))["num_pages"] == 1
+    found = scan_pdf_urls(str(path))
+    assert found["urls"] == {"https://content.example/a": [4]}
+    assert [(t["object"], t["reason"].split(":")[0]) for t in found["truncated_streams"]] == [(20, "decode error")]
+
+def test_index_stops_bomb_object_stream():
+    bomb = _stream(zlib.compress(b"3 0 " + b" " * (4 << 20) + b"<< >>"),
+                   b" /Type /ObjStm /N 1 /First 4 /Filter /FlateDecode")
+    data = build_pdf({1: CATALOG, 2: PAGES, 10: bomb}, "stream", packed={3: (10, 0)})
+    index = PdfObjectIndex(io.BytesIO(data), limits=DecodeLimits(1 << 20, 8 << 20, 1000))
+    assert index.get(3) is None
+    left = index.budget.left
+    assert left > 6 << 20
+    # Not decoded again
+    assert index.get(3) is None
+    assert index.budget.left == left
+
+def test_index_object_stream_cache_is_lru(monkeypatch):
+    objects = {1: CATALOG, 2: PAGES}
+    packed = {}
+    for i in range(17):
+        objects[100 + i] = _objstm([(200 + i, b"<< /I %d >>" % i)])
+        packed[200 + i] = (100 + i, 0)
+    index = PdfObjectIndex(io.BytesIO(build_pdf(objects, "stream", packed)))
+    decoded = []
+    read_stream = index.read_stream
+    monkeypatch.setattr(index, "read_stream", lambda stream: decoded.append(stream) or read_stream(stream))
+    for i in range(17):
+        assert index.get(200)["/I"] == 0
+        assert index.get(200 + i)["/I"] == i
+    assert len(decoded) == 17
+
+@pytest.mark.parametrize("parms", [b"/Columns 100000000000000", b"/Colors 0"])
+def test_scan_reports_bad_predictor_parameters(tmp_path, parms):
+    predicted = _stream(zlib.compress(b"\x02https://predicted.example/"),
+                        b" /Filter /FlateDecode /DecodeParms << /Predictor 12 %s >>" % parms)
+    path = tmp_path / "predictor.pdf"
+    path.write_bytes(build_pdf({1: CATALOG, 2: PAGES, 3: PAGE, 4: _stream(CONTENT), 6: predicted}))
+    found = scan_pdf_urls(str(path))
+    assert found["urls"] == {"https://content.example/a": [4]}
+    assert [(t["object"], t["reason"].split(":")[0]) for t in found["truncated_streams"]] == [(6, "decode error")]
+
+@pytest.mark.parametrize("build", [simple_pdf, packed_pdf])
+def test_link_annotations(tmp_path, build):
+    path = tmp_path / "links.pdf"
+    path.write_bytes(build())
+    assert extract_link_annotations(str(path)) == {"https://example.com/x": [5]}
+
+def test_link_annotations_report_the_object_holding_the_uri(tmp_path):
+    page = PAGE.replace(b"/Annots [5 0 R]", b"/Annots 6 0 R")
+    annots = b"[5 0 R << /Subtype /Link /A << /URI (https://direct.example/) >> >> << /Subtype /Widget >>]"
+    link = b"<< /Subtype /Link /A 7 0 R >>"
+    action = b"<< /S /URI /URI <feff00680074007400700073003a002f002f0075002e006500780061006d0070006c0065002f> >>"
+    path = tmp_path / "links.pdf"
+    path.write_bytes(build_pdf({1: CATALOG, 2: PAGES, 3: page, 4: _stream(CONTENT), 5: link, 6: annots, 7: action}))
+    assert extract_link_annotations(str(path)) == {"https://direct.example/": [6], "https://u.example/": [7]}
+
+@pytest.mark.parametrize("xref", ["table", "stream"])
+def test_metadata_from_info_dict(tmp_path, xref):
+    info = b"<< /Title (Report) /Author 9 0 R /CreationDate (D:20240102030405) >>"
+    objects = {1: CATALOG, 2: PAGES, 3: PAGE, 4: _stream(CONTENT), 5: LINK, 8: info,
+               9: b"(Jane https://info.example/p)"}
+    path = tmp_path / "info.pdf"
+    path.write_bytes(build_pdf(objects, xref, trailer=b"/Info 8 0 R"))
+    meta = dict(extract_metadata(str(path)))
+    assert (meta["Title"], meta["Author"], meta["CreationDate"]) == (
+        "Report", "Jane https://info.example/p", "2024-01-02 03:04:05")
+    assert extract_metadata_urls(str(path)) == {"https://info.example/p": [9]}
+
+def test_scan_does_not_depend_on_chunk_size(tmp_path):
+    objects = {1: CATALOG, 2: PAGES, 3: PAGE, 4: _stream(CONTENT), 5: LINK}
+    for i in range(6, 130):
+        objects[i] = b"<< /Pad (%s) /URI (https://h%d.example/x\\057y) >>" % (b"p" * (i * 7 % 900), i)
+    path = tmp_path / "long.pdf"
+    path.write_bytes(build_pdf(objects))
+    expected = scan_pdf_urls(str(path))
+    assert expected["urls"]["https://h119.example/x/y"] == [119]
+    assert len(expected["urls"]) == 126
+    for chunk_size, overlap in [(1000, 400), (3000, 1024), (600, 64)]:
+        assert scan_pdf_urls(str(path), chunk_size=chunk_size, overlap=overlap) == expected
+
+@pytest.mark.parametrize("build", [simple_pdf, packed_pdf])
+def test_scan_reports_string_urls_once(tmp_path, build):
+    path = tmp_path / "links.pdf"
+    path.write_bytes(build())
+    assert scan_pdf_urls(str(path), chunk_size=64, overlap=32)["urls"] == {
+        "https://content.example/a": [4],
+        "https://example.com/x": [5],
+    }
@@ -0,0 +1,44 @@
+import http.client
+import json
+import socket
+import tempfile
+import threading
+import pytest
+from libs.server import make_server
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    """A daemon without workers (uploads are refused before inspection) and its temp directory."""
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    server = make_server("127.0.0.1:0", None, timeout=5, max_upload=1000)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def _post(server, headers, body=b""):
+    conn = http.client.HTTPConnection(*server.server_address, timeout=5)
+    conn.putrequest("POST", "/inspect?name=x.pdf")
+    for name, value in headers.items():
+        conn.putheader(name, value)
+    conn.endheaders()
+    if body:
+        conn.send(body)
+    response = conn.getresponse()
+    status, data = response.status, json.loads(response.read())
+    conn.close()
+    return status, data
+
+@pytest.mark.parametrize("length, status", [("-1", 400), ("-5000000", 400), ("1001", 413), ("abc", 411)])
+def test_upload_length_refused(server, tmp_path, length, status):
+    assert _post(server, {"Content-Length": length}, b"x" * 2000)[0] == status
+    assert list(tmp_path.iterdir()) == []
+
+def test_upload_cut_short_leaves_no_temp_file(server, tmp_path):
+    with socket.create_connection(server.server_address, timeout=5) as sock:
+        sock.sendall(b"POST /inspect?name=x.pdf HTTP/1.1\r\nContent-Length: 500\r\n\r\n" + b"x" * 100)
+        sock.shutdown(socket.SHUT_WR)
+        reply = sock.makefile("rb").readline()
+    assert b" 400 " in reply
+    assert list(tmp_path.iterdir()) == []
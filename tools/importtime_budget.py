@@ -0,0 +1,72 @@
+"""
+Import-time budget for the CLI and the per-file inspection hook.
+
+Imports each module in a fresh interpreter under `python -X importtime`,
+keeps the best cumulative time of --repeat runs, and fails when a module
+exceeds its budget or pulls in a module it must not load (another
+format's dependencies, the process pool machinery). Run from anywhere:
+
+    python tools/importtime_budget.py [--repeat 5] [--scale 1.0]
+
+--scale multiplies every budget, for slower machines or CI runners.
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+POOL = {"concurrent.futures", "multiprocessing"}
+FORMATS = {"PyPDF2", "libs.pdf", "libs.doc", "libs.ppt", "libs.xlsx", "libs.ooxml"}
+
+# (module, budget in ms, modules it must not import)
+BUDGETS = [
+    ("libs.inspector", 25, POOL | FORMATS | {"sqlite3"}),
+    ("get_file_info", 35, POOL | FORMATS | {"sqlite3"}),
+    ("libs.xlsx", 60, POOL | {"PyPDF2", "libs.pdf"}),
+    ("libs.doc", 60, POOL | {"PyPDF2", "libs.pdf"}),
+    ("libs.ppt", 60, POOL | {"PyPDF2", "libs.pdf"}),
+    ("libs.pdf", 200, POOL | {"libs.ooxml"}),
+]
+
+IMPORTTIME_RE = re.compile(r"^import time:\s*(\d+)\s*\|\s*(\d+)\s*\|(\s*)(\S+)\s*$")
+
+def measure(module):
+    """(cumulative microseconds of `module`, names of every module imported with it)."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          cwd=ROOT, capture_output=True, text=True)
+    if proc.returncode:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr}")
+    total, loaded = None, set()
+    for line in proc.stderr.splitlines():
+        m = IMPORTTIME_RE.match(line)
+        if m:
+            loaded.add(m.group(4))
+            if m.group(4) == module:
+                total = int(m.group(2))
+    return total or 0, loaded
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check module import times against their budgets.")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per module; the best one counts (default: 5)")
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiply every budget by this factor")
+    args = parser.parse_args(argv)
+
+    failed = False
+    for module, budget_ms, forbidden in BUDGETS:
+        runs = [measure(module) for _ in range(args.repeat)]
+        best = min(us for us, _ in runs) / 1000
+        pulled = sorted(name for name in runs[0][1]
+                        if any(name == f or name.startswith(f + ".") for f in forbidden))
+        limit = budget_ms * args.scale
+        ok = best <= limit and not pulled
+        failed = failed or not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {module:<16} {best:7.1f} ms (budget {limit:.0f} ms)")
+        if pulled:
+            print(f"     imports {', '.join(pulled)}")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())